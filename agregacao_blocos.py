@@ -0,0 +1,114 @@
+"""
+Agregação fora da memória para bases maiores que a RAM.
+
+No modo SQL a tabela não é carregada em memória. Este módulo a percorre em
+intervalos de rowid, um bloco por vez em cada leitor, e soma cada bloco aos
+cubos de agregação usados pelo dashboard. A memória fica limitada aos blocos
+em leitura e aos próprios cubos, que têm uma linha por combinação de
+dimensões e não crescem com o número de linhas. Vários leitores, cada um com
+sua conexão, percorrem intervalos diferentes em paralelo.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+import pandas as pd
+
+from agregacoes import dimensoes_base, montar_cubos, somar_por
+from consultas import TABELA, conectar
+from dados import TAMANHO_BLOCO, carregar_tabela
+
+
+def intervalos_rowid(conn, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Divide a tabela em intervalos consecutivos de rowid.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco
+        tamanho_bloco (int): Largura de cada intervalo
+
+    Returns:
+        list: Tuplas (apos_rowid, ate_rowid) que cobrem todas as linhas
+    """
+    minimo, maximo = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {TABELA}").fetchone()
+    if maximo is None:
+        return []
+    return [
+        (inicio, min(inicio + tamanho_bloco, maximo))
+        for inicio in range(minimo - 1, maximo, tamanho_bloco)
+    ]
+
+
+def somar_bloco(abrir_conexao, intervalo):
+    """
+    Lê um intervalo de rowid e soma o Valor FOB pelas dimensões de cada cubo base.
+
+    Args:
+        abrir_conexao (callable): Retorna um gerenciador de contexto com uma
+            conexão; cada leitor usa a sua
+        intervalo (tuple): Par (apos_rowid, ate_rowid) criado por intervalos_rowid
+
+    Returns:
+        dict: Tupla de dimensões -> soma parcial do bloco, com colunas comuns
+            (as categorias de cada bloco são diferentes)
+    """
+    with abrir_conexao() as conn:
+        bloco = carregar_tabela(conn, *intervalo)
+    parciais = {}
+    for dimensoes in dimensoes_base():
+        parcial = somar_por(bloco, dimensoes, dropna=False)
+        parciais[dimensoes] = parcial.astype({
+            coluna: parcial[coluna].cat.categories.dtype for coluna in dimensoes
+            if isinstance(parcial[coluna].dtype, pd.CategoricalDtype)
+        })
+    return parciais
+
+
+def acumular(acumulados, parciais):
+    """Soma aos cubos acumulados as somas parciais de um bloco"""
+    for dimensoes, parcial in parciais.items():
+        atual = acumulados.get(dimensoes)
+        if atual is None:
+            acumulados[dimensoes] = parcial
+        else:
+            acumulados[dimensoes] = somar_por(pd.concat([atual, parcial], ignore_index=True), dimensoes, dropna=False)
+
+
+def construir_cubos_em_blocos(caminho_db, leitores=1, tamanho_bloco=TAMANHO_BLOCO, abrir_conexao=None):
+    """
+    Materializa os cubos de agregação percorrendo a tabela em blocos.
+
+    Os blocos são somados na ordem dos intervalos, de forma que o resultado
+    não depende de qual leitor termina primeiro. No máximo 2 × leitores
+    blocos ficam em andamento ao mesmo tempo (em leitura ou lidos e ainda não
+    somados): um bloco lento não faz os demais se acumularem em memória.
+
+    Args:
+        caminho_db (Path): Caminho do banco
+        leitores (int): Número de blocos lidos em paralelo
+        tamanho_bloco (int): Largura dos intervalos de rowid
+        abrir_conexao (callable, optional): Retorna um gerenciador de contexto
+            com uma conexão de leitura; por padrão, conexões novas com o banco
+
+    Returns:
+        dict: Cubos no formato de agregacoes.construir_cubos
+    """
+    abrir_conexao = abrir_conexao or partial(conectar, caminho_db)
+    with abrir_conexao() as conn:
+        intervalos = intervalos_rowid(conn, tamanho_bloco)
+    acumulados = {}
+    limite = 2 * leitores
+    # Blocos em andamento, pela posição do intervalo; proximo é o próximo a somar
+    pendentes = {}
+    proximo = 0
+    with ThreadPoolExecutor(max_workers=leitores, thread_name_prefix='leitor') as executor:
+        while proximo < len(intervalos):
+            while len(pendentes) < limite and proximo + len(pendentes) < len(intervalos):
+                posicao = proximo + len(pendentes)
+                pendentes[posicao] = executor.submit(somar_bloco, abrir_conexao, intervalos[posicao])
+            wait([futuro for futuro in pendentes.values() if not futuro.done()], return_when=FIRST_COMPLETED)
+            while proximo in pendentes and pendentes[proximo].done():
+                acumular(acumulados, pendentes.pop(proximo).result())
+                proximo += 1
+    return montar_cubos(
+        lambda dimensoes: acumulados.get(dimensoes, pd.DataFrame(columns=[*dimensoes, 'Valor_FOB']))
+    )
@@ -0,0 +1,373 @@
+"""
+Agregações do dashboard sobre os dados em memória.
+
+Os gráficos sempre somam o Valor FOB pelos mesmos poucos agrupamentos. Este
+módulo materializa esses agrupamentos em cubos uma vez por carga e responde
+cada consulta a partir do menor cubo que contenha as chaves pedidas e as
+colunas dos filtros ativos.
+"""
+import threading
+from functools import partial
+
+import pandas as pd
+
+from indices import filtrar_linhas
+
+# Colunas disponíveis como filtro na barra lateral
+DIMENSOES_FILTRO = ['Ano', 'Fluxo', 'Países', 'UF', 'URF', 'Desc_Secao', 'Desc_SH6']
+
+# Filtros mais usados, incluídos em todos os cubos
+DIMENSOES_COMUNS = ('Ano', 'Fluxo')
+
+# Agrupamentos usados pelos gráficos e pelas métricas principais
+AGRUPAMENTOS = [
+    ('Ano', 'Fluxo'),
+    ('Países',),
+    ('URF',),
+    ('Desc_Secao',),
+    ('Desc_SH6',),
+    ('Países', 'Desc_SH6'),
+    ('URF', 'Desc_SH6'),
+    ('UF',),
+    ('Cod_SH6',),
+]
+
+
+def aplicar_filtros(df, filtros, indice=None):
+    """
+    Aplica múltiplos filtros ao DataFrame de forma otimizada.
+
+    Com o índice invertido de df, as linhas são obtidas pela união e
+    interseção das listas de posições, sem máscaras do tamanho da tabela.
+
+    Args:
+        df (pd.DataFrame): DataFrame a ser filtrado
+        filtros (dict): Dicionário com colunas e valores para filtrar
+        indice (dict, optional): Índice de df criado por indices.construir_indice
+
+    Returns:
+        pd.DataFrame: DataFrame filtrado
+    """
+    if indice is not None and all(coluna in indice for coluna, valores in filtros.items() if valores):
+        linhas = filtrar_linhas(indice, filtros)
+        return df if linhas is None else df.iloc[linhas]
+    mask = pd.Series(True, index=df.index)
+    for coluna, valores in filtros.items():
+        if valores:  # Só aplica o filtro se houver valores selecionados
+            mask &= df[coluna].isin(valores)
+    return df[mask]
+
+
+def somar_por(df, chaves, dropna=True):
+    """
+    Soma o Valor FOB por chaves, considerando apenas as categorias presentes.
+
+    Args:
+        df (pd.DataFrame): Linhas ou agregado com as chaves e Valor_FOB
+        chaves (list): Colunas de agrupamento; sem chaves, a soma é o total geral
+        dropna (bool): Descartar as linhas com alguma chave nula; com False,
+            elas formam grupos próprios e continuam somadas
+
+    Returns:
+        pd.DataFrame: Uma linha por combinação de chaves (uma única sem chaves),
+            com a coluna Valor_FOB
+    """
+    if not chaves:
+        return pd.DataFrame({'Valor_FOB': [df['Valor_FOB'].sum()]})
+    return df.groupby(list(chaves), observed=True, dropna=dropna)['Valor_FOB'].sum().reset_index()
+
+
+def construir_cubos(df):
+    """
+    Materializa os cubos de agregação a partir da tabela completa.
+
+    Para cada agrupamento são criados dois cubos: um com as dimensões comuns
+    (Ano e Fluxo), obtido da tabela, e o próprio agrupamento, obtido do
+    primeiro sem voltar às linhas originais. Linhas com dimensões nulas ficam
+    nos cubos, em grupos próprios, para que os totais com menos chaves (como o
+    total geral) as incluam; as consultas com chaves as descartam.
+
+    Args:
+        df (pd.DataFrame): Tabela completa carregada em memória
+
+    Returns:
+        dict: Tupla de dimensões -> DataFrame com as dimensões e a soma de Valor_FOB
+    """
+    return montar_cubos(partial(somar_por, df, dropna=False))
+
+
+def dimensoes_base():
+    """Dimensões dos cubos obtidos das linhas: cada agrupamento mais as dimensões comuns"""
+    return list(dict.fromkeys(
+        tuple(dict.fromkeys(agrupamento + DIMENSOES_COMUNS)) for agrupamento in AGRUPAMENTOS
+    ))
+
+
+def montar_cubos(obter_base):
+    """
+    Monta os cubos de agregação a partir dos cubos base.
+
+    Args:
+        obter_base (callable): Recebe uma tupla de dimensoes_base() e retorna
+            a soma de Valor_FOB por essas dimensões, mantendo as dimensões nulas
+
+    Returns:
+        dict: Tupla de dimensões -> DataFrame com as dimensões e a soma de Valor_FOB
+    """
+    cubos = {}
+    for agrupamento in AGRUPAMENTOS:
+        dimensoes = tuple(dict.fromkeys(agrupamento + DIMENSOES_COMUNS))
+        if dimensoes not in cubos:
+            cubos[dimensoes] = obter_base(dimensoes)
+        if agrupamento not in cubos:
+            cubos[agrupamento] = somar_por(cubos[dimensoes], agrupamento, dropna=False)
+    return cubos
+
+
+def atualizar_cubos(cubos, df, inicio):
+    """
+    Soma aos cubos as linhas acrescentadas ao final da tabela.
+
+    Args:
+        cubos (dict): Cubos calculados sobre df.iloc[:inicio]
+        df (pd.DataFrame): Tabela completa já com as novas linhas
+        inicio (int): Posição da primeira linha nova
+
+    Returns:
+        dict: Novos cubos (os recebidos não são alterados)
+    """
+    novas = df.iloc[inicio:]
+    atualizados = {}
+    for dimensoes, cubo in cubos.items():
+        # Alinha as categorias dos cubos às da tabela, que podem ter ganho valores novos
+        cubo = cubo.astype({coluna: df[coluna].dtype for coluna in dimensoes})
+        atualizados[dimensoes] = somar_por(
+            pd.concat([cubo, somar_por(novas, dimensoes, dropna=False)]), dimensoes, dropna=False
+        )
+    return atualizados
+
+
+def encontrar_cubo(cubos, chaves, filtros):
+    """
+    Escolhe o menor cubo capaz de responder à consulta.
+
+    Args:
+        cubos (dict): Cubos criados por construir_cubos
+        chaves (list): Colunas de agrupamento pedidas
+        filtros (dict): Dicionário com colunas e valores para filtrar
+
+    Returns:
+        pd.DataFrame | None: Menor cubo que contém as chaves e as colunas dos
+            filtros ativos, ou None se nenhum cubo as contém
+    """
+    necessarias = set(chaves) | {coluna for coluna, valores in filtros.items() if valores}
+    candidatos = [cubo for dimensoes, cubo in cubos.items() if necessarias <= set(dimensoes)]
+    if not candidatos:
+        return None
+    return min(candidatos, key=len)
+
+
+def consultar_cubo(cubo, chaves, filtros, dropna=True):
+    """Filtra um cubo e soma o Valor FOB pelas chaves pedidas (ver somar_por)"""
+    return somar_por(aplicar_filtros(cubo, filtros), chaves, dropna)
+
+
+def agregar_memoria(df, cubos, indice, chaves, filtros, filtrado=None, dropna=True):
+    """
+    Soma o Valor FOB por chaves sobre os dados em memória.
+
+    A soma é respondida pelo menor cubo que cubra as chaves e os filtros,
+    recorrendo às linhas filtradas apenas quando nenhum cubo os cobre.
+
+    Args:
+        df (pd.DataFrame): Tabela completa carregada em memória
+        cubos (dict): Cubos criados por construir_cubos
+        indice (dict): Índice criado por indices.construir_indice
+        chaves (list): Colunas de agrupamento
+        filtros (dict): Dicionário com colunas e valores para filtrar
+        filtrado (callable, optional): Retorna df já filtrado por filtros
+        dropna (bool): Descartar as combinações com alguma chave nula
+
+    Returns:
+        pd.DataFrame: Uma linha por combinação de chaves, com a coluna
+            Valor_FOB e as chaves como colunas comuns (não categóricas)
+    """
+    cubo = encontrar_cubo(cubos, chaves, filtros)
+    if cubo is not None:
+        resultado = consultar_cubo(cubo, chaves, filtros, dropna)
+    else:
+        dados = filtrado() if filtrado is not None else aplicar_filtros(df, filtros, indice)
+        resultado = somar_por(dados, chaves, dropna)
+    # Resultados agregados voltam com colunas comuns, como no modo SQL
+    for coluna in chaves:
+        if isinstance(resultado[coluna].dtype, pd.CategoricalDtype):
+            resultado[coluna] = resultado[coluna].astype(resultado[coluna].cat.categories.dtype)
+    return resultado
+
+
+def calcular_agregados(df, cubos, indice, pedidos, filtros, filtrado=None, executor=None):
+    """
+    Executa o plano de agregações sobre os dados em memória.
+
+    Args:
+        df (pd.DataFrame): Tabela completa carregada em memória
+        cubos (dict): Cubos criados por construir_cubos
+        indice (dict): Índice criado por indices.construir_indice
+        pedidos (list): Tuplas de chaves de agrupamento
+        filtros (dict): Dicionário com colunas e valores para filtrar
+        filtrado (callable, optional): Retorna df já filtrado por filtros;
+            sem ele, as linhas são filtradas apenas se algum pedido precisar
+        executor (Executor, optional): Pool onde os pedidos independentes são
+            calculados em paralelo
+
+    Returns:
+        dict: Tupla de chaves -> DataFrame com as chaves e Valor_FOB
+    """
+    if filtrado is None:
+        filtrado = _preguicoso(partial(aplicar_filtros, df, filtros, indice))
+
+    def custo(chaves):
+        cubo = encontrar_cubo(cubos, chaves, filtros)
+        return len(cubo) if cubo is not None else len(filtrado())
+
+    return executar_plano(
+        pedidos, partial(agregar_memoria, df, cubos, indice, filtros=filtros, filtrado=filtrado, dropna=False),
+        custo, executor
+    )
+
+
+def calcular_faceta(df, cubos, indice, coluna, filtros):
+    """
+    Soma o Valor FOB de cada valor de uma coluna sob os filtros das demais.
+
+    É o que a barra lateral precisa para oferecer, em cada filtro, apenas os
+    valores que ainda têm dados diante dos outros filtros ativos. A resposta
+    vem de um cubo quando algum cobre a coluna e os demais filtros; caso
+    contrário, somente as linhas selecionadas pelo índice são agrupadas.
+
+    Args:
+        df (pd.DataFrame): Tabela completa carregada em memória
+        cubos (dict): Cubos criados por construir_cubos
+        indice (dict): Índice criado por indices.construir_indice
+        coluna (str): Coluna do filtro
+        filtros (dict): Dicionário com colunas e valores para filtrar
+
+    Returns:
+        pd.Series: Valor FOB por valor presente da coluna, em ordem crescente de valor
+    """
+    outros = {c: valores for c, valores in filtros.items() if c != coluna and valores}
+    cubo = encontrar_cubo(cubos, [coluna], outros)
+    if cubo is not None:
+        resultado = consultar_cubo(cubo, [coluna], outros)
+    else:
+        linhas = filtrar_linhas(indice, outros)
+        resultado = somar_por(df[[coluna, 'Valor_FOB']].iloc[linhas], [coluna])
+    totais = resultado.set_index(coluna)['Valor_FOB']
+    if isinstance(totais.index.dtype, pd.CategoricalDtype):
+        totais.index = totais.index.astype(totais.index.categories.dtype)
+    return totais.sort_index()
+
+
+def top_n_por_grupo(df, grupo, item, n_grupos, n_itens):
+    """
+    Seleciona os maiores grupos e, dentro de cada um, os maiores itens por Valor FOB.
+
+    Tudo sai de um único agrupamento por (grupo, item): o total de cada grupo
+    é a soma dos seus itens e o corte por grupo é feito com groupby().head().
+
+    Args:
+        df (pd.DataFrame): Linhas ou agregado com as colunas grupo, item e Valor_FOB
+        grupo (str): Coluna do ranking externo (ex.: 'Países')
+        item (str): Coluna do ranking dentro de cada grupo (ex.: 'Desc_SH6')
+        n_grupos (int): Número de grupos a manter
+        n_itens (int): Número de itens por grupo
+
+    Returns:
+        pd.DataFrame: Colunas grupo, item e Valor_FOB, com os grupos em ordem
+            crescente de total e os itens em ordem decrescente de valor
+    """
+    por_item = somar_por(df, [grupo, item])
+    totais = por_item.groupby(grupo, observed=True)['Valor_FOB'].sum()
+    top_grupos = totais.sort_values(ascending=True).tail(n_grupos)
+    ordem_grupo = pd.Series(range(len(top_grupos)), index=top_grupos.index)
+
+    selecionados = por_item[por_item[grupo].isin(top_grupos.index)]
+    selecionados = selecionados.assign(_ordem=selecionados[grupo].map(ordem_grupo).astype(int))
+    return (selecionados
+            .sort_values(['_ordem', 'Valor_FOB'], ascending=[True, False])
+            .groupby(grupo, observed=True, sort=False)
+            .head(n_itens)
+            .drop(columns='_ordem')
+            .reset_index(drop=True))
+
+
+def executar_plano(pedidos, calcular, custo, executor=None):
+    """
+    Calcula um conjunto de agregações reaproveitando resultados entre elas.
+
+    Os pedidos são processados em níveis, do maior para o menor número de
+    chaves. Cada um é obtido somando o menor resultado já calculado que
+    contenha suas chaves, quando esse resultado é menor que a fonte que seria
+    percorrida para calculá-lo diretamente. Pedidos de um mesmo nível não
+    dependem uns dos outros e, com um executor, são calculados em paralelo.
+
+    Durante o plano, as combinações com chaves nulas são mantidas, para que
+    os pedidos derivados (em especial o total geral, pedido como ()) incluam
+    essas linhas; elas só são descartadas dos resultados devolvidos.
+
+    Args:
+        pedidos (list): Tuplas de chaves de agrupamento
+        calcular (callable): Recebe as chaves e calcula a agregação na fonte,
+            mantendo as combinações com chaves nulas
+        custo (callable): Recebe as chaves e retorna o número de linhas que
+            calcular percorreria
+        executor (Executor, optional): Pool onde os pedidos de cada nível são
+            calculados; sem ele, o cálculo é sequencial
+
+    Returns:
+        dict: Tupla de chaves -> DataFrame com as chaves e Valor_FOB
+    """
+    resultados = {}
+    unicos = list(dict.fromkeys(tuple(p) for p in pedidos))
+    mapear = executor.map if executor is not None else map
+    for tamanho in sorted({len(chaves) for chaves in unicos}, reverse=True):
+        nivel = [chaves for chaves in unicos if len(chaves) == tamanho]
+        # As decisões (e o custo, que pode filtrar as linhas) ficam nesta thread;
+        # o pool recebe apenas as somas
+        tarefas = []
+        for chaves in nivel:
+            superconjuntos = [
+                resultado for outras, resultado in resultados.items()
+                if set(chaves) < set(outras)
+            ]
+            menor = min(superconjuntos, key=len, default=None)
+            if menor is not None and len(menor) < custo(chaves):
+                tarefas.append(partial(somar_por, menor, chaves, dropna=False))
+            else:
+                tarefas.append(partial(calcular, list(chaves)))
+        resultados.update(zip(nivel, mapear(_executar, tarefas)))
+    return {chaves: _sem_chaves_nulas(resultado, chaves) for chaves, resultado in resultados.items()}
+
+
+def _sem_chaves_nulas(resultado, chaves):
+    nulas = resultado[list(chaves)].isna().any(axis=1)
+    return resultado[~nulas].reset_index(drop=True) if nulas.any() else resultado
+
+
+def _executar(tarefa):
+    """Executa uma tarefa sem argumentos (usado com executor.map)"""
+    return tarefa()
+
+
+def _preguicoso(calcular):
+    """Calcula o valor na primeira chamada e o reaproveita nas seguintes, também entre threads"""
+    trava = threading.Lock()
+    valor = []
+
+    def obter():
+        with trava:
+            if not valor:
+                valor.append(calcular())
+            return valor[0]
+
+    return obter
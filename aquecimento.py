@@ -0,0 +1,133 @@
+"""
+Aquecimento do cache de resultados em segundo plano.
+
+Depois de cada carga (nova versão dos dados), as agregações da página sem
+filtros e das combinações de filtros mais usadas são calculadas por um pool de
+threads e guardadas no cache de resultados, antes que alguma sessão as peça.
+As combinações mais usadas vêm de um registro de uso gravado em disco, de
+forma que sobrevivem ao reinício do servidor.
+"""
+import json
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_resultados import normalizar_filtros, valor_json
+
+logger = logging.getLogger(__name__)
+
+
+class RegistroUso:
+    """
+    Contagem das combinações de filtros aplicadas pelos usuários.
+
+    Cada combinação aplicada é acrescentada como uma linha JSON ao arquivo;
+    as contagens são lidas do arquivo na primeira consulta.
+
+    Args:
+        caminho (Path): Arquivo JSON Lines do registro
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._contagens = None
+        self._trava = threading.Lock()
+
+    def _carregar(self):
+        contagens = Counter()
+        try:
+            with open(self.caminho, encoding='utf-8') as arquivo:
+                for linha in arquivo:
+                    linha = linha.strip()
+                    try:
+                        json.loads(linha)
+                    except json.JSONDecodeError:  # Linha truncada por uma escrita interrompida
+                        continue
+                    contagens[linha] += 1
+        except FileNotFoundError:
+            pass
+        return contagens
+
+    def registrar(self, filtros):
+        """
+        Registra a aplicação de uma combinação de filtros.
+
+        Args:
+            filtros (dict): Dicionário com colunas e valores aplicados
+        """
+        normalizados = normalizar_filtros(filtros)
+        if not normalizados:
+            return  # A página sem filtros é sempre aquecida
+        linha = json.dumps(normalizados, ensure_ascii=False, sort_keys=True, default=valor_json)
+        with self._trava:
+            if self._contagens is None:
+                self._contagens = self._carregar()
+            self._contagens[linha] += 1
+            try:
+                with open(self.caminho, 'a', encoding='utf-8') as arquivo:
+                    arquivo.write(linha + '\n')
+            except OSError as e:
+                # A combinação já foi contada em memória; só não sobrevive a um reinício
+                logger.warning("Não foi possível gravar o registro de uso: %s", e)
+
+    def mais_usados(self, n):
+        """
+        Retorna as combinações de filtros aplicadas mais vezes.
+
+        Args:
+            n (int): Número máximo de combinações
+
+        Returns:
+            list: Dicionários de filtros, do mais para o menos usado
+        """
+        with self._trava:
+            if self._contagens is None:
+                self._contagens = self._carregar()
+            return [json.loads(linha) for linha, _ in self._contagens.most_common(n)]
+
+
+class Aquecedor:
+    """
+    Pool de threads que calcula resultados e os guarda no cache de resultados.
+
+    Cada versão dos dados é aquecida uma única vez por processo.
+
+    Args:
+        cache (CacheResultados): Cache onde os resultados são guardados
+        max_workers (int): Número de threads do pool
+    """
+
+    def __init__(self, cache, max_workers):
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='aquecimento')
+        self._versoes = set()
+        self._trava = threading.Lock()
+
+    def aquecer(self, versao, gerar_tarefas):
+        """
+        Agenda o aquecimento de uma versão dos dados, se ainda não foi feito.
+
+        Args:
+            versao: Identificação da versão dos dados
+            gerar_tarefas (callable): Retorna pares (chave, calcular), chamado
+                apenas quando a versão ainda não foi aquecida
+
+        Returns:
+            bool: True se o aquecimento foi agendado agora
+        """
+        with self._trava:
+            if versao in self._versoes:
+                return False
+            self._versoes.add(versao)
+        for chave, calcular in gerar_tarefas():
+            futuro = self._executor.submit(self.cache.obter, chave, calcular, contar=False)
+            futuro.add_done_callback(_registrar_falha)
+        return True
+
+
+def _registrar_falha(futuro):
+    """Registra no log o erro de uma tarefa de aquecimento, sem interromper as demais"""
+    erro = futuro.exception()
+    if erro is not None:
+        logger.warning("Falha ao aquecer o cache de resultados: %s", erro)
@@ -0,0 +1,241 @@
+"""
+Medição de desempenho do dashboard sobre bases sintéticas.
+
+Para cada tamanho pedido, gera (uma única vez) um banco com gerar_dados.py e
+mede as etapas que o dashboard executa: carga do SQLite e do snapshot
+colunar, construção dos cubos e do índice, filtragem, cada agregação dos
+gráficos e a serialização das figuras, sob um conjunto de filtros
+representativos. No modo SQL são medidas as agregações executadas pelo
+próprio SQLite. Os tempos são gravados em JSON e podem ser comparados com uma
+execução anterior para detectar regressões.
+
+Uso:
+    python benchmark.py --tamanhos 1M 10M --modos memoria sql
+    python benchmark.py --tamanhos 1M --comparar bench_dados/resultado_anterior.json
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from agregacoes import (
+    AGRUPAMENTOS, DIMENSOES_FILTRO, agregar_memoria, aplicar_filtros, calcular_agregados,
+    construir_cubos, top_n_por_grupo
+)
+from consultas import agregar_valor_fob, conectar
+from cores import cores_distintas
+from dados import carregar_tabela, ler_snapshot, salvar_snapshot, versao_arquivo
+from gerar_dados import gerar_banco, ler_quantidade
+from graficos import figura_barras, figura_empilhada, figura_mapa, figura_temporal
+from indices import construir_indice
+from paises import tabela_paises
+
+DIRETORIO_PADRAO = Path(__file__).parent / "bench_dados"
+
+# Diferenças menores que esta não contam como regressão (ruído em etapas de microssegundos)
+DIFERENCA_MINIMA_S = 0.001
+
+
+def medir(funcao, repeticoes):
+    """
+    Executa a função repetidas vezes e mede o tempo de cada execução.
+
+    Returns:
+        tuple: Resultado da última execução e dicionário com a mediana e o
+            mínimo dos tempos, em segundos
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return resultado, {'mediana_s': statistics.median(tempos), 'minimo_s': min(tempos)}
+
+
+def filtros_representativos(cubos):
+    """
+    Monta os filtros medidos a partir dos valores mais frequentes da base.
+
+    Os valores saem dos cubos, de modo que existam em qualquer tamanho e semente.
+    """
+    def maiores(coluna, n):
+        cubo = cubos[(coluna,)]
+        return cubo.nlargest(n, 'Valor_FOB')[coluna].tolist()
+
+    anos = sorted(cubos[('Ano', 'Fluxo')]['Ano'].unique().tolist())
+    return {
+        'sem_filtros': {},
+        'ultimo_ano': {'Ano': anos[-1:]},
+        'exportacao_3_paises': {'Fluxo': ['Exportação'], 'Países': maiores('Países', 3)},
+        'uf_2_anos': {'UF': maiores('UF', 1), 'Ano': anos[-2:]},
+        '5_produtos': {'Desc_SH6': maiores('Desc_SH6', 5)},
+    }
+
+
+def figuras(agregados):
+    """Funções que constroem e serializam cada figura a partir das agregações sem filtros"""
+    def ranking(coluna):
+        return agregados[(coluna,)].sort_values('Valor_FOB', ascending=False).head(20)
+
+    empilhado = top_n_por_grupo(agregados[('Países', 'Desc_SH6')], 'Países', 'Desc_SH6', 10, 5)
+    # Os agregados não trazem o Cod_SH6: a descrição identifica cada produto
+    cores = cores_distintas(empilhado['Desc_SH6'].unique())
+    codigos, _ = tabela_paises(agregados[('Países',)]['Países'])
+    df_mapa = agregados[('Países',)].assign(ISO3=agregados[('Países',)]['Países'].astype(str).map(codigos))
+    return {
+        'temporal': lambda: figura_temporal(agregados[('Ano', 'Fluxo')]).to_json(),
+        'mapa': lambda: figura_mapa(df_mapa.dropna(subset=['ISO3'])).to_json(),
+        'barras_paises': lambda: figura_barras(ranking('Países'), 'Países').to_json(),
+        'barras_urf': lambda: figura_barras(ranking('URF'), 'URF').to_json(),
+        'barras_secoes': lambda: figura_barras(ranking('Desc_Secao'), 'Desc_Secao').to_json(),
+        'barras_produtos': lambda: figura_barras(ranking('Desc_SH6'), 'Desc_SH6').to_json(),
+        'empilhado_paises': lambda: figura_empilhada(empilhado, 'Países', 'País', 10, cores).to_json(),
+    }
+
+
+def medir_memoria(caminho, repeticoes, registrar):
+    """Mede as etapas do modo em memória sobre o banco informado"""
+    with conectar(caminho) as conn:
+        df, tempos = medir(partial(carregar_tabela, conn), 1)
+    registrar('carga_sqlite', None, tempos)
+    _, tempos = medir(partial(salvar_snapshot, df, caminho, versao_arquivo(caminho), len(df)), 1)
+    registrar('gravacao_snapshot', None, tempos)
+    _, tempos = medir(partial(ler_snapshot, caminho), repeticoes)
+    registrar('carga_snapshot', None, tempos)
+    cubos, tempos = medir(partial(construir_cubos, df), 1)
+    registrar('cubos', None, tempos)
+    indice, tempos = medir(partial(construir_indice, df, colunas=DIMENSOES_FILTRO), 1)
+    registrar('indice', None, tempos)
+
+    for nome, filtros in filtros_representativos(cubos).items():
+        _, tempos = medir(partial(aplicar_filtros, df, filtros, indice), repeticoes)
+        registrar('filtragem', nome, tempos)
+        for chaves in AGRUPAMENTOS:
+            _, tempos = medir(partial(agregar_memoria, df, cubos, indice, list(chaves), filtros), repeticoes)
+            registrar(f"agregacao:{','.join(chaves)}", nome, tempos)
+        agregados, tempos = medir(
+            partial(calcular_agregados, df, cubos, indice, AGRUPAMENTOS, filtros), repeticoes
+        )
+        registrar('plano', nome, tempos)
+        if not filtros:
+            for figura, serializar in figuras(agregados).items():
+                _, tempos = medir(serializar, repeticoes)
+                registrar(f"figura:{figura}", nome, tempos)
+
+
+def medir_sql(caminho, repeticoes, registrar):
+    """Mede as agregações do modo SQL, executadas pelo próprio SQLite"""
+    with conectar(caminho) as conn:
+        cubos = {(coluna,): agregar_valor_fob(conn, [coluna], {}) for coluna in DIMENSOES_FILTRO}
+        cubos[('Ano', 'Fluxo')] = agregar_valor_fob(conn, ['Ano', 'Fluxo'], {})
+        for nome, filtros in filtros_representativos(cubos).items():
+            for chaves in AGRUPAMENTOS:
+                _, tempos = medir(partial(agregar_valor_fob, conn, list(chaves), filtros), repeticoes)
+                registrar(f"agregacao:{','.join(chaves)}", nome, tempos)
+
+
+MODOS = {'memoria': medir_memoria, 'sql': medir_sql}
+
+
+def metadados():
+    """Ambiente da execução, gravado junto com os tempos"""
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def identificar(resultado):
+    """Identificação de uma medida, usada para casá-la com a execução anterior"""
+    return resultado['linhas'], resultado['modo'], resultado['etapa'], resultado['filtros']
+
+
+def comparar(resultados, anteriores, tolerancia):
+    """
+    Imprime a razão entre os tempos atuais e os de uma execução anterior.
+
+    Args:
+        resultados (list): Resultados desta execução
+        anteriores (list): Resultados lidos do arquivo anterior
+        tolerancia (float): Aumento relativo do menor tempo aceito sem acusar
+            regressão (o menor tempo é o menos sensível a ruído da máquina)
+
+    Returns:
+        int: Número de regressões encontradas
+    """
+    por_chave = {identificar(r): r for r in anteriores}
+    regressoes = 0
+    for resultado in resultados:
+        anterior = por_chave.get(identificar(resultado))
+        if anterior is None or not anterior['minimo_s']:
+            continue
+        razao = resultado['minimo_s'] / anterior['minimo_s']
+        marcador = ''
+        if razao > 1 + tolerancia and resultado['minimo_s'] - anterior['minimo_s'] > DIFERENCA_MINIMA_S:
+            regressoes += 1
+            marcador = '  REGRESSÃO'
+        print(f"{resultado['linhas']:>12,} {resultado['modo']:<8} {resultado['etapa']:<32} "
+              f"{resultado['filtros'] or '-':<20} {razao:6.2f}x{marcador}")
+    return regressoes
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Mede as etapas do dashboard sobre bases sintéticas")
+    parser.add_argument('--tamanhos', nargs='+', type=ler_quantidade,
+                        default=[ler_quantidade(t) for t in ('1M', '10M', '50M')],
+                        help="Número de linhas de cada base (aceita sufixos K e M; padrão: 1M 10M 50M)")
+    parser.add_argument('--modos', nargs='+', choices=list(MODOS), default=['memoria'],
+                        help="Modos medidos (padrão: memoria)")
+    parser.add_argument('--repeticoes', type=int, default=3, help="Execuções de cada etapa rápida")
+    parser.add_argument('--diretorio', type=Path, default=DIRETORIO_PADRAO,
+                        help="Onde os bancos sintéticos e os resultados são gravados")
+    parser.add_argument('--semente', type=int, default=42, help="Semente dos bancos sintéticos")
+    parser.add_argument('--saida', type=Path, help="Arquivo JSON dos resultados")
+    parser.add_argument('--comparar', type=Path, help="Resultados anteriores para comparação")
+    parser.add_argument('--tolerancia', type=float, default=0.2,
+                        help="Aumento relativo aceito antes de acusar regressão (padrão: 0.2)")
+    args = parser.parse_args(argumentos)
+
+    resultados = []
+    for linhas in args.tamanhos:
+        caminho = args.diretorio / f"comex_{linhas}_s{args.semente}.sqlite"
+        if not caminho.exists():
+            print(f"Gerando {caminho} ({linhas:,} linhas)...")
+            gerar_banco(caminho, linhas, args.semente)
+        for modo in args.modos:
+            def registrar(etapa, filtros, tempos):
+                resultados.append({'linhas': linhas, 'modo': modo, 'etapa': etapa, 'filtros': filtros, **tempos})
+                print(f"{linhas:>12,} {modo:<8} {etapa:<32} {filtros or '-':<20} {tempos['mediana_s'] * 1000:10.1f} ms")
+            MODOS[modo](caminho, args.repeticoes, registrar)
+
+    saida = args.saida or args.diretorio / f"resultado_{datetime.now():%Y%m%d_%H%M%S}.json"
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump({'metadados': metadados(), 'resultados': resultados}, arquivo, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            anteriores = json.load(arquivo)['resultados']
+        print(f"\nComparação com {args.comparar}:")
+        if comparar(resultados, anteriores, args.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
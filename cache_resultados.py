@@ -0,0 +1,132 @@
+"""
+Cache de resultados compartilhado entre as sessões do servidor.
+
+Os resultados (linhas filtradas, agregações dos gráficos) são guardados sob
+um hash canônico dos filtros e dos parâmetros que os produziram, de forma que
+a mesma combinação de filtros aberta por outra sessão, ou revisitada pela
+mesma, seja servida sem recálculo. Os itens menos usados recentemente são
+descartados quando o total ultrapassa o orçamento de memória.
+"""
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+EstatisticasCache = namedtuple('EstatisticasCache', ['acertos', 'falhas', 'itens', 'bytes', 'limite_bytes'])
+
+
+def normalizar_filtros(filtros):
+    """Remove filtros vazios e ordena os valores, para que seleções equivalentes tenham a mesma chave"""
+    return {
+        coluna: sorted(valores, key=str)
+        for coluna, valores in sorted(filtros.items()) if valores
+    }
+
+
+def valor_json(valor):
+    """Converte escalares numpy para tipos nativos; demais objetos viram texto"""
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return str(valor)
+
+
+def chave_resultado(*partes):
+    """
+    Gera a chave canônica de um resultado.
+
+    Args:
+        *partes: Valores serializáveis em JSON que identificam o resultado
+            (tipo de consulta, versão dos dados, filtros normalizados, parâmetros)
+
+    Returns:
+        str: Hash SHA-256 das partes
+    """
+    texto = json.dumps(partes, sort_keys=True, default=valor_json, ensure_ascii=False)
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def tamanho_resultado(valor):
+    """Estimativa em bytes da memória ocupada por um resultado"""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        uso = valor.memory_usage(deep=True, index=True)
+        return int(uso.sum()) if isinstance(uso, pd.Series) else int(uso)
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, dict):
+        return sum(tamanho_resultado(item) for item in valor.values())
+    return sys.getsizeof(valor)
+
+
+class CacheResultados:
+    """
+    Cache LRU com orçamento de memória e contadores de acertos e falhas.
+
+    Os resultados são devolvidos sem cópia e não devem ser alterados por
+    quem os recebe.
+
+    Args:
+        limite_bytes (int): Memória máxima ocupada pelos resultados guardados
+    """
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self._itens = OrderedDict()  # chave -> (resultado, tamanho)
+        self._bytes = 0
+        self._acertos = 0
+        self._falhas = 0
+        self._trava = threading.Lock()
+
+    def obter(self, chave, calcular, contar=True):
+        """
+        Retorna o resultado guardado sob a chave, calculando-o se necessário.
+
+        O cálculo é feito fora da trava: sessões que pedem resultados
+        diferentes não esperam umas pelas outras.
+
+        Args:
+            chave (str): Chave criada por chave_resultado
+            calcular (callable): Função sem argumentos que produz o resultado
+            contar (bool): Se False, o pedido não entra nos contadores de
+                acertos e falhas (ex.: aquecimento em segundo plano)
+
+        Returns:
+            Resultado guardado ou recém-calculado
+        """
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None:
+                self._itens.move_to_end(chave)
+                self._acertos += contar
+                return item[0]
+            self._falhas += contar
+
+        resultado = calcular()
+        tamanho = tamanho_resultado(resultado)
+        if tamanho > self.limite_bytes:
+            return resultado  # Maior que o orçamento inteiro: não é guardado
+
+        with self._trava:
+            if chave not in self._itens:
+                self._itens[chave] = (resultado, tamanho)
+                self._bytes += tamanho
+            while self._bytes > self.limite_bytes:
+                _, (_, tamanho_antigo) = self._itens.popitem(last=False)
+                self._bytes -= tamanho_antigo
+        return resultado
+
+    def estatisticas(self):
+        """
+        Retorna os contadores do cache.
+
+        Returns:
+            EstatisticasCache: Acertos, falhas, número de itens, bytes ocupados
+                e limite de bytes
+        """
+        with self._trava:
+            return EstatisticasCache(
+                self._acertos, self._falhas, len(self._itens), self._bytes, self.limite_bytes
+            )
@@ -0,0 +1,389 @@
+"""
+Camada de consultas ao banco SQLite do dashboard.
+
+Traduz os filtros da barra lateral em cláusulas WHERE parametrizadas e
+executa as somas de Valor FOB diretamente no SQLite, de forma que apenas os
+resultados agregados voltem para o Python.
+"""
+import os
+import sqlite3
+import string
+import threading
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+TABELA = "comercio_exterior"
+
+# Nomes usados no dashboard -> colunas da tabela comercio_exterior
+COLUNAS_SQL = {
+    'Fluxo': 'Fluxo',
+    'Ano': 'Ano',
+    'Países': '"Países"',
+    'UF': '"UF do Produto"',
+    'URF': 'URF',
+    'Cod_Secao': '"Código Seção"',
+    'Desc_Secao': '"Descrição Seção"',
+    'Via': 'Via',
+    'Cod_SH6': '"Código SH6"',
+    'Desc_SH6': '"Descrição SH6"',
+    'Valor_FOB': '"Valor US$ FOB"',
+}
+
+# Colunas retornadas para a tabela de dados detalhados e para o download
+COLUNAS_DETALHE = [
+    'Fluxo', 'Ano', 'Países', 'UF', 'URF', 'Cod_Secao', 'Desc_Secao',
+    'Via', 'Cod_SH6', 'Desc_SH6', 'Valor_FOB'
+]
+
+# Colunas em que a busca da tabela de dados detalhados procura o termo
+COLUNAS_BUSCA = [coluna for coluna in COLUNAS_DETALHE if coluna != 'Valor_FOB']
+
+# Bytes do banco mapeados em memória e cache de páginas (KiB) de cada conexão de leitura
+MMAP_BYTES = 256 * 1024 * 1024
+CACHE_KIB = 64 * 1024
+
+
+@contextmanager
+def conectar(caminho):
+    """Abre uma conexão com o banco e garante o fechamento ao final"""
+    with closing(sqlite3.connect(caminho)) as conn:
+        yield conn
+
+
+def modo_wal(caminho):
+    """Indica se o banco está em modo WAL (versões de leitura e escrita iguais a 2 no cabeçalho)"""
+    with open(caminho, 'rb') as arquivo:
+        cabecalho = arquivo.read(20)
+    return len(cabecalho) == 20 and cabecalho[18] == 2 and cabecalho[19] == 2
+
+
+class PoolConexoes:
+    """
+    Conexões somente leitura reaproveitadas entre sessões e threads do processo.
+
+    As conexões são abertas com mode=ro e mantêm entre usos as consultas
+    compiladas, o cache de páginas e o mapeamento do arquivo em memória.
+    Quando o banco é declarado estático e não está em modo WAL, também usam
+    immutable=1, que dispensa as travas e a verificação de mudanças; se o
+    arquivo mudar mesmo assim, as conexões abertas são descartadas. Em modo
+    WAL immutable=1 nunca é usado, pois as transações ainda não transferidas
+    para o banco ficam no arquivo -wal.
+
+    Args:
+        caminho (Path): Caminho do banco SQLite
+        tamanho (int): Número máximo de conexões ociosas mantidas no pool
+        imutavel (bool): O arquivo não muda enquanto o processo roda
+    """
+
+    def __init__(self, caminho, tamanho=4, imutavel=False):
+        self.caminho = Path(caminho).resolve()
+        self.tamanho = tamanho
+        self.wal = modo_wal(self.caminho)
+        self.imutavel = imutavel and not self.wal
+        self._estado = self._estado_arquivo()
+        self._geracao = 0
+        self._livres = []
+        self._trava = threading.Lock()
+
+    def _estado_arquivo(self):
+        estado = os.stat(self.caminho)
+        return estado.st_size, estado.st_mtime_ns
+
+    def _abrir(self):
+        opcoes = 'mode=ro&immutable=1' if self.imutavel else 'mode=ro'
+        conn = sqlite3.connect(f"{self.caminho.as_uri()}?{opcoes}", uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size = {MMAP_BYTES}")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_KIB}")
+        return conn
+
+    def _descartar_se_mudou(self):
+        """Com immutable=1 o SQLite não percebe mudanças no arquivo: as conexões são renovadas"""
+        estado = self._estado_arquivo()
+        if estado != self._estado:
+            self._estado = estado
+            self._geracao += 1
+            for conn in self._livres:
+                conn.close()
+            self._livres.clear()
+
+    @contextmanager
+    def conexao(self):
+        """Empresta uma conexão do pool, devolvendo-a ao final"""
+        with self._trava:
+            if self.imutavel:
+                self._descartar_se_mudou()
+            conn = self._livres.pop() if self._livres else None
+            geracao = self._geracao
+        if conn is None:
+            conn = self._abrir()
+        try:
+            yield conn
+        finally:
+            with self._trava:
+                if geracao == self._geracao and len(self._livres) < self.tamanho:
+                    self._livres.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+
+def _valor_sql(valor):
+    """Converte escalares do NumPy (ex.: anos vindos do multiselect) para tipos aceitos pelo sqlite3"""
+    return valor.item() if hasattr(valor, 'item') else valor
+
+
+def expressao_select(colunas):
+    """Monta a lista do SELECT renomeando as colunas da tabela para os nomes do dashboard"""
+    return ", ".join(f'{COLUNAS_SQL[col]} AS "{col}"' for col in colunas)
+
+
+def montar_where(filtros):
+    """
+    Monta a cláusula WHERE parametrizada correspondente aos filtros ativos.
+
+    Args:
+        filtros (dict): Dicionário com colunas e valores para filtrar
+
+    Returns:
+        tuple: Texto da cláusula (vazio se não houver filtros) e lista de parâmetros
+    """
+    clausulas = []
+    parametros = []
+    for coluna, valores in filtros.items():
+        if valores:  # Só aplica o filtro se houver valores selecionados
+            marcadores = ", ".join("?" * len(valores))
+            clausulas.append(f"{COLUNAS_SQL[coluna]} IN ({marcadores})")
+            parametros.extend(_valor_sql(v) for v in valores)
+    if not clausulas:
+        return "", []
+    return "WHERE " + " AND ".join(clausulas), parametros
+
+
+def contar_linhas(conn):
+    """Retorna uma estimativa barata do número de linhas da tabela (maior rowid)"""
+    (total,) = conn.execute(f"SELECT MAX(rowid) FROM {TABELA}").fetchone()
+    return total or 0
+
+
+def listar_valores(conn, coluna):
+    """Retorna os valores distintos de uma coluna em ordem crescente"""
+    col = COLUNAS_SQL[coluna]
+    linhas = conn.execute(
+        f"SELECT DISTINCT {col} FROM {TABELA} WHERE {col} IS NOT NULL ORDER BY {col}"
+    ).fetchall()
+    return [valor for (valor,) in linhas]
+
+
+def codigos_por_descricao(conn, coluna_codigo, coluna_descricao, descricoes):
+    """
+    Código de cada descrição (ex.: o Cod_SH6 de cada Desc_SH6).
+
+    Uma consulta por descrição, limitada à primeira linha encontrada: com o
+    índice da descrição (manutencao_db.py) cada uma é uma única busca no
+    índice, e sem ele a leitura para no primeiro registro do produto.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco
+        coluna_codigo (str): Coluna do código (nome do dashboard)
+        coluna_descricao (str): Coluna da descrição (nome do dashboard)
+        descricoes (iterable): Descrições procuradas
+
+    Returns:
+        dict: Descrição -> código (descrições ausentes ficam de fora)
+    """
+    query = (
+        f"SELECT {COLUNAS_SQL[coluna_codigo]} FROM {TABELA} "
+        f"WHERE {COLUNAS_SQL[coluna_descricao]} = ? LIMIT 1"
+    )
+    codigos = {}
+    for descricao in descricoes:
+        linha = conn.execute(query, (descricao,)).fetchone()
+        if linha is not None:
+            codigos[descricao] = linha[0]
+    return codigos
+
+
+def agregar_valor_fob(conn, chaves, filtros):
+    """
+    Soma o Valor FOB agrupado pelas chaves informadas, filtrando no próprio SQLite.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco
+        chaves (list): Colunas de agrupamento (nomes do dashboard)
+        filtros (dict): Dicionário com colunas e valores para filtrar
+
+    Returns:
+        pd.DataFrame: Uma linha por combinação de chaves, com a coluna Valor_FOB
+    """
+    query, parametros = query_agregado(chaves, filtros)
+    return pd.read_sql_query(query, conn, params=parametros)
+
+
+def query_agregado(chaves, filtros):
+    """Consulta da soma de Valor FOB por chaves (sem chaves, o total geral), com seus parâmetros"""
+    where, parametros = montar_where(filtros)
+    if not chaves:
+        # TOTAL() retorna 0 em vez de NULL quando nenhuma linha é selecionada
+        return f"SELECT TOTAL({COLUNAS_SQL['Valor_FOB']}) AS Valor_FOB FROM {TABELA} {where}", parametros
+    grupos = ", ".join(COLUNAS_SQL[col] for col in chaves)
+    query = f"""
+    SELECT {expressao_select(chaves)}, SUM({COLUNAS_SQL['Valor_FOB']}) AS Valor_FOB
+    FROM {TABELA}
+    {where}
+    GROUP BY {grupos}
+    ORDER BY {grupos}
+    """
+    return query, parametros
+
+
+def top_n_por_grupo(conn, grupo, item, filtros, n_grupos, n_itens):
+    """
+    Seleciona os maiores grupos e os maiores itens de cada um em uma única consulta.
+
+    Usa funções de janela (SQLite 3.25 ou superior) sobre a soma por (grupo, item).
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco
+        grupo (str): Coluna do ranking externo (ex.: 'Países')
+        item (str): Coluna do ranking dentro de cada grupo (ex.: 'Desc_SH6')
+        filtros (dict): Dicionário com colunas e valores para filtrar
+        n_grupos (int): Número de grupos a manter
+        n_itens (int): Número de itens por grupo
+
+    Returns:
+        pd.DataFrame: Colunas grupo, item e Valor_FOB, com os grupos em ordem
+            crescente de total e os itens em ordem decrescente de valor
+    """
+    where, parametros = montar_where(filtros)
+    query = f"""
+    WITH por_item AS (
+        SELECT {expressao_select([grupo, item])}, SUM({COLUNAS_SQL['Valor_FOB']}) AS Valor_FOB
+        FROM {TABELA}
+        {where}
+        GROUP BY {COLUNAS_SQL[grupo]}, {COLUNAS_SQL[item]}
+    ),
+    top_grupos AS (
+        SELECT "{grupo}", SUM(Valor_FOB) AS total
+        FROM por_item
+        GROUP BY "{grupo}"
+        ORDER BY total DESC
+        LIMIT ?
+    ),
+    ranqueados AS (
+        SELECT p.*, t.total,
+               ROW_NUMBER() OVER (PARTITION BY p."{grupo}" ORDER BY p.Valor_FOB DESC) AS posicao
+        FROM por_item p
+        JOIN top_grupos t ON t."{grupo}" = p."{grupo}"
+    )
+    SELECT "{grupo}", "{item}", Valor_FOB
+    FROM ranqueados
+    WHERE posicao <= ?
+    ORDER BY total, "{grupo}", Valor_FOB DESC
+    """
+    return pd.read_sql_query(query, conn, params=parametros + [int(n_grupos), int(n_itens)])
+
+
+def iterar_linhas(conn, filtros, tamanho_bloco):
+    """
+    Lê as linhas filtradas em blocos, na ordem da tabela (rowid).
+
+    A leitura percorre a tabela sem índices (NOT INDEXED), que já entrega as
+    linhas em ordem de rowid: não há ordenação prévia do resultado, e apenas
+    um bloco de linhas fica em memória por vez enquanto o arquivo de
+    exportação é gravado. A ordem é a mesma do modo em memória, cuja tabela é
+    carregada em ordem de rowid.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco
+        filtros (dict): Dicionário com colunas e valores para filtrar
+        tamanho_bloco (int): Linhas por bloco
+
+    Yields:
+        pd.DataFrame: Blocos com as colunas de COLUNAS_DETALHE
+    """
+    where, parametros = montar_where(filtros)
+    query = f"""
+    SELECT {expressao_select(COLUNAS_DETALHE)}
+    FROM {TABELA} NOT INDEXED
+    {where}
+    ORDER BY rowid
+    """
+    yield from pd.read_sql_query(query, conn, params=parametros, chunksize=tamanho_bloco)
+
+
+# Letras ASCII maiúsculas -> minúsculas: a única diferença que o LIKE do SQLite ignora
+MINUSCULAS_ASCII = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def montar_busca(termo, colunas=COLUNAS_BUSCA):
+    """
+    Monta a condição que seleciona as linhas em que alguma coluna contém o termo.
+
+    Usa LIKE, que no SQLite não diferencia maiúsculas apenas em letras ASCII
+    ('exportação' encontra 'EXPORTAÇãO', mas não 'EXPORTAÇÃO'); o modo em
+    memória reproduz essa regra com MINUSCULAS_ASCII. Os curingas % e _
+    digitados na busca são tratados como texto.
+
+    Args:
+        termo (str): Texto procurado
+        colunas (list): Colunas pesquisadas (nomes do dashboard)
+
+    Returns:
+        tuple: Texto da condição e lista de parâmetros
+    """
+    padrao = "%" + termo.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    condicao = " OR ".join(f"CAST({COLUNAS_SQL[col]} AS TEXT) LIKE ? ESCAPE '\\'" for col in colunas)
+    return f"({condicao})", [padrao] * len(colunas)
+
+
+def _where_pagina(filtros, busca):
+    """Cláusula WHERE dos filtros ativos somada à condição da busca, se houver"""
+    where, parametros = montar_where(filtros)
+    if not busca:
+        return where, parametros
+    condicao, parametros_busca = montar_busca(busca)
+    where = f"{where} AND {condicao}" if where else f"WHERE {condicao}"
+    return where, parametros + parametros_busca
+
+
+def contar_selecao(conn, filtros, busca=""):
+    """Número de linhas que atendem aos filtros e à busca"""
+    where, parametros = _where_pagina(filtros, busca)
+    (total,) = conn.execute(f"SELECT COUNT(*) FROM {TABELA} {where}", parametros).fetchone()
+    return total
+
+
+def consultar_pagina(conn, filtros, ordenar_por, crescente, limite, deslocamento, busca=""):
+    """
+    Retorna uma página das linhas filtradas, ordenada no próprio SQLite.
+
+    O rowid desempata a ordenação, de forma que as páginas não se sobreponham.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco
+        filtros (dict): Dicionário com colunas e valores para filtrar
+        ordenar_por (str): Coluna de ordenação (nome do dashboard)
+        crescente (bool): Ordem crescente ou decrescente
+        limite (int): Linhas por página
+        deslocamento (int): Linhas anteriores à página
+        busca (str): Termo procurado em COLUNAS_BUSCA; vazio não restringe
+
+    Returns:
+        pd.DataFrame: Linhas da página com as colunas de COLUNAS_DETALHE, com
+            Ano em Int16 como no modo em memória (uma página com anos nulos
+            não vira float)
+    """
+    where, parametros = _where_pagina(filtros, busca)
+    direcao = "ASC" if crescente else "DESC"
+    query = f"""
+    SELECT {expressao_select(COLUNAS_DETALHE)}
+    FROM {TABELA}
+    {where}
+    ORDER BY {COLUNAS_SQL[ordenar_por]} {direcao}, rowid
+    LIMIT ? OFFSET ?
+    """
+    return pd.read_sql_query(
+        query, conn, params=parametros + [int(limite), int(deslocamento)], dtype={'Ano': 'Int16'}
+    )
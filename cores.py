@@ -0,0 +1,134 @@
+"""
+Cores fixas dos produtos nos gráficos empilhados.
+
+A cor preferida de cada produto é derivada do seu código SH6 por um hash
+estável, que escolhe uma entrada de uma paleta espaçada no espaço OKLCH (tons
+igualmente distribuídos em três níveis de luminosidade, de percepção
+semelhante). Ela não depende de quais outros produtos existem na base, de modo
+que permanece a mesma entre atualizações dos dados e entre processos do
+servidor, e só é calculada para os produtos efetivamente exibidos. Quando dois
+produtos de um mesmo gráfico caem na mesma entrada, cores_distintas desfaz a
+colisão de forma determinística.
+"""
+import hashlib
+import math
+from functools import cache, lru_cache
+
+# Paleta: MATIZES tons em cada nível de luminosidade, todos com o mesmo croma
+MATIZES = 72
+LUMINOSIDADES = (0.62, 0.72, 0.82)
+CROMA = 0.14
+
+
+def _gama_srgb(valor):
+    """Converte um componente linear em sRGB com correção de gama"""
+    if valor <= 0.0031308:
+        return 12.92 * valor
+    return 1.055 * valor ** (1 / 2.4) - 0.055
+
+
+def _oklch_para_rgb_linear(luminosidade, croma, matiz):
+    a = croma * math.cos(math.radians(matiz))
+    b = croma * math.sin(math.radians(matiz))
+    l_ = (luminosidade + 0.3963377774 * a + 0.2158037573 * b) ** 3
+    m_ = (luminosidade - 0.1055613458 * a - 0.0638541728 * b) ** 3
+    s_ = (luminosidade - 0.0894841775 * a - 1.2914855480 * b) ** 3
+    return (
+        4.0767416621 * l_ - 3.3077115913 * m_ + 0.2309699292 * s_,
+        -1.2684380046 * l_ + 2.6097574011 * m_ - 0.3413193965 * s_,
+        -0.0041960863 * l_ - 0.7034186147 * m_ + 1.7076147010 * s_,
+    )
+
+
+def oklch_para_hex(luminosidade, croma, matiz):
+    """
+    Converte uma cor OKLCH em hexadecimal sRGB.
+
+    Cores fora do gamute sRGB têm o croma reduzido até caberem, preservando a
+    luminosidade e o tom.
+
+    Args:
+        luminosidade (float): L, de 0 a 1
+        croma (float): C (cerca de 0 a 0.37)
+        matiz (float): h, em graus
+
+    Returns:
+        str: Cor no formato '#rrggbb'
+    """
+    rgb = _oklch_para_rgb_linear(luminosidade, croma, matiz)
+    while croma > 0 and not all(0 <= componente <= 1 for componente in rgb):
+        croma = max(croma - 0.005, 0)
+        rgb = _oklch_para_rgb_linear(luminosidade, croma, matiz)
+    return '#' + ''.join(
+        f"{round(min(max(_gama_srgb(componente), 0), 1) * 255):02x}" for componente in rgb
+    )
+
+
+@cache
+def paleta():
+    """
+    Paleta de cores dos produtos, montada uma vez por processo.
+
+    Os níveis de luminosidade se alternam a cada tom, de forma que entradas
+    vizinhas diferem tanto no tom quanto na luminosidade.
+
+    Returns:
+        tuple: Cores no formato '#rrggbb'
+    """
+    return tuple(
+        oklch_para_hex(LUMINOSIDADES[(i + nivel) % len(LUMINOSIDADES)], CROMA, i * 360 / MATIZES)
+        for nivel in range(len(LUMINOSIDADES))
+        for i in range(MATIZES)
+    )
+
+
+@lru_cache(maxsize=4096)
+def posicao_preferida(codigo):
+    """
+    Entrada da paleta preferida por um produto.
+
+    Args:
+        codigo (str): Código SH6 do produto (outro identificador estável, como a
+            descrição, também serve)
+
+    Returns:
+        int: Posição em paleta()
+    """
+    # blake2b em vez de hash(): o hash de strings do Python muda a cada processo
+    resumo = hashlib.blake2b(str(codigo).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(resumo, 'big') % len(paleta())
+
+
+def cor_produto(codigo):
+    """Cor preferida de um produto, no formato '#rrggbb' (ver posicao_preferida)"""
+    return paleta()[posicao_preferida(codigo)]
+
+
+def cores_distintas(codigos):
+    """
+    Cores sem repetição para os produtos exibidos em um mesmo gráfico.
+
+    Os produtos são percorridos em ordem de código; cada um fica com a sua
+    entrada preferida se ela estiver livre e, senão, com a próxima entrada
+    livre da paleta. O resultado depende apenas do conjunto de produtos e, sem
+    colisões, cada produto fica com a sua cor preferida (cor_produto). Com
+    mais produtos do que cores, a paleta é reaproveitada.
+
+    Args:
+        codigos (iterable): Códigos dos produtos exibidos
+
+    Returns:
+        dict: Código (str) -> cor no formato '#rrggbb'
+    """
+    cores = paleta()
+    ocupadas = set()
+    atribuidas = {}
+    for codigo in sorted({str(codigo) for codigo in codigos}):
+        if len(ocupadas) == len(cores):
+            ocupadas.clear()
+        posicao = posicao_preferida(codigo)
+        while posicao in ocupadas:
+            posicao = (posicao + 1) % len(cores)
+        ocupadas.add(posicao)
+        atribuidas[codigo] = cores[posicao]
+    return atribuidas
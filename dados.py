@@ -0,0 +1,311 @@
+"""
+Carga tipada da tabela comercio_exterior para o modo em memória.
+
+As colunas de dimensão são armazenadas como pd.Categorical (códigos inteiros
+mais um dicionário de valores), Ano como inteiro pequeno e Valor_FOB como
+float64, de forma que filtros e agrupamentos trabalhem sobre inteiros.
+
+A tabela tipada também é gravada em um arquivo colunar (Arrow IPC) ao lado
+do banco. Enquanto o banco não muda, as cargas seguintes mapeiam esse arquivo
+em memória em vez de ler o SQLite linha a linha; quando muda, apenas as linhas
+acrescentadas são lidas.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+from functools import partial
+
+import pandas as pd
+import pyarrow as pa
+from pandas.api.types import union_categoricals
+
+from consultas import COLUNAS_DETALHE, TABELA, conectar, contar_linhas, expressao_select
+
+# Colunas de texto codificadas como categorias
+COLUNAS_DIMENSAO = [
+    'Fluxo', 'Países', 'UF', 'URF', 'Cod_Secao', 'Desc_Secao',
+    'Via', 'Cod_SH6', 'Desc_SH6'
+]
+
+# Linhas lidas do SQLite por bloco durante a carga
+TAMANHO_BLOCO = 500_000
+
+# Chave dos metadados do snapshot com o estado do banco que o originou
+CHAVE_ORIGEM = b'comex_origem'
+
+logger = logging.getLogger(__name__)
+
+
+def tipar_dados(df):
+    """
+    Converte as colunas para os tipos compactos usados pelo dashboard.
+
+    Args:
+        df (pd.DataFrame): DataFrame com as colunas de COLUNAS_DETALHE
+
+    Returns:
+        pd.DataFrame: O mesmo DataFrame com dimensões categóricas, Ano em Int16
+            (inteiro que aceita anos nulos) e Valor_FOB em float64
+    """
+    for coluna in COLUNAS_DIMENSAO:
+        df[coluna] = df[coluna].astype('category')
+    df['Ano'] = df['Ano'].astype('Int16')
+    df['Valor_FOB'] = df['Valor_FOB'].astype('float64')
+    return df
+
+
+def _concatenar_blocos(blocos):
+    """Concatena blocos tipados unificando as categorias de cada dimensão"""
+    if len(blocos) == 1:
+        df = blocos[0]
+    else:
+        categorias = {
+            coluna: union_categoricals([bloco[coluna] for bloco in blocos])
+            for coluna in COLUNAS_DIMENSAO
+        }
+        df = pd.concat(
+            [bloco.drop(columns=COLUNAS_DIMENSAO) for bloco in blocos],
+            ignore_index=True
+        )
+        for coluna, valores in categorias.items():
+            df[coluna] = pd.Categorical(valores)
+        df = df[COLUNAS_DETALHE]
+    # Categorias em ordem alfabética: as opções dos filtros saem direto do dicionário
+    for coluna in COLUNAS_DIMENSAO:
+        df[coluna] = df[coluna].cat.reorder_categories(sorted(df[coluna].cat.categories))
+    return df
+
+
+def carregar_tabela(conn, apos_rowid=0, ate_rowid=None, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Lê a tabela em blocos, tipando cada bloco antes de ler o próximo.
+
+    Assim as strings de um único bloco ficam em memória por vez, em vez da
+    tabela inteira como colunas de objetos Python.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco
+        apos_rowid (int): Lê apenas linhas com rowid maior que este valor
+        ate_rowid (int, optional): Lê apenas linhas com rowid até este valor
+        tamanho_bloco (int): Linhas lidas por bloco
+
+    Returns:
+        pd.DataFrame: Linhas lidas, em ordem de rowid, com tipos compactos
+    """
+    query = f"SELECT {expressao_select(COLUNAS_DETALHE)} FROM {TABELA} WHERE rowid > ?"
+    parametros = [apos_rowid]
+    if ate_rowid is not None:
+        query += " AND rowid <= ?"
+        parametros.append(ate_rowid)
+    query += " ORDER BY rowid"
+    blocos = [
+        tipar_dados(bloco)
+        for bloco in pd.read_sql_query(query, conn, params=parametros, chunksize=tamanho_bloco)
+    ]
+    if not blocos:
+        return tipar_dados(pd.DataFrame(columns=COLUNAS_DETALHE))
+    return _concatenar_blocos(blocos)
+
+
+def versao_arquivo(caminho_db):
+    """
+    Tamanho e data de modificação do banco; muda a cada escrita no arquivo.
+
+    Em modo WAL as transações ficam no arquivo -wal até o checkpoint, por
+    isso o tamanho e a data dele também entram na versão.
+    """
+    estado = os.stat(caminho_db)
+    try:
+        estado_wal = os.stat(f"{caminho_db}-wal")
+    except FileNotFoundError:
+        return estado.st_size, estado.st_mtime_ns
+    return estado.st_size + estado_wal.st_size, max(estado.st_mtime_ns, estado_wal.st_mtime_ns)
+
+
+def caminho_snapshot(caminho_db):
+    """Arquivo colunar mantido ao lado do banco"""
+    return caminho_db.with_suffix('.arrow')
+
+
+def _checksum(caminho, tamanho_bloco=1 << 20):
+    """SHA-256 do conteúdo do arquivo"""
+    resumo = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+
+def _ler_origem(caminho):
+    """Lê apenas o esquema do snapshot e retorna o estado do banco registrado nele"""
+    try:
+        with pa.memory_map(str(caminho), 'r') as fonte:
+            metadados = pa.ipc.open_file(fonte).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    origem = metadados.get(CHAVE_ORIGEM)
+    return json.loads(origem) if origem else None
+
+
+def _snapshot_corresponde(caminho_db, origem, versao):
+    """
+    Indica se o snapshot corresponde ao conteúdo atual do banco.
+
+    Tamanho e data de modificação iguais bastam; se apenas a data mudou
+    (ex.: o banco foi copiado), o checksum do conteúdo decide.
+    """
+    tamanho, mtime_ns = versao
+    if origem['tamanho'] != tamanho:
+        return False
+    if origem['mtime_ns'] == mtime_ns:
+        return True
+    return origem['checksum'] == _checksum(caminho_db)
+
+
+def salvar_snapshot(df, caminho_db, versao, max_rowid):
+    """
+    Grava a tabela tipada no formato Arrow IPC com o estado do banco de origem.
+
+    O arquivo é escrito com outro nome e renomeado ao final, de modo que
+    processos que já mapearam a versão anterior continuam lendo-a.
+
+    Args:
+        df (pd.DataFrame): Tabela tipada
+        caminho_db (Path): Caminho do banco SQLite
+        versao (tuple): versao_arquivo do banco no momento da leitura
+        max_rowid (int): Maior rowid presente em df
+    """
+    tamanho, mtime_ns = versao
+    origem = {
+        'tamanho': tamanho,
+        'mtime_ns': mtime_ns,
+        'checksum': _checksum(caminho_db),
+        'max_rowid': max_rowid,
+    }
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    tabela = tabela.replace_schema_metadata({
+        **(tabela.schema.metadata or {}),
+        CHAVE_ORIGEM: json.dumps(origem).encode(),
+    })
+    destino = caminho_snapshot(caminho_db)
+    temporario = destino.with_name(f"{destino.name}.{os.getpid()}.tmp")
+    with pa.OSFile(str(temporario), 'wb') as saida:
+        with pa.ipc.new_file(saida, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+    os.replace(temporario, destino)
+
+
+def ler_snapshot(caminho_db):
+    """
+    Mapeia o snapshot em memória e o converte para DataFrame.
+
+    As colunas numéricas são expostas sem cópia sobre o arquivo mapeado, de
+    modo que processos diferentes compartilham o cache de páginas do sistema.
+    """
+    fonte = pa.memory_map(str(caminho_snapshot(caminho_db)), 'r')
+    tabela = pa.ipc.open_file(fonte).read_all()
+    return tabela.to_pandas(split_blocks=True)
+
+
+# df: tabela tipada; derivados: estruturas calculadas a partir dela (cubos, índice);
+# versao: versao_arquivo do banco; max_rowid: maior rowid já carregado
+VersaoDados = namedtuple('VersaoDados', ['df', 'derivados', 'versao', 'max_rowid'])
+
+
+class DadosEmMemoria:
+    """
+    Tabela tipada e estruturas derivadas, sincronizadas com o banco sob demanda.
+
+    A cada chamada de sincronizar() apenas o tamanho e a data de modificação
+    do arquivo são verificados. Quando mudam, as linhas com rowid acima do
+    último carregado são lidas e acrescentadas à tabela e aos derivados; a
+    leitura completa só acontece se linhas antigas foram removidas. A carga
+    supõe que a importação apenas acrescenta linhas, como faz o script de
+    tratamento dos dados.
+
+    Args:
+        caminho_db (Path): Caminho do banco SQLite
+        derivados (dict): Nome -> (construir(df), atualizar(atual, df, inicio)),
+            onde inicio é a posição da primeira linha nova em df
+        abrir_conexao (callable, optional): Retorna um gerenciador de contexto
+            com uma conexão de leitura (ex.: PoolConexoes.conexao); por padrão,
+            uma conexão nova a cada carga
+    """
+
+    def __init__(self, caminho_db, derivados=None, abrir_conexao=None):
+        self.caminho_db = caminho_db
+        self.derivados = derivados or {}
+        self.abrir_conexao = abrir_conexao or partial(conectar, caminho_db)
+        self.atual = None
+        self._trava = threading.Lock()
+
+    def sincronizar(self):
+        """
+        Retorna a versão atual dos dados, atualizando-a se o banco mudou.
+
+        Returns:
+            VersaoDados: Tabela e derivados consistentes entre si
+        """
+        versao = versao_arquivo(self.caminho_db)
+        atual = self.atual
+        if atual is not None and atual.versao == versao:
+            return atual
+        with self._trava:
+            if self.atual is None or self.atual.versao != versao:
+                with self.abrir_conexao() as conn:
+                    self.atual = self._atualizar(conn, self.atual, versao)
+            return self.atual
+
+    def _construir(self, df):
+        return {nome: construir(df) for nome, (construir, _) in self.derivados.items()}
+
+    def _ler_snapshot(self, versao):
+        """Versão gravada no snapshot, mesmo que anterior ao estado atual do banco"""
+        origem = _ler_origem(caminho_snapshot(self.caminho_db))
+        if origem is None or 'max_rowid' not in origem:
+            return None
+        if _snapshot_corresponde(self.caminho_db, origem, versao):
+            versao_snapshot = versao
+        else:
+            versao_snapshot = (origem['tamanho'], origem['mtime_ns'])
+        df = ler_snapshot(self.caminho_db)
+        return VersaoDados(df, self._construir(df), versao_snapshot, origem['max_rowid'])
+
+    def _atualizar(self, conn, atual, versao):
+        if atual is None:
+            atual = self._ler_snapshot(versao)
+            if atual is not None and atual.versao == versao:
+                return atual
+
+        max_rowid = contar_linhas(conn)
+        if atual is not None and max_rowid >= atual.max_rowid:
+            (mantidas,) = conn.execute(
+                f"SELECT COUNT(*) FROM {TABELA} WHERE rowid <= ?", [atual.max_rowid]
+            ).fetchone()
+            if mantidas == len(atual.df):
+                if max_rowid == atual.max_rowid:
+                    # O arquivo mudou, mas a tabela não
+                    return atual._replace(versao=versao)
+                novas = carregar_tabela(conn, apos_rowid=atual.max_rowid, ate_rowid=max_rowid)
+                inicio = len(atual.df)
+                df = _concatenar_blocos([atual.df, novas])
+                derivados = {
+                    nome: atualizar(atual.derivados[nome], df, inicio)
+                    for nome, (_, atualizar) in self.derivados.items()
+                }
+                self._salvar(df, versao, max_rowid)
+                return VersaoDados(df, derivados, versao, max_rowid)
+
+        df = carregar_tabela(conn, ate_rowid=max_rowid)
+        self._salvar(df, versao, max_rowid)
+        return VersaoDados(df, self._construir(df), versao, max_rowid)
+
+    def _salvar(self, df, versao, max_rowid):
+        try:
+            salvar_snapshot(df, self.caminho_db, versao, max_rowid)
+        except OSError as e:
+            # Sem o snapshot, a próxima carga volta a ler a tabela do SQLite
+            logger.warning("Não foi possível gravar o snapshot colunar: %s", e)
@@ -1,144 +1,73 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import sqlite3
 import os
 from pathlib import Path
-import io
-import plotly.graph_objects as go
-import pycountry
-from unidecode import unidecode
-import streamlit.components.v1 as components
-import json
-
-@st.cache_data(ttl=3600)  # Cache por 1 hora
-def criar_mapa_cores_produtos(produtos):
-    """
-    Cria um mapeamento fixo de cores para todos os produtos,
-    garantindo que cada produto tenha uma cor única.
-    
-    Args:
-        produtos (list): Lista de produtos únicos
-        
-    Returns:
-        dict: Dicionário com produtos e suas cores correspondentes
-    """
-    # Combinar paletas de cores mais eficientemente
-    paletas_base = (
-        px.colors.qualitative.Set3 +
-        px.colors.qualitative.Pastel +
-        px.colors.qualitative.Safe +
-        px.colors.qualitative.Plotly +
-        px.colors.qualitative.D3
-    )
-    
-    n_cores_necessarias = len(produtos)
-    
-    # Se as paletas base são suficientes, usar diretamente
-    if len(paletas_base) >= n_cores_necessarias:
-        cores_finais = paletas_base[:n_cores_necessarias]
-    else:
-        # Gerar cores adicionais de forma mais eficiente
-        cores_adicionais = []
-        for i in range(n_cores_necessarias - len(paletas_base)):
-            h = (i * 137.508) % 360  # Número áureo para distribuição
-            s = 0.7 + (i % 3) * 0.1  # Saturação entre 70% e 90%
-            l = 0.45 + (i % 5) * 0.05  # Luminosidade entre 45% e 65%
-            
-            # Converter HSL para RGB e depois para hex
-            import colorsys
-            rgb = colorsys.hls_to_rgb(h/360, l, s)
-            cor_hex = '#{:02x}{:02x}{:02x}'.format(
-                int(rgb[0]*255),
-                int(rgb[1]*255),
-                int(rgb[2]*255)
-            )
-            cores_adicionais.append(cor_hex)
-        
-        cores_finais = paletas_base + cores_adicionais
-    
-    # Criar o mapeamento
-    return dict(zip(produtos, cores_finais))
+from uuid import uuid4
+from consultas import (
+    COLUNAS_DETALHE, PoolConexoes, contar_linhas, listar_valores, agregar_valor_fob,
+    contar_selecao, consultar_pagina, iterar_linhas, codigos_por_descricao,
+    top_n_por_grupo as top_n_por_grupo_sql
+)
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from dados import DadosEmMemoria, versao_arquivo
+from agregacoes import (
+    DIMENSOES_FILTRO, aplicar_filtros, construir_cubos, atualizar_cubos, agregar_memoria,
+    calcular_agregados, calcular_faceta, top_n_por_grupo, executar_plano, encontrar_cubo,
+    consultar_cubo
+)
+from indices import construir_indice, atualizar_indice, primeiras_linhas
+from formatacao import format_currency
+from cache_resultados import CacheResultados, chave_resultado, normalizar_filtros
+from aquecimento import Aquecedor, RegistroUso
+from agregacao_blocos import construir_cubos_em_blocos
+from exportacao import FORMATOS, TAMANHO_BLOCO, blocos_dataframe, exportar
+from paginacao import ordem_coluna, ordenar_selecao, fatiar_pagina
+from perfil import Perfil
+from paises import tabela_paises
+from cores import cores_distintas
+from graficos import (
+    figura_temporal, figura_mapa, figura_barras, figura_empilhada, figura_comparacao
+)
+
+# Figuras montadas uma vez por combinação de dados e parâmetros: o cache usa o
+# hash dos DataFrames agregados, então reruns que não mudam os dados de um
+# gráfico reaproveitam a figura já montada
+figura_temporal_cache = st.cache_data(max_entries=32)(figura_temporal)
+figura_mapa_cache = st.cache_data(max_entries=32)(figura_mapa)
+figura_barras_cache = st.cache_data(max_entries=128)(figura_barras)
+figura_empilhada_cache = st.cache_data(max_entries=64)(figura_empilhada)
+figura_comparacao_cache = st.cache_data(max_entries=32)(figura_comparacao)
 
-def aplicar_filtros(df, filtros):
+def plotly_chart(fig, width="stretch", key=None, on_select="ignore"):
     """
-    Aplica múltiplos filtros ao DataFrame de forma otimizada.
+    Exibe uma figura Plotly pelo componente nativo do Streamlit.
+    
+    Apenas o JSON da figura é enviado ao navegador; a biblioteca plotly.js é
+    servida uma única vez pelo próprio frontend do Streamlit. O tema do
+    Streamlit é desativado (theme=None) para que o template 'plotly_dark' das
+    figuras seja exibido como foi definido.
     
     Args:
-        df (pd.DataFrame): DataFrame a ser filtrado
-        filtros (dict): Dicionário com colunas e valores para filtrar
+        fig (go.Figure): Figura a exibir
+        width (str | int): "stretch" ocupa toda a largura do container, "content"
+            usa a largura da figura e um inteiro fixa a largura em pixels
+        key (str, optional): Chave do elemento, necessária para seleções
+        on_select (str | callable): "ignore", "rerun" ou callback chamado
+            quando o usuário seleciona pontos
         
     Returns:
-        pd.DataFrame: DataFrame filtrado
+        Evento de seleção do gráfico quando on_select não é "ignore"
     """
-    mask = pd.Series(True, index=df.index)
-    for coluna, valores in filtros.items():
-        if valores:  # Só aplica o filtro se houver valores selecionados
-            mask &= df[coluna].isin(valores)
-    return df[mask]
-
-def format_big_number(value):
-    """Formata números grandes para usar K, M e B"""
-    suffixes = {1e9: 'B', 1e6: 'M', 1e3: 'K'}
-    for size, suffix in suffixes.items():
-        if abs(value) >= size:
-            return f"{value/size:.1f}{suffix}"
-    return f"{value:.1f}"
-
-def format_currency(value):
-    """Formata valores monetários em K, M ou B"""
-    suffixes = {1e9: 'B', 1e6: 'M', 1e3: 'K'}
-    for size, suffix in suffixes.items():
-        if value >= size:
-            return f'${value/size:.2f}{suffix}'
-    return f'${value:.0f}'
-
-def criar_mapa_paises():
-    """Cria um dicionário de mapeamento para nomes de países PT-BR -> EN"""
-    paises_map = {}
-    for country in pycountry.countries:
-        nome_pt = unidecode(country.name.lower())
-        paises_map[nome_pt] = country.name
-    return paises_map
-
-# Função auxiliar para plotly_chart com retorno de seleção
-def plotly_chart(fig, use_container_width=True, key=None):
-    """Versão otimizada da função plotly_chart"""
-    fig.update_layout(
-        updatemenus=[dict(
-            type="buttons",
-            showactive=False,
-            buttons=[dict(
-                label="Reset Selection",
-                method="update",
-                args=[{"selectedpoints": None}]
-            )]
-        )],
-        template='plotly_dark',
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        hoverlabel=dict(
-            bgcolor='white',
-            font_color='black',
-            font_size=12
+    # A serialização da figura e o envio ao navegador são medidos como uma etapa
+    with perfil.etapa(f"exibicao:{key}"):
+        return st.plotly_chart(
+            fig,
+            width=width,
+            theme=None,
+            key=key,
+            on_select=on_select
         )
-    )
-    
-    components.html(
-        fig.to_html(
-            include_plotlyjs=True,
-            config={'displayModeBar': True}
-        ),
-        height=600,
-        width=None if use_container_width else 800
-    )
-    
-    # Retornar dados da seleção via session_state
-    return st.session_state.get('plotly_selected_data', None)
-
-# Adicionar handler para mensagens do JavaScript
-if 'plotly_selected_data' not in st.session_state:
-    st.session_state.plotly_selected_data = None
 
 # Configuração da página
 st.set_page_config(page_title="Dashboard Comércio Exterior", layout="wide", initial_sidebar_state="expanded")
@@ -193,37 +122,314 @@ with st.container():
             Os dados são tratados e convertidos para um banco SQLite através de um script em Python que pode ser consultado no link: [TratamentoDB](https://github.com/rafaelm7/TratamentoDB)
             """)
 
-# Caminho do banco de dados relativo ao diretório do script
-DB_PATH = Path(__file__).parent / "comercio_exterior.sqlite"
+# Caminho do banco de dados relativo ao diretório do script; COMEX_DB_PATH
+# aponta para outro banco (ex.: uma base sintética criada por gerar_dados.py)
+DB_PATH = Path(os.environ.get("COMEX_DB_PATH", Path(__file__).parent / "comercio_exterior.sqlite"))
 
 # Verificação da existência do arquivo
 if not os.path.exists(DB_PATH):
     st.error("Arquivo do banco de dados não encontrado!")
     st.stop()
 
-# Conexão com o banco de dados
-@st.cache_data(ttl=3600)  # Cache por 1 hora
-def carregar_dados():
-    query = """
-    SELECT 
-        Fluxo, Ano, Países, "UF do Produto" as UF, URF, 
-        "Código Seção" as Cod_Secao, "Descrição Seção" as Desc_Secao,
-        Via, "Código SH6" as Cod_SH6, "Descrição SH6" as Desc_SH6,
-        "Valor US$ FOB" as Valor_FOB
-    FROM comercio_exterior
-    """
-    with sqlite3.connect(DB_PATH) as conn:
-        return pd.read_sql_query(query, conn)
+# Acima deste número de linhas a tabela não é carregada em memória:
+# filtros e agregações passam a ser executados diretamente no SQLite
+LIMITE_LINHAS_MEMORIA = int(os.environ.get("COMEX_LIMITE_LINHAS_MEMORIA", 2_000_000))
+
+# Leitores paralelos que, no modo SQL, percorrem a tabela em blocos para montar
+# os cubos de agregação sem carregá-la em memória (0 desativa)
+LEITORES_BLOCOS = int(os.environ.get("COMEX_LEITORES_BLOCOS", 0))
+
+# O banco não muda enquanto o servidor roda: as conexões podem usar immutable=1
+BANCO_IMUTAVEL = os.environ.get("COMEX_BANCO_IMUTAVEL") == "1"
+
+# Memória máxima (MB) do cache de resultados compartilhado entre as sessões
+LIMITE_CACHE_RESULTADOS_MB = int(os.environ.get("COMEX_CACHE_RESULTADOS_MB", 256))
+
+# Threads que calculam em paralelo as agregações independentes de cada página
+THREADS_PLANO = int(os.environ.get("COMEX_THREADS_PLANO", os.cpu_count() or 1))
+
+# Threads do aquecimento do cache de resultados após cada carga (0 desativa)
+AQUECIMENTO_THREADS = int(os.environ.get("COMEX_AQUECIMENTO_THREADS", 0))
+
+# Combinações de filtros mais usadas aquecidas junto com a página sem filtros
+AQUECIMENTO_COMBINACOES = 10
+
+# Medição das etapas de cada execução, ligada para todo o servidor (COMEX_PERFIL=1)
+# ou só para uma sessão (?perfil=1 no endereço); as medidas são exibidas no
+# painel de diagnóstico e acrescentadas a um arquivo ao lado do banco. Só o
+# perfil do servidor inteiro mede alocações com o tracemalloc, que desacelera
+# todo o processo; o de uma sessão mede a memória residente (RSS)
+PERFIL_ATIVO = os.environ.get("COMEX_PERFIL") == "1"
+
+if 'id_sessao' not in st.session_state:
+    st.session_state.id_sessao = uuid4().hex[:12]
+perfil = Perfil(
+    PERFIL_ATIVO or st.query_params.get("perfil") == "1",
+    DB_PATH.with_suffix('.perfil.jsonl'),
+    sessao=st.session_state.id_sessao,
+    rastrear_alocacoes=PERFIL_ATIVO
+)
+
+@st.cache_resource  # Conexões somente leitura compartilhadas entre sessões e threads
+def obter_pool_conexoes():
+    return PoolConexoes(DB_PATH, tamanho=max(THREADS_PLANO, LEITORES_BLOCOS, 4), imutavel=BANCO_IMUTAVEL)
+
+pool_conexoes = obter_pool_conexoes()
+
+# As consultas abaixo recebem a versão do arquivo do banco (tamanho e data de
+# modificação): o cache é invalidado assim que o banco muda, sem TTL
+@st.cache_data(max_entries=16)
+def contar_linhas_tabela(versao):
+    with pool_conexoes.conexao() as conn:
+        return contar_linhas(conn)
+
+@st.cache_resource  # Compartilhado entre sessões, sem cópia por sessão
+def obter_dados_memoria():
+    # Tabela tipada (dimensões como categorias, Ano em Int16 e Valor_FOB em
+    # float64), lida do snapshot colunar e atualizada só com as linhas novas,
+    # junto com os cubos de agregação e o índice dos filtros
+    return DadosEmMemoria(DB_PATH, derivados={
+        'cubos': (construir_cubos, atualizar_cubos),
+        'indice': (partial(construir_indice, colunas=DIMENSOES_FILTRO), atualizar_indice),
+    }, abrir_conexao=pool_conexoes.conexao)
+
+@st.cache_resource(max_entries=1)  # Cubos do modo SQL, remontados quando o banco muda
+def obter_cubos_em_blocos(versao):
+    return construir_cubos_em_blocos(DB_PATH, LEITORES_BLOCOS, abrir_conexao=pool_conexoes.conexao)
+
+@st.cache_resource  # Um único cache de resultados por processo
+def obter_cache_resultados():
+    return CacheResultados(LIMITE_CACHE_RESULTADOS_MB * 1024 * 1024)
+
+@st.cache_resource  # Pool das agregações de cada página, compartilhado entre sessões
+def obter_executor_plano():
+    return ThreadPoolExecutor(max_workers=THREADS_PLANO, thread_name_prefix='plano')
+
+@st.cache_resource  # Registro das combinações de filtros aplicadas, ao lado do banco
+def obter_registro_uso():
+    return RegistroUso(DB_PATH.with_suffix('.uso.jsonl'))
+
+@st.cache_resource  # Pool de aquecimento compartilhado entre sessões
+def obter_aquecedor():
+    return Aquecedor(obter_cache_resultados(), AQUECIMENTO_THREADS)
+
+# Consultas executadas no SQLite (modo SQL), com cache por combinação de argumentos
+@st.cache_data(max_entries=256)
+def consultar_opcoes(versao, coluna):
+    with pool_conexoes.conexao() as conn:
+        return listar_valores(conn, coluna)
+
+@st.cache_data(max_entries=256)
+def consultar_top_por_grupo(versao, grupo, item, filtros, n_grupos, n_itens):
+    with pool_conexoes.conexao() as conn:
+        return top_n_por_grupo_sql(conn, grupo, item, filtros, n_grupos, n_itens)
+
+@st.cache_data(max_entries=256)
+def contar_detalhes(versao, filtros, busca):
+    with pool_conexoes.conexao() as conn:
+        return contar_selecao(conn, filtros, busca)
+
+@st.cache_data(max_entries=256)
+def consultar_pagina_detalhes(versao, filtros, ordenar_por, crescente, busca, limite, deslocamento):
+    with pool_conexoes.conexao() as conn:
+        return consultar_pagina(conn, filtros, ordenar_por, crescente, limite, deslocamento, busca)
+
+@st.cache_data(max_entries=256)
+def consultar_codigos_sh6(versao, descricoes):
+    with pool_conexoes.conexao() as conn:
+        return codigos_por_descricao(conn, 'Cod_SH6', 'Desc_SH6', descricoes)
+
+def ler_blocos_sql(filtros):
+    """Lê as linhas filtradas do SQLite em blocos, para a exportação"""
+    with pool_conexoes.conexao() as conn:
+        yield from iterar_linhas(conn, filtros, TAMANHO_BLOCO)
 
 # Carregando os dados
 try:
-    df = carregar_dados()
+    with perfil.etapa('carga') as medida:
+        VERSAO_BANCO = versao_arquivo(DB_PATH)
+        medida['linhas_saida'] = contar_linhas_tabela(VERSAO_BANCO)
+        MODO_SQL = medida['linhas_saida'] > LIMITE_LINHAS_MEMORIA
+        if MODO_SQL:
+            df = indice = None
+            cubos = obter_cubos_em_blocos(VERSAO_BANCO) if LEITORES_BLOCOS > 0 else None
+            VERSAO_DADOS = VERSAO_BANCO
+        else:
+            dados_memoria = obter_dados_memoria().sincronizar()
+            df = dados_memoria.df
+            cubos = dados_memoria.derivados['cubos']
+            indice = dados_memoria.derivados['indice']
+            VERSAO_DADOS = (dados_memoria.versao, dados_memoria.max_rowid)
+            medida['linhas_saida'] = len(df)
 except Exception as e:
     st.error(f"Erro ao carregar o banco de dados: {e}")
     st.stop()
 
-# Criar o mapeamento de cores uma única vez
-MAPA_CORES_PRODUTOS = criar_mapa_cores_produtos(sorted(df['Desc_SH6'].unique()))
+def cubo_em_blocos(chaves, filtros_consulta):
+    """Menor cubo lido em blocos que responde à consulta no modo SQL, ou None"""
+    return encontrar_cubo(cubos, chaves, filtros_consulta) if cubos else None
+
+def agregar_sql(chaves, filtros_consulta, dropna=True):
+    """
+    Soma o Valor FOB no modo SQL.
+    
+    A soma sai dos cubos lidos em blocos quando eles cobrem as chaves e os
+    filtros; caso contrário, é feita no SQLite com uma conexão própria, sem o
+    cache do Streamlit, para que várias rodem em paralelo.
+    
+    Args:
+        chaves (list): Colunas de agrupamento
+        filtros_consulta (dict): Dicionário com colunas e valores para filtrar
+        dropna (bool): Descartar as combinações com alguma chave nula, como no
+            modo em memória (o plano de agregações as mantém até o fim)
+        
+    Returns:
+        pd.DataFrame: Uma linha por combinação de chaves, com a coluna Valor_FOB
+    """
+    cubo = cubo_em_blocos(chaves, filtros_consulta)
+    if cubo is not None:
+        return consultar_cubo(cubo, list(chaves), filtros_consulta, dropna)
+    with pool_conexoes.conexao() as conn:
+        resultado = agregar_valor_fob(conn, list(chaves), filtros_consulta)
+    return resultado.dropna(subset=list(chaves), ignore_index=True) if dropna else resultado
+
+def custo_sql(chaves, filtros_consulta):
+    """Linhas percorridas por agregar_sql: o cubo que a responde ou, no SQLite, a tabela inteira"""
+    cubo = cubo_em_blocos(chaves, filtros_consulta)
+    return len(cubo) if cubo is not None else float('inf')
+
+def calcular_plano_sql(pedidos, filtros_plano, executor=None):
+    """Executa o plano de agregações do modo SQL, em paralelo quando há executor"""
+    return executar_plano(
+        pedidos, partial(agregar_sql, filtros_consulta=filtros_plano, dropna=False),
+        partial(custo_sql, filtros_consulta=filtros_plano), executor
+    )
+
+def opcoes_filtro(coluna):
+    """Retorna todos os valores distintos e ordenados de uma coluna, independente dos filtros"""
+    if MODO_SQL:
+        return consultar_opcoes(VERSAO_BANCO, coluna)
+    if isinstance(df[coluna].dtype, pd.CategoricalDtype):
+        # As categorias já são mantidas em ordem alfabética na carga
+        return df[coluna].cat.categories.tolist()
+    return sorted(df[coluna].dropna().unique())
+
+@st.cache_resource(max_entries=1)  # Tabela de países refeita só quando os dados mudam
+def obter_codigos_paises(versao):
+    # Nome -> código ISO-3; a tabela gravada ao lado do banco também lista os
+    # nomes sem correspondência, que ficam fora do mapa
+    codigos, _ = tabela_paises(opcoes_filtro('Países'), DB_PATH.with_suffix('.paises.json'))
+    return codigos
+
+codigos_paises = obter_codigos_paises(VERSAO_DADOS)
+
+def em_cache(calcular, filtros_consulta, *parametros):
+    """
+    Retorna um resultado do cache de resultados do processo, calculando-o se necessário.
+    
+    A chave combina a versão dos dados, os filtros normalizados (a ordem de
+    seleção dos valores não importa) e os parâmetros do resultado, de forma
+    que sessões diferentes com a mesma seleção compartilhem o resultado.
+    
+    Args:
+        calcular (callable): Função sem argumentos que produz o resultado
+        filtros_consulta (dict): Filtros aplicados ao resultado
+        *parametros: Identificação do resultado (tipo, chaves, opções)
+        
+    Returns:
+        Resultado guardado, que não deve ser alterado
+    """
+    return obter_cache_resultados().obter(chave_cache(filtros_consulta, *parametros), calcular)
+
+def chave_cache(filtros_consulta, *parametros):
+    """Chave de um resultado no cache de resultados, para a versão atual dos dados"""
+    return chave_resultado(VERSAO_DADOS, normalizar_filtros(filtros_consulta), *parametros)
+
+def faceta(coluna):
+    """
+    Valor FOB de cada valor de uma coluna sob os demais filtros ativos.
+    
+    No modo SQL, os totais só são calculados quando um cubo lido em blocos
+    cobre a coluna e os demais filtros: sem ele, cada mudança de filtro
+    custaria um GROUP BY sobre a tabela inteira para cada filtro da barra
+    lateral.
+    
+    Args:
+        coluna (str): Coluna do filtro
+        
+    Returns:
+        pd.Series | None: Valor FOB por valor presente, em ordem crescente de
+            valor, ou None no modo SQL sem cubo que responda
+    """
+    filtros_ativos = st.session_state.filtros_ativos
+    outros = {c: valores for c, valores in filtros_ativos.items() if c != coluna and valores}
+    if MODO_SQL:
+        cubo = cubo_em_blocos([coluna], outros)
+        if cubo is None:
+            return None
+        calcular = lambda: consultar_cubo(cubo, [coluna], outros).set_index(coluna)['Valor_FOB'].sort_index()
+    else:
+        calcular = partial(calcular_faceta, df, cubos, indice, coluna, filtros_ativos)
+    return em_cache(calcular, outros, 'faceta', coluna)
+
+def filtro_lateral(rotulo, coluna, container):
+    """
+    Cria o multiselect de um filtro da barra lateral.
+    
+    As opções são os valores que ainda têm dados sob os demais filtros
+    ativos, mais os já selecionados, cada um com o seu Valor FOB. Quando não
+    há totais (ver faceta), as opções são todos os valores da coluna, sem
+    Valor FOB.
+    
+    Args:
+        rotulo (str): Rótulo do filtro
+        coluna (str): Coluna filtrada
+        container: Onde o filtro é exibido (barra lateral ou uma de suas colunas)
+        
+    Returns:
+        list: Valores selecionados
+    """
+    totais = faceta(coluna)
+    selecionados = st.session_state.filtros_ativos[coluna]
+    if totais is None:
+        return container.multiselect(rotulo, options=opcoes_filtro(coluna), default=selecionados)
+    opcoes = totais.index.tolist()
+    if not set(selecionados) <= set(opcoes):
+        opcoes = sorted(set(opcoes) | set(selecionados))
+    
+    def formatar(valor):
+        if valor in totais.index:
+            return f"{valor} ({format_currency(totais[valor])})"
+        return str(valor)
+    
+    return container.multiselect(
+        rotulo,
+        options=opcoes,
+        default=selecionados,
+        format_func=formatar
+    )
+
+def cores_produtos(descricoes):
+    """
+    Cor de cada produto exibido, derivada do seu Cod_SH6, sem repetição no gráfico.
+    
+    Args:
+        descricoes (list): Valores de Desc_SH6 exibidos no gráfico
+        
+    Returns:
+        dict: Descrição -> cor no formato '#rrggbb'
+    """
+    descricoes = sorted(set(descricoes))
+    if MODO_SQL:
+        codigos = consultar_codigos_sh6(VERSAO_BANCO, tuple(descricoes))
+    else:
+        # A primeira linha de cada produto vem do índice, sem percorrer a tabela
+        linhas = primeiras_linhas(indice['Desc_SH6'], descricoes)
+        codigos = dict(zip(linhas, df['Cod_SH6'].iloc[list(linhas.values())]))
+    # Sem código (não deve ocorrer), a própria descrição identifica o produto
+    identificadores = {descricao: str(codigos.get(descricao, descricao)) for descricao in descricoes}
+    cores = cores_distintas(identificadores.values())
+    return {descricao: cores[identificador] for descricao, identificador in identificadores.items()}
 
 # Antes dos filtros, adicionar um container para armazenar os filtros selecionados
 if 'filtros_ativos' not in st.session_state:
@@ -240,52 +446,18 @@ if 'filtros_ativos' not in st.session_state:
 # Sidebar para filtros
 st.sidebar.header("Filtros")
 
-# Filtros principais
+# Filtros principais: as opções de cada filtro se restringem aos valores com
+# dados sob os demais filtros ativos
 col1_side, col2_side = st.sidebar.columns(2)
 
-with col1_side:
-    anos_selecionados = st.multiselect(
-        "Ano",
-        options=sorted(df['Ano'].unique()),
-        default=st.session_state.filtros_ativos['Ano']
-    )
-
-with col2_side:
-    fluxos_selecionados = st.multiselect(
-        "Fluxo",
-        options=sorted(df['Fluxo'].unique()),
-        default=st.session_state.filtros_ativos['Fluxo']
-    )
-
-paises_selecionados = st.sidebar.multiselect(
-    "Países",
-    options=sorted(df['Países'].unique()),
-    default=st.session_state.filtros_ativos['Países']
-)
-
-ufs_selecionadas = st.sidebar.multiselect(
-    "UF do Produto",
-    options=sorted(df['UF'].unique()),
-    default=st.session_state.filtros_ativos['UF']
-)
-
-urf_selecionadas = st.sidebar.multiselect(
-    "URF",
-    options=sorted(df['URF'].unique()),
-    default=st.session_state.filtros_ativos['URF']
-)
-
-secoes_selecionadas = st.sidebar.multiselect(
-    "Seção",
-    options=sorted(df['Desc_Secao'].unique()),
-    default=st.session_state.filtros_ativos['Desc_Secao']
-)
-
-sh6_selecionados = st.sidebar.multiselect(
-    "Produto (SH6)",
-    options=sorted(df['Desc_SH6'].unique()),
-    default=st.session_state.filtros_ativos['Desc_SH6']
-)
+with perfil.etapa('filtros_laterais'):
+    anos_selecionados = filtro_lateral("Ano", 'Ano', col1_side)
+    fluxos_selecionados = filtro_lateral("Fluxo", 'Fluxo', col2_side)
+    paises_selecionados = filtro_lateral("Países", 'Países', st.sidebar)
+    ufs_selecionadas = filtro_lateral("UF do Produto", 'UF', st.sidebar)
+    urf_selecionadas = filtro_lateral("URF", 'URF', st.sidebar)
+    secoes_selecionadas = filtro_lateral("Seção", 'Desc_Secao', st.sidebar)
+    sh6_selecionados = filtro_lateral("Produto (SH6)", 'Desc_SH6', st.sidebar)
 
 # Botão para aplicar filtros
 if st.sidebar.button('Aplicar Filtros', type='primary'):
@@ -299,6 +471,8 @@ if st.sidebar.button('Aplicar Filtros', type='primary'):
         'Desc_Secao': secoes_selecionadas,
         'Desc_SH6': sh6_selecionados
     }
+    # As combinações mais aplicadas são aquecidas após as próximas cargas
+    obter_registro_uso().registrar(st.session_state.filtros_ativos)
     # Forçar rerun para atualizar a visualização
     st.rerun()
 
@@ -319,7 +493,137 @@ if st.sidebar.button('Limpar Filtros'):
 
 # Aplicar filtros usando os valores armazenados em session_state
 filtros = st.session_state.filtros_ativos
-df_filtrado = aplicar_filtros(df, filtros)
+with perfil.etapa('filtragem', None if MODO_SQL else len(df)) as medida:
+    if MODO_SQL:
+        df_filtrado = None
+    elif not any(filtros.values()):
+        df_filtrado = df  # Sem filtros, a própria tabela
+    else:
+        df_filtrado = em_cache(partial(aplicar_filtros, df, filtros, indice), filtros, 'linhas')
+    if df_filtrado is not None:
+        medida['linhas_saida'] = len(df_filtrado)
+
+def agregar(chaves, filtros_extras=None):
+    """
+    Soma o Valor FOB por chaves respeitando os filtros ativos.
+    
+    A agregação é respondida pelo menor cubo pré-agregado que cubra as chaves
+    e os filtros, recorrendo a df_filtrado (ou, no modo SQL, ao SQLite)
+    apenas quando nenhum cubo os cobre.
+    
+    Args:
+        chaves (list): Colunas de agrupamento
+        filtros_extras (dict, optional): Filtros adicionais aos da barra lateral
+        
+    Returns:
+        pd.DataFrame: Uma linha por combinação de chaves, com a coluna Valor_FOB
+    """
+    filtros_consulta = {**filtros, **(filtros_extras or {})}
+    if MODO_SQL:
+        calcular = partial(agregar_sql, list(chaves), filtros_consulta)
+    else:
+        # Sem filtros extras, as linhas filtradas já estão em df_filtrado
+        filtrado = None if filtros_extras else (lambda: df_filtrado)
+        calcular = partial(agregar_memoria, df, cubos, indice, list(chaves), filtros_consulta, filtrado)
+    return em_cache(calcular, filtros_consulta, 'agregado', list(chaves))
+
+def top_por_grupo(grupo, item, n_grupos, n_itens):
+    """
+    Retorna os n_itens maiores itens de cada um dos n_grupos maiores grupos.
+    
+    Usado pelos gráficos empilhados (produtos por país e por URF).
+    
+    Args:
+        grupo (str): Coluna do ranking externo (ex.: 'Países')
+        item (str): Coluna do ranking dentro de cada grupo (ex.: 'Desc_SH6')
+        n_grupos (int): Número de grupos
+        n_itens (int): Número de itens por grupo
+        
+    Returns:
+        pd.DataFrame: Colunas grupo, item e Valor_FOB
+    """
+    if not MODO_SQL:
+        return top_n_por_grupo(agregados[(grupo, item)], grupo, item, n_grupos, n_itens)
+    if cubo_em_blocos([grupo, item], filtros) is not None:
+        return top_n_por_grupo(agregar([grupo, item]), grupo, item, n_grupos, n_itens)
+    return consultar_top_por_grupo(VERSAO_BANCO, grupo, item, filtros, n_grupos, n_itens)
+
+# Abas de visualização; apenas a aba ativa é calculada e exibida a cada rerun
+ABAS = ["Análise Temporal", "Análise Geográfica", "Análise por Produto"]
+aba_ativa = st.session_state.get('aba_ativa') or ABAS[0]
+
+# Agregações usadas pelas métricas principais; () é o total geral
+PEDIDOS_AGREGACAO = [(), ('Ano', 'Fluxo'), ('Países',), ('UF',), ('Cod_SH6',)]
+
+# Agregações usadas pelos gráficos de cada aba
+PEDIDOS_ABA = {
+    "Análise Temporal": [('Ano', 'Fluxo')],
+    "Análise Geográfica": [('Países',), ('URF',)],
+    "Análise por Produto": [('Desc_Secao',), ('Desc_SH6',)],
+}
+if not MODO_SQL:
+    # No modo SQL o ranking dos gráficos empilhados é feito no próprio banco
+    PEDIDOS_ABA["Análise Geográfica"].append(('URF', 'Desc_SH6'))
+    PEDIDOS_ABA["Análise por Produto"].append(('Países', 'Desc_SH6'))
+
+def tarefas_aquecimento():
+    """
+    Gera os resultados aquecidos em segundo plano após cada carga.
+    
+    Para a página sem filtros e as combinações de filtros mais usadas, gera
+    o plano de agregações de cada aba e, no modo em memória, as linhas
+    filtradas e as opções dos filtros da barra lateral.
+    
+    Yields:
+        tuple: Chave no cache de resultados e função que calcula o resultado
+    """
+    combinacoes = [{}] + obter_registro_uso().mais_usados(AQUECIMENTO_COMBINACOES)
+    for filtros_aquecer in combinacoes:
+        for aba in ABAS:
+            pedidos_aba = PEDIDOS_AGREGACAO + PEDIDOS_ABA[aba]
+            if MODO_SQL:
+                calcular = partial(calcular_plano_sql, pedidos_aba, filtros_aquecer)
+            else:
+                calcular = partial(calcular_agregados, df, cubos, indice, pedidos_aba, filtros_aquecer)
+            yield chave_cache(filtros_aquecer, 'plano', pedidos_aba), calcular
+        if MODO_SQL:
+            continue
+        if filtros_aquecer:
+            yield (chave_cache(filtros_aquecer, 'linhas'),
+                   partial(aplicar_filtros, df, filtros_aquecer, indice))
+        for coluna in DIMENSOES_FILTRO:
+            outros = {c: valores for c, valores in filtros_aquecer.items() if c != coluna}
+            yield (chave_cache(outros, 'faceta', coluna),
+                   partial(calcular_faceta, df, cubos, indice, coluna, filtros_aquecer))
+
+if AQUECIMENTO_THREADS > 0:
+    obter_aquecedor().aquecer(VERSAO_DADOS, tarefas_aquecimento)
+
+# Calculadas uma única vez por combinação de filtros e aba (no cache de resultados)
+# e compartilhadas entre as métricas e a aba ativa
+pedidos = PEDIDOS_AGREGACAO + PEDIDOS_ABA[aba_ativa]
+executor_plano = obter_executor_plano() if THREADS_PLANO > 1 else None
+if MODO_SQL:
+    # Cada consulta percorre a tabela no SQLite: nenhuma é derivada de outra
+    calcular_plano = partial(calcular_plano_sql, pedidos, filtros, executor_plano)
+else:
+    calcular_plano = partial(
+        calcular_agregados, df, cubos, indice, pedidos, filtros, lambda: df_filtrado, executor_plano
+    )
+with perfil.etapa('agregacoes', None if MODO_SQL else len(df_filtrado)) as medida:
+    agregados = em_cache(calcular_plano, filtros, 'plano', pedidos)
+    medida['linhas_saida'] = sum(len(agregado) for agregado in agregados.values())
+
+def calcular_metricas():
+    """Calcula o valor total e as contagens distintas exibidas nas métricas principais"""
+    # Cada grupo de uma agregação corresponde a um valor distinto presente nos
+    # dados; o total geral inclui as linhas com Ano ou Fluxo nulos
+    return {
+        'valor_total': agregados[()]['Valor_FOB'].sum(),
+        'n_paises': len(agregados[('Países',)]),
+        'n_produtos': len(agregados[('Cod_SH6',)]),
+        'n_ufs': len(agregados[('UF',)]),
+    }
 
 # Mostrar filtros ativos
 if any(filtros.values()):
@@ -329,597 +633,217 @@ if any(filtros.values()):
         if valores:
             st.sidebar.markdown(f"**{campo}:** {', '.join(map(str, valores))}")
 
+# Uso do cache de resultados compartilhado entre as sessões
+estatisticas_cache = obter_cache_resultados().estatisticas()
+st.sidebar.caption(
+    f"Cache de resultados: {estatisticas_cache.acertos:,} acertos, "
+    f"{estatisticas_cache.falhas:,} falhas, {estatisticas_cache.itens:,} itens "
+    f"({estatisticas_cache.bytes / 1024 / 1024:.1f} de {estatisticas_cache.limite_bytes / 1024 / 1024:.0f} MB)"
+)
+
 # Métricas principais
 st.subheader("Métricas Principais")
 col1, col2, col3, col4 = st.columns(4)
+with perfil.etapa('metricas'):
+    metricas = calcular_metricas()
 
 with col1:
-    valor_total = df_filtrado['Valor_FOB'].sum()
-    st.metric("Valor Total FOB (USD)", f"${valor_total:,.2f}")
+    st.metric("Valor Total FOB (USD)", f"${metricas['valor_total']:,.2f}")
 
 with col2:
-    n_paises = df_filtrado['Países'].nunique()
-    st.metric("Número de Países", f"{n_paises:,}")
+    st.metric("Número de Países", f"{metricas['n_paises']:,}")
 
 with col3:
-    n_produtos = df_filtrado['Cod_SH6'].nunique()
-    st.metric("Número de Produtos", f"{n_produtos:,}")
+    st.metric("Número de Produtos", f"{metricas['n_produtos']:,}")
 
 with col4:
-    n_ufs = df_filtrado['UF'].nunique()
-    st.metric("Número de UFs", f"{n_ufs:,}")
+    st.metric("Número de UFs", f"{metricas['n_ufs']:,}")
 
 # Visualizações
 st.subheader("Análises Gráficas")
 
-# Tab para diferentes visualizações
-tab1, tab2, tab3 = st.tabs(["Análise Temporal", "Análise Geográfica", "Análise por Produto"])
-
-with tab1:
-    # Gráfico de evolução temporal
-    df_temporal = df_filtrado.groupby(['Ano', 'Fluxo'])['Valor_FOB'].sum().reset_index()
-    
-    # Calcular o valor formatado para o hover
-    df_temporal['Valor_FOB_Format'] = df_temporal['Valor_FOB'].apply(format_big_number)
-    
-    # Calcular os valores min e max para o eixo Y
-    y_min = df_temporal['Valor_FOB'].min()
-    y_max = df_temporal['Valor_FOB'].max()
-    y_range = y_max - y_min
-    
-    # Criar valores para o eixo Y (6 pontos igualmente espaçados)
-    y_ticks = [y_min + (y_range * i / 5) for i in range(6)]
-    y_tick_texts = [format_big_number(val) for val in y_ticks]
-    
-    fig_temporal = px.line(
-        df_temporal,
-        x='Ano',
-        y='Valor_FOB',
-        color='Fluxo',
-        title="Evolução do Valor FOB por Ano e Fluxo",
-        template='plotly_dark',
-        labels={'Valor_FOB': 'Valor FOB', 'Ano': 'Ano', 'Fluxo': 'Fluxo'}
-    )
+# Gráficos com controles próprios: cada um é um fragmento, de modo que mudar um
+# desses controles reexecuta apenas o próprio gráfico, sobre os agregados
+# recebidos no último rerun completo
+def ordem_detalhes(ordenar_por, crescente, busca):
+    """
+    Posições de df das linhas filtradas e encontradas pela busca, na ordem pedida.
     
-    # Limpar os traces automáticos
-    fig_temporal.data = []
-    
-    # Personalizar o layout
-    fig_temporal.update_layout(
-        height=500,
-        hovermode='x unified',
-        legend=dict(
-            yanchor="top",
-            y=0.99,
-            xanchor="left",
-            x=0.01,
-            bgcolor='rgba(0,0,0,0.3)'
-        ),
-        yaxis=dict(
-            ticktext=y_tick_texts,  # Usar os textos pré-calculados
-            tickvals=y_ticks,       # Usar os valores pré-calculados
-            gridcolor='rgba(128,128,128,0.2)',
-            title_font=dict(size=14),
-            tickfont=dict(size=12)
-        ),
-        xaxis=dict(
-            gridcolor='rgba(128,128,128,0.2)',
-            title_font=dict(size=14),
-            tickfont=dict(size=12),
-            dtick=1
-        ),
-        title=dict(
-            font=dict(size=16),
-            y=0.95
-        ),
-        margin=dict(l=60, r=30, t=50, b=50)
+    A ordem da tabela completa é calculada uma vez por carga para cada
+    coluna; a de cada seleção, uma vez por combinação de filtros e busca.
+    """
+    ordem = em_cache(partial(ordem_coluna, df, ordenar_por, crescente), {}, 'ordem', ordenar_por, crescente)
+    return em_cache(
+        partial(ordenar_selecao, df, df_filtrado, ordem, busca),
+        filtros, 'ordem_selecao', ordenar_por, crescente, busca
     )
+
+def voltar_primeira_pagina():
+    """Volta a tabela para a primeira página quando a busca ou a ordenação mudam"""
+    st.session_state.detalhe_pagina = 1
+
+@st.fragment
+def exibir_dados_detalhados():
+    """
+    Exibe uma página da tabela de dados filtrados.
     
-    # Personalizar as linhas com cores específicas
-    colors = {'Exportação': '#636EFA', 'Importação': '#EF553B'}
-    
-    for fluxo in df_temporal['Fluxo'].unique():
-        df_fluxo = df_temporal[df_temporal['Fluxo'] == fluxo]
-        
-        fig_temporal.add_trace(
-            go.Scatter(
-                x=df_fluxo['Ano'],
-                y=df_fluxo['Valor_FOB'],
-                name=fluxo,
-                mode='lines+markers',
-                line=dict(width=3, color=colors[fluxo]),
-                marker=dict(size=8, color=colors[fluxo]),
-                hovertemplate="<b>Ano: %{x}</b><br>" +
-                             f"{fluxo}: %{{text}}<br>" +
-                             "<extra></extra>",
-                text=df_fluxo['Valor_FOB_Format']
-            )
-        )
-        
-        # Adicionar rótulo no ponto final
-        ultimo_valor = df_fluxo.iloc[-1]
-        fig_temporal.add_annotation(
-            x=ultimo_valor['Ano'],
-            y=ultimo_valor['Valor_FOB'],
-            text=ultimo_valor['Valor_FOB_Format'],
-            showarrow=True,
-            arrowhead=0,
-            ax=40,
-            ay=-40 if fluxo == 'Exportação' else 40,
-            font=dict(size=12),
-            bgcolor='rgba(0,0,0,0.5)',
-            bordercolor='rgba(255,255,255,0.3)',
-            borderwidth=1,
-            borderpad=4
+    Busca, ordenação e paginação são feitas no servidor: apenas as linhas da
+    página atual são enviadas ao navegador, qualquer que seja o tamanho da
+    seleção.
+    """
+    col_busca, col_ordem, col_sentido, col_tamanho = st.columns([3, 2, 1, 1])
+    
+    with col_busca:
+        busca = st.text_input(
+            "Buscar",
+            placeholder="País, UF, URF, seção ou produto",
+            key="detalhe_busca",
+            on_change=voltar_primeira_pagina
+        ).strip()
+    
+    with col_ordem:
+        ordenar_por = st.selectbox(
+            "Ordenar por",
+            options=COLUNAS_DETALHE,
+            index=COLUNAS_DETALHE.index('Valor_FOB'),
+            key="detalhe_ordem",
+            on_change=voltar_primeira_pagina
         )
     
-    # Exibir o gráfico
-    st.plotly_chart(fig_temporal, use_container_width=True)
-    
-    st.markdown("""
-    <div style='background-color: rgba(255,255,255,0.1); padding: 10px; border-radius: 5px;'>
-        <small>
-        Este gráfico mostra a evolução temporal dos valores FOB de importação e exportação ao longo dos anos.
-        As linhas representam as tendências de cada fluxo, com valores formatados para melhor visualização.
-        Os pontos finais são destacados com rótulos para facilitar a interpretação dos valores mais recentes.
-        </small>
-    </div>
-    """, unsafe_allow_html=True)
-
-with tab2:
-    st.subheader("Distribuição Global do Valor FOB")
+    with col_sentido:
+        crescente = st.selectbox(
+            "Ordem",
+            options=[False, True],
+            format_func=lambda c: "Crescente" if c else "Decrescente",
+            key="detalhe_crescente",
+            on_change=voltar_primeira_pagina
+        )
     
-    # Atualizar o dicionário de países (agora com 198 países)
-    pais_map = {
-        'Afeganistão': 'Afghanistan', 'África do Sul': 'South Africa', 'Albânia': 'Albania',
-        'Alemanha': 'Germany', 'Andorra': 'Andorra', 'Angola': 'Angola',
-        'Antígua e Barbuda': 'Antigua and Barbuda', 'Arábia Saudita': 'Saudi Arabia',
-        'Argélia': 'Algeria', 'Argentina': 'Argentina', 'Armênia': 'Armenia',
-        'Austrália': 'Australia', 'Áustria': 'Austria', 'Azerbaijão': 'Azerbaijan',
-        'Bahamas': 'Bahamas', 'Bangladesh': 'Bangladesh', 'Barbados': 'Barbados',
-        'Barein': 'Bahrain', 'Bélgica': 'Belgium', 'Belize': 'Belize',
-        'Benin': 'Benin', 'Bielorrússia': 'Belarus', 'Bolívia': 'Bolivia',
-        'Bósnia e Herzegovina': 'Bosnia and Herzegovina', 'Botsuana': 'Botswana',
-        'Brasil': 'Brazil', 'Brunei': 'Brunei', 'Bulgária': 'Bulgaria',
-        'Burkina Faso': 'Burkina Faso', 'Burundi': 'Burundi', 'Butão': 'Bhutan',
-        'Cabo Verde': 'Cape Verde', 'Camarões': 'Cameroon', 'Camboja': 'Cambodia',
-        'Canadá': 'Canada', 'Catar': 'Qatar', 'Cazaquistão': 'Kazakhstan',
-        'Chade': 'Chad', 'Chile': 'Chile', 'China': 'China', 'Chipre': 'Cyprus',
-        'Cingapura': 'Singapore', 'Colômbia': 'Colombia', 'Comores': 'Comoros',
-        'Congo': 'Congo', 'Coreia do Norte': 'North Korea', 'Coreia do Sul': 'South Korea',
-        'Costa do Marfim': 'Ivory Coast', 'Costa Rica': 'Costa Rica', 'Croácia': 'Croatia',
-        'Cuba': 'Cuba', 'Dinamarca': 'Denmark', 'Djibuti': 'Djibouti', 'Dominica': 'Dominica',
-        'Egito': 'Egypt', 'El Salvador': 'El Salvador', 'Emirados Árabes Unidos': 'United Arab Emirates',
-        'Equador': 'Ecuador', 'Eritreia': 'Eritrea', 'Eslováquia': 'Slovakia',
-        'Eslovênia': 'Slovenia', 'Espanha': 'Spain', 'Estados Unidos': 'United States',
-        'Estônia': 'Estonia', 'Eswatini': 'Eswatini', 'Etiópia': 'Ethiopia',
-        'Fiji': 'Fiji', 'Filipinas': 'Philippines', 'Finlândia': 'Finland',
-        'França': 'France', 'Gabão': 'Gabon', 'Gâmbia': 'Gambia', 'Gana': 'Ghana',
-        'Geórgia': 'Georgia', 'Granada': 'Grenada', 'Grécia': 'Greece',
-        'Guatemala': 'Guatemala', 'Guiana': 'Guyana', 'Guiné': 'Guinea',
-        'Guiné Equatorial': 'Equatorial Guinea', 'Guiné-Bissau': 'Guinea-Bissau',
-        'Haiti': 'Haiti', 'Honduras': 'Honduras', 'Hungria': 'Hungary',
-        'Iêmen': 'Yemen', 'Índia': 'India', 'Indonésia': 'Indonesia',
-        'Irã': 'Iran', 'Iraque': 'Iraq', 'Irlanda': 'Ireland',
-        'Islândia': 'Iceland', 'Israel': 'Israel', 'Itália': 'Italy',
-        'Jamaica': 'Jamaica', 'Japão': 'Japan', 'Jordânia': 'Jordan',
-        'Kuwait': 'Kuwait', 'Laos': 'Laos', 'Lesoto': 'Lesotho',
-        'Letônia': 'Latvia', 'Líbano': 'Lebanon', 'Libéria': 'Liberia',
-        'Líbia': 'Libya', 'Liechtenstein': 'Liechtenstein', 'Lituânia': 'Lithuania',
-        'Luxemburgo': 'Luxembourg', 'Macedônia do Norte': 'North Macedonia',
-        'Madagascar': 'Madagascar', 'Malásia': 'Malaysia', 'Malaui': 'Malawi',
-        'Maldivas': 'Maldives', 'Mali': 'Mali', 'Malta': 'Malta',
-        'Marrocos': 'Morocco', 'Maurício': 'Mauritius', 'Mauritânia': 'Mauritania',
-        'México': 'Mexico', 'Mianmar': 'Myanmar', 'Micronésia': 'Micronesia',
-        'Moçambique': 'Mozambique', 'Moldávia': 'Moldova', 'Mônaco': 'Monaco',
-        'Mongólia': 'Mongolia', 'Montenegro': 'Montenegro', 'Namíbia': 'Namibia',
-        'Nauru': 'Nauru', 'Nepal': 'Nepal', 'Nicarágua': 'Nicaragua',
-        'Níger': 'Niger', 'Nigéria': 'Nigeria', 'Noruega': 'Norway',
-        'Nova Zelândia': 'New Zealand', 'Omã': 'Oman', 'Países Baixos': 'Netherlands',
-        'Palau': 'Palau', 'Panamá': 'Panama', 'Papua Nova Guiné': 'Papua New Guinea',
-        'Paquistão': 'Pakistan', 'Paraguai': 'Paraguay', 'Peru': 'Peru',
-        'Polônia': 'Poland', 'Portugal': 'Portugal', 'Quênia': 'Kenya',
-        'Quirguistão': 'Kyrgyzstan', 'Reino Unido': 'United Kingdom',
-        'República Centro-Africana': 'Central African Republic',
-        'República Democrática do Congo': 'Democratic Republic of the Congo',
-        'República Dominicana': 'Dominican Republic', 'República Tcheca': 'Czech Republic',
-        'Romênia': 'Romania', 'Ruanda': 'Rwanda', 'Rússia': 'Russia',
-        'Salomão': 'Solomon Islands', 'Samoa': 'Samoa', 'San Marino': 'San Marino',
-        'Santa Lúcia': 'Saint Lucia', 'São Cristóvão e Nevis': 'Saint Kitts and Nevis',
-        'São Tomé e Príncipe': 'Sao Tome and Principe',
-        'São Vicente e Granadinas': 'Saint Vincent and the Grenadines',
-        'Seicheles': 'Seychelles', 'Senegal': 'Senegal', 'Serra Leoa': 'Sierra Leone',
-        'Sérvia': 'Serbia', 'Síria': 'Syria', 'Somália': 'Somalia',
-        'Sri Lanka': 'Sri Lanka', 'Sudão': 'Sudan', 'Sudão do Sul': 'South Sudan',
-        'Suécia': 'Sweden', 'Suíça': 'Switzerland', 'Suriname': 'Suriname',
-        'Tadjiquistão': 'Tajikistan', 'Tailândia': 'Thailand', 'Taiwan': 'Taiwan',
-        'Tanzânia': 'Tanzania', 'Timor-Leste': 'Timor-Leste', 'Togo': 'Togo',
-        'Tonga': 'Tonga', 'Trinidad e Tobago': 'Trinidad and Tobago',
-        'Tunísia': 'Tunisia', 'Turcomenistão': 'Turkmenistan', 'Turquia': 'Turkey',
-        'Tuvalu': 'Tuvalu', 'Ucrânia': 'Ukraine', 'Uganda': 'Uganda',
-        'Uruguai': 'Uruguay', 'Uzbequistão': 'Uzbekistan', 'Vanuatu': 'Vanuatu',
-        'Vaticano': 'Vatican City', 'Venezuela': 'Venezuela', 'Vietnã': 'Vietnam',
-        'Zâmbia': 'Zambia', 'Zimbábue': 'Zimbabwe',
-        'Hong Kong': 'Hong Kong',
-        'Macau': 'Macao',
-        'Taiwan, Província da China': 'Taiwan',
-        'Coreia, República da': 'South Korea',
-        'Irã, República Islâmica do': 'Iran',
-        'República Democrática Popular do Laos': 'Laos',
-        'Vietnã': 'Vietnam',
-        'Estado da Palestina': 'Palestine',
-        'Síria, República Árabe da': 'Syria',
-        'Brunei Darussalam': 'Brunei',
-        'Ilhas Virgens Britânicas': 'British Virgin Islands',
-        'Ilhas Cayman': 'Cayman Islands',
-        'São Martinho (Países Baixos)': 'Sint Maarten',
-        'Curaçao': 'Curacao',
-        'Guadalupe': 'Guadeloupe',
-        'Martinica': 'Martinique',
-        'Porto Rico': 'Puerto Rico',
-        'Guiana Francesa': 'French Guiana',
-        'Saara Ocidental': 'Western Sahara',
-        'Ilha de Man': 'Isle of Man',
-        'Ilhas Faroe': 'Faroe Islands',
-        'Groenlândia': 'Greenland',
-        'Guam': 'Guam',
-        'Nova Caledônia': 'New Caledonia',
-        'Polinésia Francesa': 'French Polynesia',
-        'Samoa Americana': 'American Samoa',
-        'Territórios Franceses do Sul': 'French Southern Territories',
-        'República da Macedônia do Norte': 'North Macedonia',
-        'Kosovo': 'Kosovo',
-        'Território Britânico do Oceano Índico': 'British Indian Ocean Territory',
-        'Mayotte': 'Mayotte',
-        'Reunião': 'Reunion',
-        'Santa Helena': 'Saint Helena',
-        'Svalbard e Jan Mayen': 'Svalbard and Jan Mayen',
-        'Ilhas Malvinas': 'Falkland Islands'
-    }
+    with col_tamanho:
+        linhas_pagina = st.selectbox(
+            "Linhas por página",
+            options=[50, 100, 500],
+            key="detalhe_linhas",
+            on_change=voltar_primeira_pagina
+        )
     
-    # Preparar dados para o mapa
-    df_mapa = df_filtrado.groupby('Países')['Valor_FOB'].sum().reset_index()
-    df_mapa['Países_EN'] = df_mapa['Países'].map(pais_map).fillna(df_mapa['Países'])
-    df_mapa['Valor_FOB_Format'] = df_mapa['Valor_FOB'].apply(format_currency)
-    
-    # Criar função para formatar os valores da régua
-    def format_colorbar_tick(value):
-        """Formata os valores da régua do mapa para um formato mais conciso"""
-        if value >= 1e9:
-            return f"${value/1e9:.2f}B"
-        elif value >= 1e6:
-            return f"${value/1e6:.2f}M"
-        elif value >= 1e3:
-            return f"${value/1e3:.2f}K"
-        return f"${value:.2f}"
-    
-    # Criar mapa
-    fig_mapa = px.choropleth(
-        df_mapa,
-        locations='Países_EN',
-        locationmode='country names',
-        color='Valor_FOB',
-        hover_name='Países',
-        hover_data={
-            'Países_EN': False,
-            'Valor_FOB': False,
-            'Valor_FOB_Format': True
-        },
-        color_continuous_scale='RdBu',
-        template='plotly_dark'
+    if MODO_SQL:
+        total = contar_detalhes(VERSAO_BANCO, filtros, busca)
+    else:
+        posicoes = ordem_detalhes(ordenar_por, crescente, busca)
+        total = len(posicoes)
+    
+    # Uma seleção menor (novos filtros) pode ter menos páginas que a página atual
+    n_paginas = max(1, -(-total // linhas_pagina))
+    if st.session_state.get('detalhe_pagina', 1) > n_paginas:
+        st.session_state.detalhe_pagina = n_paginas
+    pagina = st.number_input(
+        f"Página (de {n_paginas:,})",
+        min_value=1,
+        max_value=n_paginas,
+        step=1,
+        key="detalhe_pagina"
     )
     
-    # Configurar o hover template
-    fig_mapa.update_traces(
-        hovertemplate="<b>%{hovertext}</b><br>" +
-                     "Valor FOB: %{customdata[0]}<br>" +
-                     "<extra></extra>",
-        customdata=df_mapa[['Valor_FOB_Format']]
+    inicio = (pagina - 1) * linhas_pagina
+    with perfil.etapa('dados_detalhados', total) as medida:
+        if MODO_SQL:
+            df_pagina = consultar_pagina_detalhes(
+                VERSAO_BANCO, filtros, ordenar_por, crescente, busca, linhas_pagina, inicio
+            )
+        else:
+            df_pagina = fatiar_pagina(df, posicoes, inicio, linhas_pagina)
+        medida['linhas_saida'] = len(df_pagina)
+    
+    st.caption(f"Linhas {min(inicio + 1, total):,} a {inicio + len(df_pagina):,} de {total:,}")
+    st.dataframe(
+        df_pagina,
+        hide_index=True
     )
+
+@st.fragment
+def exibir_ranking(titulo, rotulo, chave, agregado, coluna, legenda, **opcoes_figura):
+    """
+    Exibe as barras com os maiores valores FOB de uma dimensão.
     
-    # Calcular os valores dos ticks da régua
-    max_valor = df_mapa['Valor_FOB'].max()
-    tick_values = [i * max_valor/4 for i in range(5)]  # 5 pontos na régua
-    
-    # Configurar layout do mapa
-    fig_mapa.update_layout(
-        geo=dict(
-            showframe=True,
-            showcoastlines=True,
-            projection_type='natural earth',
-            coastlinecolor='Gray',
-            countrycolor='Gray',
-            showland=True,
-            landcolor='rgba(50, 50, 50, 0.8)',
-            showocean=True,
-            oceancolor='rgba(30, 30, 30, 0.8)',
-            showcountries=True,
-            bgcolor='rgba(0,0,0,0)'
-        ),
-        height=600,
-        margin=dict(l=0, r=0, t=30, b=0),
-        paper_bgcolor='rgba(0,0,0,0)',
-        coloraxis_colorbar=dict(
-            title='Valor FOB',
-            ticktext=[format_colorbar_tick(val) for val in tick_values],
-            tickvals=tick_values,
-            len=0.8,
-            thickness=20,
-            tickfont=dict(size=12)
-        )
+    Args:
+        titulo (str): Título do gráfico
+        rotulo (str): Rótulo do seletor de quantidade
+        chave (str): Chave do seletor na sessão
+        agregado (pd.DataFrame): Colunas coluna e Valor_FOB
+        coluna (str): Dimensão exibida (ex.: 'Países')
+        legenda (str): Texto explicativo exibido abaixo do gráfico
+        **opcoes_figura: Parâmetros adicionais de figura_barras
+    """
+    st.subheader(titulo)
+    n_exibidos = st.selectbox(
+        rotulo,
+        options=[10, 20, 50, 100],
+        key=chave
     )
     
-    st.plotly_chart(fig_mapa, use_container_width=True)
-
-    # Gráficos de análise geográfica
-    col1, col2 = st.columns(2)
+    df_top = (agregado
+              .sort_values('Valor_FOB', ascending=False)
+              .head(n_exibidos))
     
-    with col1:
-        st.subheader("Top Países por Valor FOB")
-        n_paises = st.selectbox(
-            "Número de países a exibir",
-            options=[10, 20, 50, 100],
-            key="n_paises"
-        )
-        
-        df_paises = (df_filtrado.groupby('Países')['Valor_FOB']
-                    .sum()
-                    .sort_values(ascending=False)
-                    .head(n_paises)
-                    .reset_index())
-        
-        df_paises['Valor_FOB_Format'] = df_paises['Valor_FOB'].apply(format_currency)
-        
-        # Calcular os valores dos ticks
-        max_valor_paises = df_paises['Valor_FOB'].max()
-        tick_values_paises = [i * max_valor_paises/5 for i in range(6)]
-        
-        fig_paises = go.Figure()
-        fig_paises.add_trace(
-            go.Bar(
-                x=df_paises['Valor_FOB'],
-                y=df_paises['Países'],
-                orientation='h',
-                text=df_paises['Valor_FOB_Format'],
-                textposition='outside',
-                marker=dict(
-                    color='rgba(99, 110, 250, 0.8)',
-                    line=dict(color='rgba(99, 110, 250, 1.0)', width=2)
-                ),
-                hovertemplate="<b>%{y}</b><br>" +
-                             "Valor FOB: %{text}<br>" +
-                             "<extra></extra>"
-            )
-        )
-        
-        fig_paises.update_layout(
-            xaxis=dict(
-                title="Valor FOB",
-                ticktext=[format_currency(val) for val in tick_values_paises],
-                tickvals=tick_values_paises,
-                showgrid=True,
-                gridwidth=1,
-                gridcolor='rgba(128,128,128,0.2)',
-            ),
-            yaxis=dict(title=""),
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            height=500,
-            margin=dict(l=10, r=10, t=30, b=10),
-            hoverlabel=dict(
-                bgcolor='white',
-                font_color='black',
-                font_size=12
-            )
-        )
-        
-        st.plotly_chart(fig_paises, use_container_width=True)
-        
-        st.markdown("""
-        <div style='background-color: rgba(255,255,255,0.1); padding: 10px; border-radius: 5px;'>
-            <small>
-            Este gráfico apresenta os principais países ordenados por valor FOB total.
-            As barras mostram a contribuição de cada país para o comércio exterior,
-            permitindo identificar os parceiros comerciais mais significativos.
-            </small>
-        </div>
-        """, unsafe_allow_html=True)
+    with perfil.etapa(f"figura:{chave}", len(df_top)):
+        fig = figura_barras_cache(df_top, coluna, **opcoes_figura)
+    plotly_chart(fig, key=f"grafico_{chave}")
     
-    with col2:
-        st.subheader("Top URF por Valor FOB")
-        n_urf = st.selectbox(
-            "Número de URFs a exibir",
-            options=[10, 20, 50, 100],
-            key="n_urf"
-        )
-        
-        df_urf = (df_filtrado.groupby('URF')['Valor_FOB']
-                 .sum()
-                 .sort_values(ascending=False)
-                 .head(n_urf)
-                 .reset_index())
-        
-        df_urf['Valor_FOB_Format'] = df_urf['Valor_FOB'].apply(format_currency)
-        
-        # Calcular os valores dos ticks
-        max_valor_urf = df_urf['Valor_FOB'].max()
-        tick_values_urf = [i * max_valor_urf/5 for i in range(6)]
-        
-        fig_urf = go.Figure()
-        fig_urf.add_trace(
-            go.Bar(
-                x=df_urf['Valor_FOB'],
-                y=df_urf['URF'],
-                orientation='h',
-                text=df_urf['Valor_FOB_Format'],
-                textposition='outside',
-                marker=dict(
-                    color='rgba(99, 110, 250, 0.8)',
-                    line=dict(color='rgba(99, 110, 250, 1.0)', width=2)
-                ),
-                hovertemplate="<b>%{y}</b><br>" +
-                             "Valor FOB: %{text}<br>" +
-                             "<extra></extra>"
-            )
-        )
-        
-        fig_urf.update_layout(
-            xaxis=dict(
-                title="Valor FOB",
-                ticktext=[format_currency(val) for val in tick_values_urf],
-                tickvals=tick_values_urf,
-                showgrid=True,
-                gridwidth=1,
-                gridcolor='rgba(128,128,128,0.2)',
-            ),
-            yaxis=dict(title=""),
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            height=500,
-            margin=dict(l=10, r=10, t=30, b=10),
-            hoverlabel=dict(
-                bgcolor='white',
-                font_color='black',
-                font_size=12
-            )
-        )
-        
-        st.plotly_chart(fig_urf, use_container_width=True)
-        
-        st.markdown("""
-        <div style='background-color: rgba(255,255,255,0.1); padding: 10px; border-radius: 5px;'>
-            <small>
-            Este gráfico mostra as principais Unidades da Receita Federal (URFs) por valor FOB.
-            Cada barra representa o volume total de operações processadas por cada URF,
-            auxiliando na identificação dos principais pontos de entrada e saída de mercadorias.
-            </small>
-        </div>
-        """, unsafe_allow_html=True)
+    st.markdown(legenda, unsafe_allow_html=True)
 
-    st.markdown("---")
-    st.subheader("Distribuição de Produtos por URF")
+@st.fragment
+def exibir_produtos_por_grupo(titulo, grupo, rotulo_grupo, rotulos, chaves, legenda):
+    """
+    Exibe as barras empilhadas com os principais produtos dos maiores grupos.
+    
+    Args:
+        titulo (str): Título do gráfico
+        grupo (str): Coluna das barras (ex.: 'URF')
+        rotulo_grupo (str): Nome do grupo exibido no hover (ex.: 'URF')
+        rotulos (tuple): Rótulos dos seletores de grupos e de produtos por grupo
+        chaves (tuple): Chaves dos dois seletores na sessão
+        legenda (str): Texto explicativo exibido abaixo do gráfico
+    """
+    st.subheader(titulo)
     
     # Controles de seleção
-    col_urf_controls = st.columns([1, 1, 2])
+    col_controles = st.columns([1, 1, 2])
     
-    with col_urf_controls[0]:
-        n_urf_geo = st.selectbox(
-            "Número de URFs",
+    with col_controles[0]:
+        n_grupos = st.selectbox(
+            rotulos[0],
             options=[5, 10, 15, 20],
-            key="n_urf_geo"
+            key=chaves[0]
         )
     
-    with col_urf_controls[1]:
-        n_produtos_urf = st.selectbox(
-            "Produtos por URF",
+    with col_controles[1]:
+        n_produtos_grupo = st.selectbox(
+            rotulos[1],
             options=[5, 10, 15],
             index=0,
-            key="n_produtos_urf"
+            key=chaves[1]
         )
     
-    # Preparar dados para o gráfico
-    top_urfs = (df_filtrado.groupby('URF')['Valor_FOB']
-               .sum()
-               .sort_values(ascending=True)
-               .tail(n_urf_geo)
-               .index)
-    
-    df_urf_stacked = df_filtrado[df_filtrado['URF'].isin(top_urfs)]
-    
-    # Para cada URF, pegar os top N produtos
-    dfs_urf_produtos = []
-    for urf in top_urfs:
-        df_urf = df_urf_stacked[df_urf_stacked['URF'] == urf]
-        top_produtos_urf = (df_urf.groupby('Desc_SH6')['Valor_FOB']
-                            .sum()
-                            .sort_values(ascending=False)
-                            .head(n_produtos_urf)
-                            .reset_index())
-        top_produtos_urf['URF'] = urf
-        dfs_urf_produtos.append(top_produtos_urf)
-    
-    df_urf_plot = pd.concat(dfs_urf_produtos)
-    
-    # Calcular os valores dos ticks antes de criar o gráfico
-    max_valor_urf = df_urf_plot['Valor_FOB'].max()
-    tick_values_urf = [i * max_valor_urf/5 for i in range(6)]
-    
-    # Criar o gráfico
-    fig_urf_stacked = go.Figure()
-    
-    # Adicionar uma barra para cada produto
-    produtos_unicos_urf = df_urf_plot['Desc_SH6'].unique()
-    
-    for i, produto in enumerate(produtos_unicos_urf):
-        df_produto = df_urf_plot[df_urf_plot['Desc_SH6'] == produto]
-        
-        hover_text = [
-            f"<b>URF:</b> {urf}<br>" +
-            f"<b>Produto:</b> {produto}<br>" +
-            f"<b>Valor:</b> {format_currency(valor)}"
-            for urf, valor in zip(df_produto['URF'], df_produto['Valor_FOB'])
-        ]
-        
-        fig_urf_stacked.add_trace(go.Bar(
-            name=produto[:50] + '...' if len(produto) > 50 else produto,
-            y=df_produto['URF'],
-            x=df_produto['Valor_FOB'],
-            orientation='h',
-            hovertext=hover_text,
-            hoverinfo='text',
-            marker_color=MAPA_CORES_PRODUTOS[produto]  # Usar a cor fixa do mapeamento
-        ))
-    
-    # Atualizar o layout
-    fig_urf_stacked.update_layout(
-        barmode='stack',
-        height=max(400, n_urf_geo * 40),
-        margin=dict(l=20, r=20, t=30, b=20),
-        xaxis=dict(
-            ticktext=[format_currency(val) for val in tick_values_urf],
-            tickvals=tick_values_urf,
-            title="Valor FOB",
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='rgba(128,128,128,0.2)',
-        ),
-        yaxis=dict(
-            title="",
-            categoryorder='total ascending'
-        ),
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=-0.3,
-            xanchor="center",
-            x=0.5,
-            bgcolor='rgba(255, 255, 255, 0.1)'
-        ),
-        showlegend=True,
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        hoverlabel=dict(
-            bgcolor='white',
-            font_color='black',
-            font_size=12
-        )
-    )
+    # Preparar dados para o gráfico: top N produtos de cada um dos maiores grupos
+    df_plot = top_por_grupo(grupo, 'Desc_SH6', n_grupos, n_produtos_grupo)
     
-    # Exibir o gráfico
-    st.plotly_chart(fig_urf_stacked, use_container_width=True)
+    with perfil.etapa(f"figura:{chaves[0]}", len(df_plot)):
+        cores = cores_produtos(df_plot['Desc_SH6'].unique())
+        fig = figura_empilhada_cache(df_plot, grupo, rotulo_grupo, n_grupos, cores)
+    plotly_chart(fig, key=f"grafico_{chaves[0]}")
     
     # Adicionar legenda explicativa
-    st.markdown("""
-    <div style='background-color: rgba(255,255,255,0.1); padding: 10px; border-radius: 5px;'>
-        <small>
-        Este gráfico mostra a distribuição dos principais produtos por URF (Unidade da Receita Federal).
-        Cada barra representa uma URF, e as cores diferentes mostram a contribuição de cada produto.
-        Passe o mouse sobre as barras para ver os detalhes.
-        </small>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(legenda, unsafe_allow_html=True)
+
+@st.fragment
+def exibir_comparacao_urf(opcoes_urf):
+    """
+    Exibe a comparação dos produtos comuns a duas URFs escolhidas.
     
-    st.markdown("---")
+    Args:
+        opcoes_urf (list): URFs disponíveis nos seletores
+    """
     st.subheader("Comparação de Produtos entre URFs")
     
     # Controles para seleção
@@ -928,14 +852,14 @@ with tab2:
     with col_comp_controls[0]:
         urf_1 = st.selectbox(
             "URF 1",
-            options=sorted(df_filtrado['URF'].unique()),
+            options=opcoes_urf,
             key="urf_1"
         )
     
     with col_comp_controls[1]:
         urf_2 = st.selectbox(
             "URF 2",
-            options=sorted(df_filtrado['URF'].unique()),
+            options=opcoes_urf,
             key="urf_2"
         )
     
@@ -949,8 +873,9 @@ with tab2:
         )
     
     # Preparar dados para comparação
-    df_urf1 = df_filtrado[df_filtrado['URF'] == urf_1].groupby('Desc_SH6')['Valor_FOB'].sum()
-    df_urf2 = df_filtrado[df_filtrado['URF'] == urf_2].groupby('Desc_SH6')['Valor_FOB'].sum()
+    df_urfs_comp = agregar(['URF', 'Desc_SH6'], {'URF': [urf_1, urf_2]})
+    df_urf1 = df_urfs_comp[df_urfs_comp['URF'] == urf_1].set_index('Desc_SH6')['Valor_FOB']
+    df_urf2 = df_urfs_comp[df_urfs_comp['URF'] == urf_2].set_index('Desc_SH6')['Valor_FOB']
     
     # Encontrar produtos em comum
     produtos_comuns = set(df_urf1.index) & set(df_urf2.index)
@@ -974,90 +899,9 @@ with tab2:
         ((df_comparacao['Valor_URF1'] + df_comparacao['Valor_URF2']) / 2) * 100
     )
     
-    # Criar o gráfico de dispersão
-    fig_comparacao = go.Figure()
-    
-    # Adicionar linha diagonal de referência
-    max_valor = max(df_comparacao['Valor_URF1'].max(), df_comparacao['Valor_URF2'].max())
-    fig_comparacao.add_trace(go.Scatter(
-        x=[0, max_valor],
-        y=[0, max_valor],
-        mode='lines',
-        name='Linha de Igualdade',
-        line=dict(dash='dash', color='gray'),
-        hoverinfo='skip'
-    ))
-    
-    # Adicionar os pontos
-    hover_text = [
-        f"<b>Produto:</b> {prod}<br>" +
-        f"<b>{urf_1}:</b> {format_currency(val1)}<br>" +
-        f"<b>{urf_2}:</b> {format_currency(val2)}<br>" +
-        f"<b>Diferença:</b> {diff:.1f}%"
-        for prod, val1, val2, diff in zip(
-            df_comparacao['Produto'],
-            df_comparacao['Valor_URF1'],
-            df_comparacao['Valor_URF2'],
-            df_comparacao['Diferenca_Percentual']
-        )
-    ]
-    
-    fig_comparacao.add_trace(go.Scatter(
-        x=df_comparacao['Valor_URF1'],
-        y=df_comparacao['Valor_URF2'],
-        mode='markers',
-        name='Produtos',
-        marker=dict(
-            size=10,
-            color=df_comparacao['Diferenca_Percentual'],
-            colorscale='RdBu',
-            colorbar=dict(
-                title='Diferença %',
-                ticksuffix='%'
-            ),
-            showscale=True
-        ),
-        hovertext=hover_text,
-        hoverinfo='text'
-    ))
-    
-    # Atualizar layout
-    fig_comparacao.update_layout(
-        title=f"Comparação de Valores FOB entre {urf_1} e {urf_2}",
-        xaxis=dict(
-            title=f"Valor FOB - {urf_1}",
-            type='log',
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='rgba(128,128,128,0.2)',
-        ),
-        yaxis=dict(
-            title=f"Valor FOB - {urf_2}",
-            type='log',
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='rgba(128,128,128,0.2)',
-        ),
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        height=600,
-        showlegend=True,
-        legend=dict(
-            yanchor="top",
-            y=0.99,
-            xanchor="left",
-            x=0.01,
-            bgcolor='rgba(255,255,255,0.1)'
-        ),
-        hoverlabel=dict(
-            bgcolor='white',
-            font_color='black',
-            font_size=12
-        )
-    )
-    
-    # Exibir o gráfico
-    st.plotly_chart(fig_comparacao, use_container_width=True)
+    with perfil.etapa('figura:comparacao_urf', len(df_comparacao)):
+        fig_comparacao = figura_comparacao_cache(df_comparacao, urf_1, urf_2)
+    plotly_chart(fig_comparacao, key="grafico_comparacao_urf")
     
     # Adicionar explicação
     st.markdown("""
@@ -1075,77 +919,107 @@ with tab2:
     </div>
     """, unsafe_allow_html=True)
 
-with tab3:
-    st.subheader("Análise por Produto")
+# Cada aba é um fragmento: os controles de uma aba reexecutam apenas a própria
+# aba, reaproveitando os agregados calculados no último rerun completo
+@st.fragment
+def exibir_analise_temporal():
+    """Exibe a aba Análise Temporal"""
+    # Gráfico de evolução temporal
+    with perfil.etapa('figura:temporal', len(agregados[('Ano', 'Fluxo')])):
+        fig_temporal = figura_temporal_cache(agregados[('Ano', 'Fluxo')])
+    plotly_chart(fig_temporal, key="grafico_temporal")
     
+    st.markdown("""
+    <div style='background-color: rgba(255,255,255,0.1); padding: 10px; border-radius: 5px;'>
+        <small>
+        Este gráfico mostra a evolução temporal dos valores FOB de importação e exportação ao longo dos anos.
+        As linhas representam as tendências de cada fluxo, com valores formatados para melhor visualização.
+        Os pontos finais são destacados com rótulos para facilitar a interpretação dos valores mais recentes.
+        </small>
+    </div>
+    """, unsafe_allow_html=True)
+
+@st.fragment
+def exibir_analise_geografica():
+    """Exibe a aba Análise Geográfica"""
+    st.subheader("Distribuição Global do Valor FOB")
+    
+    
+    # Preparar dados para o mapa: códigos ISO-3 resolvidos na carga
+    df_mapa = agregados[('Países',)].copy()
+    df_mapa['ISO3'] = df_mapa['Países'].astype(str).map(codigos_paises)
+    fora_do_mapa = df_mapa.loc[df_mapa['ISO3'].isna(), 'Países'].astype(str).tolist()
+    df_mapa = df_mapa.dropna(subset=['ISO3'])
+    
+    with perfil.etapa('figura:mapa', len(df_mapa)):
+        fig_mapa = figura_mapa_cache(df_mapa)
+    plotly_chart(fig_mapa, key="grafico_mapa")
+    if fora_do_mapa:
+        st.caption(f"Sem código ISO-3, fora do mapa: {', '.join(sorted(fora_do_mapa))}")
+
+    # Gráficos de análise geográfica
     col1, col2 = st.columns(2)
     
     with col1:
-        st.subheader("Top Seções por Valor FOB")
-        n_secoes = st.selectbox(
-            "Número de seções a exibir",
-            options=[10, 20, 50, 100],
-            key="n_secoes"
-        )
-        
-        # Top N seções
-        df_secoes = (df_filtrado.groupby('Desc_Secao')['Valor_FOB']
-                    .sum()
-                    .sort_values(ascending=False)
-                    .head(n_secoes)
-                    .reset_index())
-        
-        df_secoes['Valor_FOB_Format'] = df_secoes['Valor_FOB'].apply(format_currency)
-        
-        # Calcular os valores dos ticks
-        max_valor_secoes = df_secoes['Valor_FOB'].max()
-        tick_values_secoes = [i * max_valor_secoes/5 for i in range(6)]
-        
-        fig_secoes = go.Figure()
-        fig_secoes.add_trace(
-            go.Bar(
-                x=df_secoes['Valor_FOB'],
-                y=df_secoes['Desc_Secao'],
-                orientation='h',
-                text=df_secoes['Valor_FOB_Format'],
-                textposition='outside',
-                marker=dict(
-                    color='rgba(99, 110, 250, 0.8)',
-                    line=dict(color='rgba(99, 110, 250, 1.0)', width=2)
-                ),
-                hovertemplate="<b>%{y}</b><br>" +
-                             "Valor FOB: %{text}<br>" +
-                             "<extra></extra>"
-            )
+        exibir_ranking(
+            "Top Países por Valor FOB", "Número de países a exibir", "n_paises",
+            agregados[('Países',)], 'Países',
+            legenda="""
+        <div style='background-color: rgba(255,255,255,0.1); padding: 10px; border-radius: 5px;'>
+            <small>
+            Este gráfico apresenta os principais países ordenados por valor FOB total.
+            As barras mostram a contribuição de cada país para o comércio exterior,
+            permitindo identificar os parceiros comerciais mais significativos.
+            </small>
+        </div>
+        """
         )
-        
-        fig_secoes.update_layout(
-            xaxis=dict(
-                title="Valor FOB",
-                ticktext=[format_currency(val) for val in tick_values_secoes],
-                tickvals=tick_values_secoes,
-                showgrid=True,
-                gridwidth=1,
-                gridcolor='rgba(128,128,128,0.2)',
-            ),
-            yaxis=dict(
-                title="",
-                tickfont=dict(size=10)
-            ),
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            height=500,
-            margin=dict(l=10, r=120, t=30, b=10),
-            hoverlabel=dict(
-                bgcolor='white',
-                font_color='black',
-                font_size=12
-            )
+    
+    with col2:
+        exibir_ranking(
+            "Top URF por Valor FOB", "Número de URFs a exibir", "n_urf",
+            agregados[('URF',)], 'URF',
+            legenda="""
+        <div style='background-color: rgba(255,255,255,0.1); padding: 10px; border-radius: 5px;'>
+            <small>
+            Este gráfico mostra as principais Unidades da Receita Federal (URFs) por valor FOB.
+            Cada barra representa o volume total de operações processadas por cada URF,
+            auxiliando na identificação dos principais pontos de entrada e saída de mercadorias.
+            </small>
+        </div>
+        """
         )
-        
-        st.plotly_chart(fig_secoes, use_container_width=True)
-        
-        st.markdown("""
+
+    st.markdown("---")
+    exibir_produtos_por_grupo(
+        "Distribuição de Produtos por URF", 'URF', 'URF',
+        ("Número de URFs", "Produtos por URF"), ("n_urf_geo", "n_produtos_urf"),
+        legenda="""
+    <div style='background-color: rgba(255,255,255,0.1); padding: 10px; border-radius: 5px;'>
+        <small>
+        Este gráfico mostra a distribuição dos principais produtos por URF (Unidade da Receita Federal).
+        Cada barra representa uma URF, e as cores diferentes mostram a contribuição de cada produto.
+        Passe o mouse sobre as barras para ver os detalhes.
+        </small>
+    </div>
+    """
+    )
+    
+    st.markdown("---")
+    exibir_comparacao_urf(sorted(agregados[('URF',)]['URF']))
+
+@st.fragment
+def exibir_analise_produto():
+    """Exibe a aba Análise por Produto"""
+    st.subheader("Análise por Produto")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        exibir_ranking(
+            "Top Seções por Valor FOB", "Número de seções a exibir", "n_secoes",
+            agregados[('Desc_Secao',)], 'Desc_Secao',
+            legenda="""
         <div style='background-color: rgba(255,255,255,0.1); padding: 10px; border-radius: 5px;'>
             <small>
             Este gráfico apresenta as principais seções de produtos por valor FOB.
@@ -1153,74 +1027,15 @@ with tab3:
             permitindo uma visão macro da distribuição do comércio exterior por tipo de mercadoria.
             </small>
         </div>
-        """, unsafe_allow_html=True)
+        """,
+            margem_direita=120, tamanho_fonte_eixo=10
+        )
     
     with col2:
-        st.subheader("Top Produtos por Valor FOB")
-        n_produtos = st.selectbox(
-            "Número de produtos a exibir",
-            options=[10, 20, 50, 100],
-            key="n_produtos"
-        )
-        
-        # Top N produtos
-        df_produtos = (df_filtrado.groupby('Desc_SH6')['Valor_FOB']
-                      .sum()
-                      .sort_values(ascending=False)
-                      .head(n_produtos)
-                      .reset_index())
-        
-        df_produtos['Valor_FOB_Format'] = df_produtos['Valor_FOB'].apply(format_currency)
-        
-        # Calcular os valores dos ticks
-        max_valor_produtos = df_produtos['Valor_FOB'].max()
-        tick_values_produtos = [i * max_valor_produtos/5 for i in range(6)]
-        
-        fig_produtos = go.Figure()
-        fig_produtos.add_trace(
-            go.Bar(
-                x=df_produtos['Valor_FOB'],
-                y=df_produtos['Desc_SH6'],
-                orientation='h',
-                text=df_produtos['Valor_FOB_Format'],
-                textposition='outside',
-                marker=dict(
-                    color='rgba(99, 110, 250, 0.8)',
-                    line=dict(color='rgba(99, 110, 250, 1.0)', width=2)
-                ),
-                hovertemplate="<b>%{y}</b><br>" +
-                             "Valor FOB: %{text}<br>" +
-                             "<extra></extra>"
-            )
-        )
-        
-        fig_produtos.update_layout(
-            xaxis=dict(
-                title="Valor FOB",
-                ticktext=[format_currency(val) for val in tick_values_produtos],
-                tickvals=tick_values_produtos,
-                showgrid=True,
-                gridwidth=1,
-                gridcolor='rgba(128,128,128,0.2)',
-            ),
-            yaxis=dict(
-                title="",
-                tickfont=dict(size=10)
-            ),
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            height=500,
-            margin=dict(l=10, r=120, t=30, b=10),
-            hoverlabel=dict(
-                bgcolor='white',
-                font_color='black',
-                font_size=12
-            )
-        )
-        
-        st.plotly_chart(fig_produtos, use_container_width=True)
-        
-        st.markdown("""
+        exibir_ranking(
+            "Top Produtos por Valor FOB", "Número de produtos a exibir", "n_produtos",
+            agregados[('Desc_SH6',)], 'Desc_SH6',
+            legenda="""
         <div style='background-color: rgba(255,255,255,0.1); padding: 10px; border-radius: 5px;'>
             <small>
             Este gráfico mostra os principais produtos específicos (códigos SH6) por valor FOB.
@@ -1228,123 +1043,16 @@ with tab3:
             oferecendo uma visão detalhada das mercadorias mais comercializadas.
             </small>
         </div>
-        """, unsafe_allow_html=True)
+        """,
+            margem_direita=120, tamanho_fonte_eixo=10
+        )
     
     # Adicionar após os gráficos existentes
     st.markdown("---")
-    st.subheader("Contribuição dos Principais Produtos por País")
-    
-    # Controles de seleção
-    col_controls = st.columns([1, 1, 2])
-    
-    with col_controls[0]:
-        n_paises_stacked = st.selectbox(
-            "Número de países",
-            options=[5, 10, 15, 20],
-            key="n_paises_stacked"
-        )
-    
-    with col_controls[1]:
-        n_produtos_stacked = st.selectbox(
-            "Produtos por país",
-            options=[5, 10, 15],
-            index=0,
-            key="n_produtos_stacked"
-        )
-    
-    # Preparar dados para o gráfico
-    top_paises = (df_filtrado.groupby('Países')['Valor_FOB']
-                 .sum()
-                 .sort_values(ascending=True)
-                 .tail(n_paises_stacked)
-                 .index)
-    
-    df_stacked = df_filtrado[df_filtrado['Países'].isin(top_paises)]
-    
-    # Para cada país, pegar os top N produtos
-    dfs_produtos = []
-    for pais in top_paises:
-        df_pais = df_stacked[df_stacked['Países'] == pais]
-        top_produtos = (df_pais.groupby('Desc_SH6')['Valor_FOB']
-                       .sum()
-                       .sort_values(ascending=False)
-                       .head(n_produtos_stacked)
-                       .reset_index())
-        top_produtos['Países'] = pais
-        dfs_produtos.append(top_produtos)
-    
-    df_plot = pd.concat(dfs_produtos)
-    
-    # Calcular os valores dos ticks antes de criar o gráfico
-    max_valor = df_plot['Valor_FOB'].max()
-    tick_values = [i * max_valor/5 for i in range(6)]
-
-    # Criar o gráfico
-    fig_stacked = go.Figure()
-    
-    # Adicionar uma barra para cada produto
-    produtos_unicos = df_plot['Desc_SH6'].unique()
-    
-    for i, produto in enumerate(produtos_unicos):
-        df_produto = df_plot[df_plot['Desc_SH6'] == produto]
-        
-        hover_text = [
-            f"<b>País:</b> {pais}<br>" +
-            f"<b>Produto:</b> {produto}<br>" +
-            f"<b>Valor:</b> {format_currency(valor)}"
-            for pais, valor in zip(df_produto['Países'], df_produto['Valor_FOB'])
-        ]
-        
-        fig_stacked.add_trace(go.Bar(
-            name=produto[:50] + '...' if len(produto) > 50 else produto,
-            y=df_produto['Países'],
-            x=df_produto['Valor_FOB'],
-            orientation='h',
-            hovertext=hover_text,
-            hoverinfo='text',
-            marker_color=MAPA_CORES_PRODUTOS[produto]  # Usar a cor fixa do mapeamento
-        ))
-    
-    # Atualizar o layout
-    fig_stacked.update_layout(
-        barmode='stack',
-        height=max(400, n_paises_stacked * 40),
-        margin=dict(l=20, r=20, t=30, b=20),
-        xaxis=dict(
-            ticktext=[format_currency(val) for val in tick_values],
-            tickvals=tick_values,
-            title="Valor FOB",
-            showgrid=True,
-            gridwidth=1,
-            gridcolor='rgba(128,128,128,0.2)',
-        ),
-        yaxis=dict(
-            title="",
-            categoryorder='total ascending'
-        ),
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=-0.3,
-            xanchor="center",
-            x=0.5,
-            bgcolor='rgba(255, 255, 255, 0.1)'
-        ),
-        showlegend=True,
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        hoverlabel=dict(
-            bgcolor='white',
-            font_color='black',
-            font_size=12
-        )
-    )
-    
-    # Exibir o gráfico
-    st.plotly_chart(fig_stacked, use_container_width=True)
-    
-    # Adicionar legenda explicativa
-    st.markdown("""
+    exibir_produtos_por_grupo(
+        "Contribuição dos Principais Produtos por País", 'Países', 'País',
+        ("Número de países", "Produtos por país"), ("n_paises_stacked", "n_produtos_stacked"),
+        legenda="""
     <div style='background-color: rgba(255,255,255,0.1); padding: 10px; border-radius: 5px;'>
         <small>
         Este gráfico mostra a contribuição dos principais produtos para cada país selecionado.
@@ -1352,36 +1060,70 @@ with tab3:
         Passe o mouse sobre as barras para ver os detalhes.
         </small>
     </div>
-    """, unsafe_allow_html=True)
+    """
+    )
+
+# Trocar de aba reexecuta o script, calculando apenas a aba selecionada
+tab1, tab2, tab3 = st.tabs(ABAS, key="aba_ativa", on_change="rerun")
+
+with tab1:
+    if tab1.open:
+        exibir_analise_temporal()
+
+with tab2:
+    if tab2.open:
+        exibir_analise_geografica()
+
+with tab3:
+    if tab3.open:
+        exibir_analise_produto()
 
 # Modificar a parte do download para Excel
 # Substituir a parte final do código onde está o download
 st.subheader("Dados Detalhados")
-st.dataframe(
-    df_filtrado.sort_values('Valor_FOB', ascending=False),
-    hide_index=True
-)
+exibir_dados_detalhados()
 
-# Download em Excel
-if st.button("Download dos dados filtrados (Excel)"):
-    # Criar um buffer para o arquivo Excel
-    buffer = io.BytesIO()
-    
-    # Criar o arquivo Excel
-    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-        df_filtrado.to_excel(writer, sheet_name='Dados', index=False)
-        
-        # Ajustar as colunas automaticamente
-        worksheet = writer.sheets['Dados']
-        for i, col in enumerate(df_filtrado.columns):
-            column_len = max(df_filtrado[col].astype(str).apply(len).max(), len(col)) + 2
-            worksheet.set_column(i, i, column_len)
-    
-    # Preparar o download
-    buffer.seek(0)
+# Download dos dados filtrados: o arquivo só é gerado quando o botão é clicado,
+# gravado em disco bloco a bloco; o arquivo pronto é servido a partir da memória
+col_formato, col_download = st.columns([1, 3])
+with col_formato:
+    formato = st.selectbox(
+        "Formato do arquivo",
+        options=list(FORMATOS),
+        key="formato_exportacao"
+    )
+extensao, mime = FORMATOS[formato]
+if MODO_SQL:
+    ler_blocos = partial(ler_blocos_sql, dict(filtros))
+else:
+    ler_blocos = partial(blocos_dataframe, df_filtrado)
+with col_download:
     st.download_button(
-        label="Clique para download",
-        data=buffer,
-        file_name="comercio_exterior_filtrado.xlsx",
-        mime="application/vnd.ms-excel"
+        label="Download dos dados filtrados",
+        data=partial(exportar, ler_blocos, extensao),
+        file_name=f"comercio_exterior_filtrado.{extensao}",
+        mime=mime,
+        on_click="ignore"
     )
+
+# Painel de diagnóstico: etapas desta execução (as reexecuções isoladas de um
+# gráfico são gravadas apenas no arquivo de perfil)
+if perfil.ativo:
+    with st.expander("Diagnóstico de desempenho"):
+        st.dataframe(
+            perfil.tabela(),
+            hide_index=True,
+            column_config={
+                'Tempo (ms)': st.column_config.NumberColumn(format="%.1f"),
+                'CPU (ms)': st.column_config.NumberColumn(format="%.1f"),
+                'Memória (MB)': st.column_config.NumberColumn(format="%.2f"),
+            }
+        )
+        st.caption(
+            f"Execução {perfil.execucao} da sessão {perfil.sessao}. "
+            f"Medidas acrescentadas a {perfil.caminho_log.name}; "
+            "o tempo de CPU é o do processo inteiro. "
+            + ("Memória: pico alocado na etapa (tracemalloc)."
+               if perfil.medida_memoria == 'tracemalloc'
+               else "Memória: aumento do pico de memória residente (RSS) do processo na etapa.")
+        )
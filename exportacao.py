@@ -0,0 +1,168 @@
+"""
+Exportação dos dados filtrados em Excel, CSV compactado ou Parquet.
+
+As linhas chegam em blocos (fatias do DataFrame em memória ou leituras do
+SQLite) e são gravadas em um arquivo temporário em disco à medida que chegam,
+de forma que a tabela exportada não precise caber inteira na memória enquanto
+o arquivo é gerado. O arquivo pronto, porém, é lido inteiro para a memória:
+o Streamlit guarda o conteúdo do download em memória antes de servi-lo.
+"""
+import gzip
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+
+# Linhas por bloco na leitura dos dados exportados
+TAMANHO_BLOCO = 100_000
+
+# Linhas de dados por planilha (o Excel aceita 1.048.576 linhas, uma é o cabeçalho)
+LINHAS_POR_PLANILHA = 1_048_575
+
+# Linhas usadas para estimar a largura das colunas do Excel
+LINHAS_AMOSTRA = 1_000
+LARGURA_MAXIMA = 60
+
+# Rótulo -> (extensão do arquivo, tipo MIME)
+FORMATOS = {
+    'Excel (.xlsx)': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'CSV compactado (.csv.gz)': ('csv.gz', 'application/gzip'),
+    'Parquet (.parquet)': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def blocos_dataframe(df, tamanho_bloco=TAMANHO_BLOCO):
+    """Divide um DataFrame em fatias consecutivas, sem copiá-lo"""
+    # Uma seleção vazia ainda gera um bloco, para que o arquivo tenha o cabeçalho
+    for inicio in range(0, max(len(df), 1), tamanho_bloco):
+        yield df.iloc[inicio:inicio + tamanho_bloco]
+
+
+def estimar_larguras(amostra):
+    """
+    Estima a largura de cada coluna do Excel a partir de uma amostra das linhas.
+
+    Args:
+        amostra (pd.DataFrame): Primeiras linhas exportadas
+
+    Returns:
+        list: Largura de cada coluna, na ordem de amostra.columns
+    """
+    larguras = []
+    for coluna in amostra.columns:
+        maior = amostra[coluna].astype(str).str.len().max() if len(amostra) else 0
+        larguras.append(min(max(maior, len(coluna)) + 2, LARGURA_MAXIMA))
+    return larguras
+
+
+def _sem_categorias(bloco):
+    """Converte colunas categóricas em texto, para que todos os blocos tenham os mesmos tipos"""
+    categoricas = {
+        coluna: object for coluna, tipo in bloco.dtypes.items()
+        if isinstance(tipo, pd.CategoricalDtype)
+    }
+    return bloco.astype(categoricas) if categoricas else bloco
+
+
+def _valores_excel(serie):
+    """Valores da coluna como lista, com os nulos dos tipos inteiros anuláveis (pd.NA) como células vazias"""
+    if isinstance(serie.dtype, pd.api.extensions.ExtensionDtype) and serie.hasnans:
+        return serie.astype(object).where(serie.notna(), None).tolist()
+    return serie.tolist()
+
+
+def escrever_excel(blocos, destino):
+    """
+    Grava os blocos em um arquivo Excel no modo de memória constante do xlsxwriter.
+
+    Cada linha é escrita no disco assim que a seguinte começa; quando uma
+    planilha atinge o limite de linhas do Excel, uma nova é criada.
+
+    Args:
+        blocos (iterable): DataFrames com as mesmas colunas
+        destino (file): Arquivo binário aberto para escrita
+    """
+    workbook = xlsxwriter.Workbook(destino, {'constant_memory': True, 'nan_inf_to_errors': True})
+    worksheet = None
+    colunas = larguras = None
+    linha = LINHAS_POR_PLANILHA
+    for bloco in blocos:
+        if colunas is None:
+            colunas = list(bloco.columns)
+            larguras = estimar_larguras(bloco.head(LINHAS_AMOSTRA))
+        valores = zip(*(_valores_excel(bloco[coluna]) for coluna in colunas))
+        for registro in valores:
+            if linha == LINHAS_POR_PLANILHA:
+                numero = len(workbook.worksheets()) + 1
+                worksheet = workbook.add_worksheet('Dados' if numero == 1 else f'Dados {numero}')
+                for i, largura in enumerate(larguras):
+                    worksheet.set_column(i, i, largura)
+                worksheet.write_row(0, 0, colunas)
+                linha = 0
+            linha += 1
+            worksheet.write_row(linha, 0, registro)
+    if worksheet is None:  # Nenhuma linha: planilha apenas com o cabeçalho, se conhecido
+        worksheet = workbook.add_worksheet('Dados')
+        if colunas:
+            worksheet.write_row(0, 0, colunas)
+    workbook.close()
+
+
+def escrever_csv_gz(blocos, destino):
+    """
+    Grava os blocos como CSV compactado com gzip.
+
+    Args:
+        blocos (iterable): DataFrames com as mesmas colunas
+        destino (file): Arquivo binário aberto para escrita
+    """
+    with gzip.open(destino, 'wt', encoding='utf-8', newline='') as arquivo:
+        for i, bloco in enumerate(blocos):
+            bloco.to_csv(arquivo, index=False, header=i == 0)
+
+
+def escrever_parquet(blocos, destino):
+    """
+    Grava os blocos em um arquivo Parquet, um grupo de linhas por bloco.
+
+    Args:
+        blocos (iterable): DataFrames com as mesmas colunas
+        destino (file): Arquivo binário aberto para escrita
+    """
+    escritor = None
+    try:
+        for bloco in blocos:
+            tabela = pa.Table.from_pandas(_sem_categorias(bloco), preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(destino, tabela.schema)
+            escritor.write_table(tabela.cast(escritor.schema))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+ESCRITORES = {
+    'xlsx': escrever_excel,
+    'csv.gz': escrever_csv_gz,
+    'parquet': escrever_parquet,
+}
+
+
+def exportar(ler_blocos, extensao):
+    """
+    Gera o arquivo de exportação em um arquivo temporário em disco e retorna o seu conteúdo.
+
+    Args:
+        ler_blocos (callable): Retorna um iterável com os blocos a exportar;
+            é chamado apenas aqui, de modo que nada é lido antes do download
+        extensao (str): Extensão de um dos FORMATOS
+
+    Returns:
+        bytes: Conteúdo do arquivo gerado, no formato aceito pelo st.download_button
+    """
+    with tempfile.TemporaryFile() as destino:
+        ESCRITORES[extensao](ler_blocos(), destino)
+        destino.seek(0)
+        return destino.read()
@@ -0,0 +1,64 @@
+"""
+Formatação de valores para rótulos, hovers e eixos dos gráficos.
+
+format_currency formata um valor por vez (opções dos filtros da barra
+lateral); as funções formatar_* formatam um array inteiro de uma só vez, sem
+laço em Python, para os rótulos, hovers e réguas dos gráficos.
+"""
+import numpy as np
+
+# Escalas em ordem decrescente, com o sufixo de cada uma
+ESCALAS = (1e9, 1e6, 1e3)
+SUFIXOS = ('B', 'M', 'K')
+
+
+def format_currency(value):
+    """Formata valores monetários em K, M ou B"""
+    suffixes = {1e9: 'B', 1e6: 'M', 1e3: 'K'}
+    for size, suffix in suffixes.items():
+        if value >= size:
+            return f'${value/size:.2f}{suffix}'
+    return f'${value:.0f}'
+
+
+def formatar_sufixos(valores, casas, casas_unidades, prefixo='', absoluto=False):
+    """
+    Formata um array de números com os sufixos K, M e B.
+
+    Args:
+        valores (array-like): Números a formatar
+        casas (int): Casas decimais dos valores com sufixo
+        casas_unidades (int): Casas decimais dos valores abaixo de mil
+        prefixo (str): Texto antes de cada número (ex.: '$')
+        absoluto (bool): Escolher o sufixo pelo valor absoluto (negativos também
+            recebem sufixo)
+
+    Returns:
+        np.ndarray: Textos formatados, na ordem de valores
+    """
+    valores = np.asarray(valores, dtype=float)
+    referencia = np.abs(valores) if absoluto else valores
+    condicoes = [referencia >= escala for escala in ESCALAS]
+    escalas = np.select(condicoes, ESCALAS, 1.0)
+    sufixos = np.select(condicoes, SUFIXOS, '')
+    numeros = np.where(
+        escalas > 1,
+        np.char.mod(f'%.{casas}f', valores / escalas),
+        np.char.mod(f'%.{casas_unidades}f', valores)
+    )
+    return np.char.add(np.char.add(prefixo, numeros), sufixos)
+
+
+def formatar_numeros_grandes(valores):
+    """Formata números com K, M ou B e uma casa decimal (ex.: 1.5K, -3.2M, 999.9)"""
+    return formatar_sufixos(valores, 1, 1, absoluto=True)
+
+
+def formatar_moedas(valores):
+    """Versão vetorizada de format_currency: $ com K, M ou B e duas casas, ou sem casas abaixo de mil"""
+    return formatar_sufixos(valores, 2, 0, prefixo='$')
+
+
+def formatar_ticks_regua(valores):
+    """Formata os valores da régua do mapa: $ com K, M ou B e sempre duas casas decimais"""
+    return formatar_sufixos(valores, 2, 2, prefixo='$')
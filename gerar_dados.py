@@ -0,0 +1,192 @@
+"""
+Gerador de bases sintéticas no formato da tabela comercio_exterior.
+
+Produz um banco SQLite com o mesmo esquema do banco tratado da COMEX STAT,
+no tamanho pedido, para medir o dashboard sem depender dos dados reais. As
+cardinalidades seguem as da base real (cerca de 250 países, 27 UFs, uma
+centena de URFs, 21 seções e alguns milhares de códigos SH6), com a
+concentração típica do comércio exterior: poucos países, URFs e produtos
+respondem pela maior parte das linhas. A mesma semente gera sempre o mesmo
+banco.
+
+Uso:
+    python gerar_dados.py --linhas 10M --saida bench_dados/comex_10m.sqlite
+"""
+import argparse
+import gettext
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+import pycountry
+
+from consultas import COLUNAS_DETALHE, COLUNAS_SQL, TABELA
+
+# Listas em ordem decrescente de participação no comércio exterior
+UFS = [
+    'SP', 'MG', 'RJ', 'PR', 'RS', 'SC', 'MT', 'GO', 'BA', 'PA', 'ES', 'MS', 'AM', 'PE',
+    'CE', 'MA', 'DF', 'TO', 'RO', 'AL', 'PI', 'SE', 'RN', 'PB', 'AP', 'RR', 'AC'
+]
+
+PRINCIPAIS_PARCEIROS = [
+    'China', 'Estados Unidos', 'Argentina', 'Países Baixos', 'Alemanha', 'Chile',
+    'México', 'Japão', 'Índia', 'Espanha', 'Coreia, República da', 'Itália'
+]
+
+VIAS = [
+    'MARITIMA', 'AEREA', 'RODOVIARIA', 'FERROVIARIA', 'FLUVIAL', 'DUTOS',
+    'POSTAL', 'MEIOS PROPRIOS', 'ENTRADA/SAIDA FICTA', 'LACUSTRE'
+]
+
+ROMANOS = [
+    'I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X', 'XI',
+    'XII', 'XIII', 'XIV', 'XV', 'XVI', 'XVII', 'XVIII', 'XIX', 'XX', 'XXI'
+]
+
+# Palavras combinadas nas descrições longas de seções e produtos
+PALAVRAS = [
+    'animais', 'vivos', 'produtos', 'origem', 'vegetal', 'minerais', 'químicos',
+    'plásticos', 'borracha', 'couros', 'madeira', 'papel', 'têxteis', 'calçados',
+    'pedra', 'vidro', 'metais', 'comuns', 'máquinas', 'aparelhos', 'elétricos',
+    'veículos', 'instrumentos', 'óptica', 'armas', 'obras', 'arte', 'preparações',
+    'partes', 'acessórios', 'suas', 'outros', 'semelhantes', 'brutos', 'refinados'
+]
+
+TIPOS_SQL = {'Ano': 'INTEGER', 'Valor_FOB': 'REAL'}
+
+
+def ler_quantidade(texto):
+    """Converte quantidades como '500000', '1M' ou '2.5M' em inteiros"""
+    multiplicadores = {'K': 1_000, 'M': 1_000_000}
+    sufixo = texto[-1].upper()
+    if sufixo in multiplicadores:
+        return int(float(texto[:-1]) * multiplicadores[sufixo])
+    return int(texto)
+
+
+def pesos_zipf(n, expoente):
+    """Probabilidades decrescentes (lei de Zipf) para n valores em ordem de participação"""
+    pesos = 1 / np.arange(1, n + 1) ** expoente
+    return pesos / pesos.sum()
+
+
+def descricao(rng, prefixo, n_palavras):
+    """Descrição longa e determinística a partir da lista de palavras"""
+    return f"{prefixo} - " + " ".join(rng.choice(PALAVRAS, size=n_palavras))
+
+
+def tabelas_dimensao(rng, n_sh6, n_urf):
+    """
+    Sorteia os valores de cada dimensão e as probabilidades de cada valor.
+
+    Args:
+        rng (np.random.Generator): Gerador de números aleatórios
+        n_sh6 (int): Número de códigos SH6
+        n_urf (int): Número de URFs
+
+    Returns:
+        dict: Dimensão -> (np.ndarray de valores, np.ndarray de probabilidades);
+            'secao_do_sh6' traz a seção (posição) de cada SH6
+    """
+    traducao = gettext.translation('iso3166-1', pycountry.LOCALES_DIR, languages=['pt_BR'], fallback=True)
+    nomes = sorted(traducao.gettext(pais.name) for pais in pycountry.countries)
+    principais = [nome for nome in PRINCIPAIS_PARCEIROS if nome in nomes]
+    demais = [nome for nome in nomes if nome not in principais]
+    paises = np.array(principais + list(rng.permutation(demais)), dtype=object)
+    urfs = rng.permutation(np.array([f"URF {i:03d}" for i in range(1, n_urf + 1)], dtype=object))
+    secoes = [(f"{romano}", descricao(rng, f"Seção {romano}", 8)) for romano in ROMANOS]
+    codigos_sh6 = rng.choice(np.arange(10_000, 1_000_000), size=n_sh6, replace=False)
+    sh6 = [(f"{codigo:06d}", descricao(rng, f"Produto {codigo:06d}", 14)) for codigo in codigos_sh6]
+    return {
+        'Países': (paises, pesos_zipf(len(paises), 1.2)),
+        'UF': (np.array(UFS, dtype=object), pesos_zipf(len(UFS), 1.0)),
+        'URF': (urfs, pesos_zipf(len(urfs), 1.1)),
+        'Via': (np.array(VIAS, dtype=object), pesos_zipf(len(VIAS), 2.0)),
+        'Secao': (np.array(secoes, dtype=object), None),
+        'SH6': (np.array(sh6, dtype=object), pesos_zipf(len(sh6), 1.05)),
+        'secao_do_sh6': rng.integers(0, len(secoes), size=len(sh6)),
+    }
+
+
+def gerar_bloco(rng, dimensoes, n, anos):
+    """
+    Gera n linhas como colunas na ordem de COLUNAS_DETALHE.
+
+    Returns:
+        list: Uma lista Python por coluna
+    """
+    def sortear(nome):
+        valores, pesos = dimensoes[nome]
+        return valores[rng.choice(len(valores), size=n, p=pesos)]
+
+    posicao_sh6 = rng.choice(len(dimensoes['SH6'][0]), size=n, p=dimensoes['SH6'][1])
+    sh6 = dimensoes['SH6'][0][posicao_sh6]
+    secao = dimensoes['Secao'][0][dimensoes['secao_do_sh6'][posicao_sh6]]
+    colunas = {
+        'Fluxo': np.where(rng.random(n) < 0.45, 'Exportação', 'Importação').astype(object),
+        'Ano': rng.choice(np.asarray(anos), size=n),
+        'Países': sortear('Países'),
+        'UF': sortear('UF'),
+        'URF': sortear('URF'),
+        'Cod_Secao': secao[:, 0],
+        'Desc_Secao': secao[:, 1],
+        'Via': sortear('Via'),
+        'Cod_SH6': sh6[:, 0],
+        'Desc_SH6': sh6[:, 1],
+        'Valor_FOB': np.round(rng.lognormal(mean=10, sigma=2.5, size=n), 2),
+    }
+    return [colunas[coluna].tolist() for coluna in COLUNAS_DETALHE]
+
+
+def gerar_banco(caminho, linhas, semente=42, n_sh6=5_000, n_urf=120, anos=range(2015, 2025),
+                tamanho_bloco=500_000):
+    """
+    Grava um banco sintético com a tabela comercio_exterior.
+
+    Args:
+        caminho (Path): Arquivo a criar (substituído se existir)
+        linhas (int): Número de linhas da tabela
+        semente (int): Semente do gerador; a mesma semente gera o mesmo banco
+        n_sh6 (int): Número de códigos SH6 distintos
+        n_urf (int): Número de URFs distintas
+        anos (iterable): Anos sorteados
+        tamanho_bloco (int): Linhas geradas e inseridas por vez
+    """
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    caminho.unlink(missing_ok=True)
+    rng = np.random.default_rng(semente)
+    dimensoes = tabelas_dimensao(rng, n_sh6, n_urf)
+    definicao = ", ".join(f"{COLUNAS_SQL[coluna]} {TIPOS_SQL.get(coluna, 'TEXT')}" for coluna in COLUNAS_DETALHE)
+    marcadores = ", ".join("?" * len(COLUNAS_DETALHE))
+    with closing(sqlite3.connect(caminho)) as conn:
+        # Sem diário nem sincronização: o arquivo é descartável até o fim da geração
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(f"CREATE TABLE {TABELA} ({definicao})")
+        for inicio in range(0, linhas, tamanho_bloco):
+            colunas = gerar_bloco(rng, dimensoes, min(tamanho_bloco, linhas - inicio), anos)
+            conn.executemany(f"INSERT INTO {TABELA} VALUES ({marcadores})", zip(*colunas))
+            conn.commit()
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Gera um banco sintético no formato da COMEX STAT")
+    parser.add_argument('--linhas', type=ler_quantidade, default=ler_quantidade('1M'),
+                        help="Número de linhas (aceita sufixos K e M; padrão: 1M)")
+    parser.add_argument('--saida', type=Path, default=Path("comercio_exterior_sintetico.sqlite"),
+                        help="Arquivo SQLite a criar")
+    parser.add_argument('--semente', type=int, default=42, help="Semente do gerador")
+    parser.add_argument('--sh6', type=int, default=5_000, help="Número de códigos SH6 distintos")
+    parser.add_argument('--urf', type=int, default=120, help="Número de URFs distintas")
+    args = parser.parse_args(argumentos)
+
+    inicio = time.perf_counter()
+    gerar_banco(args.saida, args.linhas, args.semente, args.sh6, args.urf)
+    print(f"{args.linhas:,} linhas gravadas em {args.saida} ({time.perf_counter() - inicio:.1f} s)")
+
+
+if __name__ == '__main__':
+    main()
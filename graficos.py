@@ -0,0 +1,425 @@
+"""
+Montagem das figuras Plotly do dashboard.
+
+Cada função recebe apenas o resultado agregado que o gráfico exibe e os
+parâmetros dos controles, de forma que o dashboard possa guardar as figuras
+em cache pelo hash desses dados.
+"""
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from formatacao import formatar_moedas, formatar_numeros_grandes, formatar_ticks_regua
+
+# Cores fixas das linhas do gráfico temporal
+CORES_FLUXO = {'Exportação': '#636EFA', 'Importação': '#EF553B'}
+
+HOVERLABEL = dict(
+    bgcolor='white',
+    font_color='black',
+    font_size=12
+)
+
+
+def figura_temporal(df_temporal):
+    """
+    Gráfico de linhas da evolução do Valor FOB por ano e fluxo.
+
+    Args:
+        df_temporal (pd.DataFrame): Colunas Ano, Fluxo e Valor_FOB
+
+    Returns:
+        go.Figure: Figura pronta para exibição
+    """
+    df_temporal = df_temporal.copy()
+
+    # Calcular o valor formatado para o hover
+    df_temporal['Valor_FOB_Format'] = formatar_numeros_grandes(df_temporal['Valor_FOB'])
+
+    # Calcular os valores min e max para o eixo Y
+    y_min = df_temporal['Valor_FOB'].min()
+    y_max = df_temporal['Valor_FOB'].max()
+    y_range = y_max - y_min
+
+    # Criar valores para o eixo Y (6 pontos igualmente espaçados)
+    y_ticks = [y_min + (y_range * i / 5) for i in range(6)]
+    y_tick_texts = formatar_numeros_grandes(y_ticks).tolist()
+
+    fig_temporal = px.line(
+        df_temporal,
+        x='Ano',
+        y='Valor_FOB',
+        color='Fluxo',
+        title="Evolução do Valor FOB por Ano e Fluxo",
+        template='plotly_dark',
+        labels={'Valor_FOB': 'Valor FOB', 'Ano': 'Ano', 'Fluxo': 'Fluxo'}
+    )
+
+    # Limpar os traces automáticos
+    fig_temporal.data = []
+
+    # Personalizar o layout
+    fig_temporal.update_layout(
+        height=500,
+        hovermode='x unified',
+        legend=dict(
+            yanchor="top",
+            y=0.99,
+            xanchor="left",
+            x=0.01,
+            bgcolor='rgba(0,0,0,0.3)'
+        ),
+        yaxis=dict(
+            ticktext=y_tick_texts,  # Usar os textos pré-calculados
+            tickvals=y_ticks,       # Usar os valores pré-calculados
+            gridcolor='rgba(128,128,128,0.2)',
+            title_font=dict(size=14),
+            tickfont=dict(size=12)
+        ),
+        xaxis=dict(
+            gridcolor='rgba(128,128,128,0.2)',
+            title_font=dict(size=14),
+            tickfont=dict(size=12),
+            dtick=1
+        ),
+        title=dict(
+            font=dict(size=16),
+            y=0.95
+        ),
+        margin=dict(l=60, r=30, t=50, b=50)
+    )
+
+    for fluxo in df_temporal['Fluxo'].unique():
+        df_fluxo = df_temporal[df_temporal['Fluxo'] == fluxo]
+
+        fig_temporal.add_trace(
+            go.Scatter(
+                x=df_fluxo['Ano'],
+                y=df_fluxo['Valor_FOB'],
+                name=fluxo,
+                mode='lines+markers',
+                line=dict(width=3, color=CORES_FLUXO[fluxo]),
+                marker=dict(size=8, color=CORES_FLUXO[fluxo]),
+                hovertemplate="<b>Ano: %{x}</b><br>" +
+                             f"{fluxo}: %{{text}}<br>" +
+                             "<extra></extra>",
+                text=df_fluxo['Valor_FOB_Format']
+            )
+        )
+
+        # Adicionar rótulo no ponto final
+        ultimo_valor = df_fluxo.iloc[-1]
+        fig_temporal.add_annotation(
+            x=ultimo_valor['Ano'],
+            y=ultimo_valor['Valor_FOB'],
+            text=ultimo_valor['Valor_FOB_Format'],
+            showarrow=True,
+            arrowhead=0,
+            ax=40,
+            ay=-40 if fluxo == 'Exportação' else 40,
+            font=dict(size=12),
+            bgcolor='rgba(0,0,0,0.5)',
+            bordercolor='rgba(255,255,255,0.3)',
+            borderwidth=1,
+            borderpad=4
+        )
+
+    return fig_temporal
+
+
+def figura_mapa(df_mapa):
+    """
+    Mapa coroplético do Valor FOB por país.
+
+    Args:
+        df_mapa (pd.DataFrame): Colunas Países, ISO3 (código ISO-3 do país) e
+            Valor_FOB
+
+    Returns:
+        go.Figure: Figura pronta para exibição
+    """
+    df_mapa = df_mapa.copy()
+    df_mapa['Valor_FOB_Format'] = formatar_moedas(df_mapa['Valor_FOB'])
+
+    fig_mapa = px.choropleth(
+        df_mapa,
+        locations='ISO3',
+        locationmode='ISO-3',
+        color='Valor_FOB',
+        hover_name='Países',
+        hover_data={
+            'ISO3': False,
+            'Valor_FOB': False,
+            'Valor_FOB_Format': True
+        },
+        color_continuous_scale='RdBu',
+        template='plotly_dark'
+    )
+
+    # Configurar o hover template
+    fig_mapa.update_traces(
+        hovertemplate="<b>%{hovertext}</b><br>" +
+                     "Valor FOB: %{customdata[0]}<br>" +
+                     "<extra></extra>",
+        customdata=df_mapa[['Valor_FOB_Format']]
+    )
+
+    # Calcular os valores dos ticks da régua
+    max_valor = df_mapa['Valor_FOB'].max()
+    tick_values = [i * max_valor/4 for i in range(5)]  # 5 pontos na régua
+
+    # Configurar layout do mapa
+    fig_mapa.update_layout(
+        geo=dict(
+            showframe=True,
+            showcoastlines=True,
+            projection_type='natural earth',
+            coastlinecolor='Gray',
+            countrycolor='Gray',
+            showland=True,
+            landcolor='rgba(50, 50, 50, 0.8)',
+            showocean=True,
+            oceancolor='rgba(30, 30, 30, 0.8)',
+            showcountries=True,
+            bgcolor='rgba(0,0,0,0)'
+        ),
+        height=600,
+        margin=dict(l=0, r=0, t=30, b=0),
+        paper_bgcolor='rgba(0,0,0,0)',
+        coloraxis_colorbar=dict(
+            title='Valor FOB',
+            ticktext=formatar_ticks_regua(tick_values).tolist(),
+            tickvals=tick_values,
+            len=0.8,
+            thickness=20,
+            tickfont=dict(size=12)
+        )
+    )
+
+    return fig_mapa
+
+
+def figura_barras(df, coluna, margem_direita=10, tamanho_fonte_eixo=None):
+    """
+    Barras horizontais com os maiores valores FOB de uma dimensão.
+
+    Args:
+        df (pd.DataFrame): Colunas coluna e Valor_FOB, já ordenadas e cortadas
+        coluna (str): Dimensão exibida no eixo Y (ex.: 'Países')
+        margem_direita (int): Margem para os rótulos de texto fora das barras
+        tamanho_fonte_eixo (int, optional): Tamanho da fonte dos nomes no eixo Y
+
+    Returns:
+        go.Figure: Figura pronta para exibição
+    """
+    # Calcular os valores dos ticks
+    max_valor = df['Valor_FOB'].max()
+    tick_values = [i * max_valor/5 for i in range(6)]
+
+    fig = go.Figure()
+    fig.add_trace(
+        go.Bar(
+            x=df['Valor_FOB'],
+            y=df[coluna],
+            orientation='h',
+            text=formatar_moedas(df['Valor_FOB']),
+            textposition='outside',
+            marker=dict(
+                color='rgba(99, 110, 250, 0.8)',
+                line=dict(color='rgba(99, 110, 250, 1.0)', width=2)
+            ),
+            hovertemplate="<b>%{y}</b><br>" +
+                         "Valor FOB: %{text}<br>" +
+                         "<extra></extra>"
+        )
+    )
+
+    yaxis = dict(title="")
+    if tamanho_fonte_eixo is not None:
+        yaxis['tickfont'] = dict(size=tamanho_fonte_eixo)
+
+    fig.update_layout(
+        template='plotly_dark',
+        xaxis=dict(
+            title="Valor FOB",
+            ticktext=formatar_moedas(tick_values).tolist(),
+            tickvals=tick_values,
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='rgba(128,128,128,0.2)',
+        ),
+        yaxis=yaxis,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        height=500,
+        margin=dict(l=10, r=margem_direita, t=30, b=10),
+        hoverlabel=HOVERLABEL
+    )
+
+    return fig
+
+
+def figura_empilhada(df_plot, grupo, rotulo_grupo, n_grupos, mapa_cores):
+    """
+    Barras empilhadas com os principais produtos de cada grupo.
+
+    Args:
+        df_plot (pd.DataFrame): Colunas grupo, Desc_SH6 e Valor_FOB
+        grupo (str): Coluna das barras (ex.: 'Países' ou 'URF')
+        rotulo_grupo (str): Nome do grupo exibido no hover (ex.: 'País')
+        n_grupos (int): Número de grupos exibidos, usado na altura do gráfico
+        mapa_cores (dict): Produto -> cor fixa
+
+    Returns:
+        go.Figure: Figura pronta para exibição
+    """
+    # Calcular os valores dos ticks antes de criar o gráfico
+    max_valor = df_plot['Valor_FOB'].max()
+    tick_values = [i * max_valor/5 for i in range(6)]
+
+    fig = go.Figure()
+
+    # Valores formatados de uma só vez; o grupo e o produto entram pelo hovertemplate
+    df_plot = df_plot.assign(Valor_FOB_Format=formatar_moedas(df_plot['Valor_FOB']))
+
+    # Adicionar uma barra para cada produto, na ordem em que aparecem
+    for produto, df_produto in df_plot.groupby('Desc_SH6', sort=False, observed=True):
+        fig.add_trace(go.Bar(
+            name=produto[:50] + '...' if len(produto) > 50 else produto,
+            y=df_produto[grupo],
+            x=df_produto['Valor_FOB'],
+            orientation='h',
+            customdata=df_produto['Valor_FOB_Format'],
+            hovertemplate=f"<b>{rotulo_grupo}:</b> %{{y}}<br>" +
+                          f"<b>Produto:</b> {produto}<br>" +
+                          "<b>Valor:</b> %{customdata}" +
+                          "<extra></extra>",
+            marker_color=mapa_cores[produto]  # Usar a cor fixa do mapeamento
+        ))
+
+    # Atualizar o layout
+    fig.update_layout(
+        template='plotly_dark',
+        barmode='stack',
+        height=max(400, n_grupos * 40),
+        margin=dict(l=20, r=20, t=30, b=20),
+        xaxis=dict(
+            ticktext=formatar_moedas(tick_values).tolist(),
+            tickvals=tick_values,
+            title="Valor FOB",
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='rgba(128,128,128,0.2)',
+        ),
+        yaxis=dict(
+            title="",
+            categoryorder='total ascending'
+        ),
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=-0.3,
+            xanchor="center",
+            x=0.5,
+            bgcolor='rgba(255, 255, 255, 0.1)'
+        ),
+        showlegend=True,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        hoverlabel=HOVERLABEL
+    )
+
+    return fig
+
+
+def figura_comparacao(df_comparacao, urf_1, urf_2):
+    """
+    Dispersão dos valores FOB dos produtos comuns a duas URFs.
+
+    Args:
+        df_comparacao (pd.DataFrame): Colunas Produto, Valor_URF1, Valor_URF2
+            e Diferenca_Percentual
+        urf_1 (str): URF do eixo X
+        urf_2 (str): URF do eixo Y
+
+    Returns:
+        go.Figure: Figura pronta para exibição
+    """
+    fig_comparacao = go.Figure()
+
+    # Adicionar linha diagonal de referência
+    max_valor = max(df_comparacao['Valor_URF1'].max(), df_comparacao['Valor_URF2'].max())
+    fig_comparacao.add_trace(go.Scatter(
+        x=[0, max_valor],
+        y=[0, max_valor],
+        mode='lines',
+        name='Linha de Igualdade',
+        line=dict(dash='dash', color='gray'),
+        hoverinfo='skip'
+    ))
+
+    # Adicionar os pontos: os textos do hover são montados pelo hovertemplate
+    # a partir das colunas formatadas de uma só vez
+    dados_hover = np.column_stack([
+        df_comparacao['Produto'].astype(str),
+        formatar_moedas(df_comparacao['Valor_URF1']),
+        formatar_moedas(df_comparacao['Valor_URF2']),
+        np.char.mod('%.1f', df_comparacao['Diferenca_Percentual'].to_numpy(dtype=float))
+    ])
+
+    fig_comparacao.add_trace(go.Scatter(
+        x=df_comparacao['Valor_URF1'],
+        y=df_comparacao['Valor_URF2'],
+        mode='markers',
+        name='Produtos',
+        marker=dict(
+            size=10,
+            color=df_comparacao['Diferenca_Percentual'],
+            colorscale='RdBu',
+            colorbar=dict(
+                title='Diferença %',
+                ticksuffix='%'
+            ),
+            showscale=True
+        ),
+        customdata=dados_hover,
+        hovertemplate="<b>Produto:</b> %{customdata[0]}<br>" +
+                      f"<b>{urf_1}:</b> %{{customdata[1]}}<br>" +
+                      f"<b>{urf_2}:</b> %{{customdata[2]}}<br>" +
+                      "<b>Diferença:</b> %{customdata[3]}%" +
+                      "<extra></extra>"
+    ))
+
+    # Atualizar layout
+    fig_comparacao.update_layout(
+        template='plotly_dark',
+        title=f"Comparação de Valores FOB entre {urf_1} e {urf_2}",
+        xaxis=dict(
+            title=f"Valor FOB - {urf_1}",
+            type='log',
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='rgba(128,128,128,0.2)',
+        ),
+        yaxis=dict(
+            title=f"Valor FOB - {urf_2}",
+            type='log',
+            showgrid=True,
+            gridwidth=1,
+            gridcolor='rgba(128,128,128,0.2)',
+        ),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        height=600,
+        showlegend=True,
+        legend=dict(
+            yanchor="top",
+            y=0.99,
+            xanchor="left",
+            x=0.01,
+            bgcolor='rgba(255,255,255,0.1)'
+        ),
+        hoverlabel=HOVERLABEL
+    )
+
+    return fig_comparacao
@@ -0,0 +1,159 @@
+"""
+Índice invertido das colunas de filtro.
+
+Para cada coluna, as posições das linhas são ordenadas pelo código do valor,
+de forma que as linhas de um valor formam uma fatia contígua e já ordenada.
+Um filtro vira a união das fatias dos valores selecionados em cada coluna e
+a interseção entre as colunas, sem percorrer a tabela inteira.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# posicoes: valor -> código; linhas: posições ordenadas por código;
+# limites: início de cada código em linhas (com o total no final)
+IndiceColuna = namedtuple('IndiceColuna', ['posicoes', 'linhas', 'limites'])
+
+
+def _codificar(serie):
+    """Retorna os códigos inteiros da coluna e a lista de valores correspondente"""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), serie.cat.categories
+    codigos, valores = pd.factorize(serie, sort=True)
+    return codigos, valores
+
+
+def construir_indice(df, colunas):
+    """
+    Cria o índice invertido das colunas de filtro.
+
+    Args:
+        df (pd.DataFrame): Tabela completa carregada em memória
+        colunas (list): Colunas a indexar
+
+    Returns:
+        dict: Coluna -> IndiceColuna
+    """
+    indice = {}
+    for coluna in colunas:
+        codigos, valores = _codificar(df[coluna])
+        # Ordenação estável: dentro de cada valor as posições ficam crescentes
+        ordem = np.argsort(codigos, kind='stable').astype(np.int32)
+        validos = codigos[codigos >= 0]  # -1 indica valor nulo
+        contagens = np.bincount(validos, minlength=len(valores))
+        limites = np.concatenate(([0], np.cumsum(contagens))) + (len(codigos) - len(validos))
+        indice[coluna] = IndiceColuna(
+            posicoes={valor: i for i, valor in enumerate(valores)},
+            linhas=ordem,
+            limites=limites
+        )
+    return indice
+
+
+def _linhas_coluna(indice_coluna, valores):
+    """União das posições das linhas que têm algum dos valores selecionados"""
+    # Valores repetidos (ex.: a mesma URF nos dois lados da comparação) contam uma vez só
+    codigos = {indice_coluna.posicoes.get(valor) for valor in valores} - {None}
+    fatias = [
+        indice_coluna.linhas[indice_coluna.limites[codigo]:indice_coluna.limites[codigo + 1]]
+        for codigo in sorted(codigos)
+    ]
+    if not fatias:
+        return np.empty(0, dtype=np.int32)
+    if len(fatias) == 1:
+        return fatias[0]
+    return np.sort(np.concatenate(fatias))
+
+
+def primeiras_linhas(indice_coluna, valores):
+    """
+    Posição da primeira linha de cada valor, sem percorrer a tabela.
+
+    Args:
+        indice_coluna (IndiceColuna): Índice de uma coluna
+        valores (iterable): Valores procurados
+
+    Returns:
+        dict: Valor -> posição da primeira linha com o valor (valores sem
+            linhas ficam de fora)
+    """
+    primeiras = {}
+    for valor in valores:
+        codigo = indice_coluna.posicoes.get(valor)
+        if codigo is not None and indice_coluna.limites[codigo] < indice_coluna.limites[codigo + 1]:
+            primeiras[valor] = int(indice_coluna.linhas[indice_coluna.limites[codigo]])
+    return primeiras
+
+
+def filtrar_linhas(indice, filtros):
+    """
+    Calcula as posições das linhas que atendem a todos os filtros.
+
+    Args:
+        indice (dict): Índice criado por construir_indice
+        filtros (dict): Dicionário com colunas e valores para filtrar
+
+    Returns:
+        np.ndarray | None: Posições em ordem crescente, ou None se não houver
+            filtros ativos (todas as linhas)
+    """
+    conjuntos = [
+        _linhas_coluna(indice[coluna], valores)
+        for coluna, valores in filtros.items() if valores
+    ]
+    if not conjuntos:
+        return None
+    # Interseção começando pelos menores conjuntos
+    conjuntos.sort(key=len)
+    linhas = conjuntos[0]
+    for outras in conjuntos[1:]:
+        if len(linhas) == 0:
+            break
+        linhas = np.intersect1d(linhas, outras, assume_unique=True)
+    return linhas
+
+
+def atualizar_indice(indice, df, inicio):
+    """
+    Acrescenta ao índice as linhas adicionadas ao final da tabela.
+
+    As posições novas são maiores que todas as antigas, então basta inseri-las
+    no fim da fatia de cada valor. Como as categorias são mantidas em ordem
+    alfabética, a ordem relativa dos valores antigos não muda quando surgem
+    valores novos.
+
+    Args:
+        indice (dict): Índice de df.iloc[:inicio]
+        df (pd.DataFrame): Tabela completa já com as novas linhas
+        inicio (int): Posição da primeira linha nova
+
+    Returns:
+        dict: Novo índice (o recebido não é alterado)
+    """
+    atualizado = {}
+    for coluna, antigo in indice.items():
+        codigos, valores = _codificar(df[coluna])
+        novos = codigos[inicio:]
+        ordem_novas = (inicio + np.argsort(novos, kind='stable')).astype(np.int32)
+
+        # Quantidade de linhas antigas de cada valor, já nos códigos novos
+        contagens_antigas = np.zeros(len(valores), dtype=np.int64)
+        contagens_antigas[valores.get_indexer(list(antigo.posicoes))] = np.diff(antigo.limites)
+        nulos_antigos = antigo.limites[0]
+        fim_antigas = nulos_antigos + np.cumsum(contagens_antigas)
+
+        # Cada linha nova entra no fim da fatia do seu valor (nulos no início)
+        novos_ordenados = novos[ordem_novas - inicio]
+        pontos = np.where(novos_ordenados >= 0, fim_antigas[novos_ordenados], nulos_antigos)
+        linhas = np.insert(antigo.linhas, pontos, ordem_novas)
+
+        validos = novos[novos >= 0]
+        contagens = contagens_antigas + np.bincount(validos, minlength=len(valores))
+        nulos = nulos_antigos + (len(novos) - len(validos))
+        atualizado[coluna] = IndiceColuna(
+            posicoes={valor: i for i, valor in enumerate(valores)},
+            linhas=linhas,
+            limites=np.concatenate(([0], np.cumsum(contagens))) + nulos
+        )
+    return atualizado
@@ -0,0 +1,152 @@
+"""
+Manutenção do banco SQLite usado pelo dashboard.
+
+Cria índices de cobertura para as dimensões dos filtros (cada dimensão
+seguida de Ano, Fluxo e Valor FOB), atualiza as estatísticas do otimizador
+com ANALYZE e compara o plano e o tempo das consultas que o dashboard envia
+no modo SQL antes e depois.
+
+Uso:
+    python manutencao_db.py [--banco CAMINHO] [--apenas-relatorio]
+"""
+import argparse
+import time
+from pathlib import Path
+
+from agregacoes import DIMENSOES_COMUNS, DIMENSOES_FILTRO
+from consultas import COLUNAS_SQL, TABELA, conectar, query_agregado
+
+# Nome do índice -> colunas (nomes do dashboard); Valor_FOB no final torna o
+# índice suficiente para filtrar, agrupar por Ano e Fluxo e somar sem ler a tabela
+INDICES_COBERTURA = {
+    'ano': ['Ano', 'Fluxo', 'Valor_FOB'],
+    'fluxo': ['Fluxo', 'Ano', 'Valor_FOB'],
+    'paises': ['Países', 'Ano', 'Fluxo', 'Valor_FOB'],
+    'uf': ['UF', 'Ano', 'Fluxo', 'Valor_FOB'],
+    'urf': ['URF', 'Ano', 'Fluxo', 'Valor_FOB'],
+    'secao': ['Desc_Secao', 'Ano', 'Fluxo', 'Valor_FOB'],
+    'sh6': ['Desc_SH6', 'Ano', 'Fluxo', 'Valor_FOB'],
+}
+
+
+def listar_indices(conn):
+    """Retorna o nome e as colunas de cada índice da tabela"""
+    indices = {}
+    for _, nome, *_ in conn.execute(f"PRAGMA index_list({TABELA})").fetchall():
+        indices[nome] = [coluna for _, _, coluna in conn.execute(f'PRAGMA index_info("{nome}")')]
+    return indices
+
+
+def criar_indices(conn):
+    """
+    Cria os índices de cobertura que ainda não existem.
+
+    Args:
+        conn (sqlite3.Connection): Conexão com o banco
+
+    Returns:
+        list: Nomes dos índices criados
+    """
+    existentes = listar_indices(conn)
+    criados = []
+    for sufixo, colunas in INDICES_COBERTURA.items():
+        nome = f"idx_{TABELA}_{sufixo}"
+        if nome in existentes:
+            continue
+        lista = ", ".join(COLUNAS_SQL[coluna] for coluna in colunas)
+        conn.execute(f"CREATE INDEX {nome} ON {TABELA} ({lista})")
+        criados.append(nome)
+    return criados
+
+
+def consultas_representativas(conn):
+    """
+    Consultas que o dashboard envia no modo SQL.
+
+    Para cada dimensão dos filtros: a soma por Ano e Fluxo filtrada por um
+    valor da dimensão (evolução temporal e métricas) e a soma pela própria
+    dimensão, sem filtros (rankings e opções dos filtros).
+
+    Yields:
+        tuple: Descrição, texto da consulta e parâmetros
+    """
+    for coluna in DIMENSOES_FILTRO:
+        col = COLUNAS_SQL[coluna]
+        (valor,) = conn.execute(f"SELECT MIN({col}) FROM {TABELA}").fetchone()
+        if valor is not None:
+            yield (f"Ano, Fluxo | {coluna} = {valor}",
+                   *query_agregado(list(DIMENSOES_COMUNS), {coluna: [valor]}))
+        yield f"{coluna} | sem filtros", *query_agregado([coluna], {})
+
+
+def medir(conn, query, parametros):
+    """
+    Retorna o plano de execução e o tempo de uma consulta.
+
+    Returns:
+        tuple: Passos do EXPLAIN QUERY PLAN separados por '; ' e tempo em ms
+    """
+    plano = "; ".join(
+        detalhe for *_, detalhe in conn.execute(f"EXPLAIN QUERY PLAN {query}", parametros)
+    )
+    inicio = time.perf_counter()
+    conn.execute(query, parametros).fetchall()
+    return plano, (time.perf_counter() - inicio) * 1000
+
+
+def medir_todas(conn):
+    """Mede cada consulta representativa; retorna descrição -> (plano, tempo em ms)"""
+    return {
+        descricao: medir(conn, query, parametros)
+        for descricao, query, parametros in consultas_representativas(conn)
+    }
+
+
+def imprimir_relatorio(antes, depois):
+    """Imprime o plano e o tempo de cada consulta antes e depois da manutenção"""
+    for descricao, (plano_depois, tempo_depois) in depois.items():
+        print(f"\n{descricao}")
+        if antes is not None:
+            plano_antes, tempo_antes = antes[descricao]
+            print(f"  antes:  {plano_antes} ({tempo_antes:.1f} ms)")
+        print(f"  depois: {plano_depois} ({tempo_depois:.1f} ms)")
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Índices e estatísticas do banco do dashboard")
+    parser.add_argument(
+        '--banco', type=Path, default=Path(__file__).parent / "comercio_exterior.sqlite",
+        help="Caminho do banco SQLite (padrão: comercio_exterior.sqlite ao lado do script)"
+    )
+    parser.add_argument(
+        '--apenas-relatorio', action='store_true',
+        help="Apenas lista os índices e os planos atuais, sem alterar o banco"
+    )
+    args = parser.parse_args(argumentos)
+
+    if not args.banco.exists():
+        parser.error(f"Banco de dados não encontrado: {args.banco}")
+
+    with conectar(args.banco) as conn:
+        print("Índices existentes:")
+        for nome, colunas in listar_indices(conn).items():
+            print(f"  {nome}: {', '.join(colunas)}")
+
+        if args.apenas_relatorio:
+            imprimir_relatorio(None, medir_todas(conn))
+            return
+
+        antes = medir_todas(conn)
+        # O módulo sqlite3 não abre transação antes de DDL: sem o BEGIN explícito
+        # cada CREATE e o ANALYZE seriam gravados isoladamente. Assim o bloco é
+        # uma única transação, desfeita por inteiro se algo falhar
+        with conn:
+            conn.execute("BEGIN")
+            criados = criar_indices(conn)
+            conn.execute("ANALYZE")
+        print(f"Índices criados: {', '.join(criados) if criados else 'nenhum'}")
+        imprimir_relatorio(antes, medir_todas(conn))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Paginação, ordenação e busca da tabela de dados detalhados no modo em memória.
+
+Apenas a página visível é enviada ao navegador. A ordem de cada coluna é
+calculada uma vez por carga sobre a tabela completa e restrita às linhas
+filtradas com uma máscara, sem ordenar cópias da seleção. A busca é avaliada
+sobre os valores distintos de cada coluna (o dicionário das categóricas) e só
+então levada às linhas. Ordem e busca seguem as regras do modo SQL, para que
+as páginas sejam as mesmas nos dois modos.
+"""
+import numpy as np
+import pandas as pd
+
+from consultas import COLUNAS_BUSCA, MINUSCULAS_ASCII
+
+
+def ordem_coluna(df, coluna, crescente=True):
+    """
+    Posições das linhas de df em ordem de uma coluna.
+
+    Colunas categóricas são ordenadas pelos códigos, que seguem a ordem
+    alfabética em que as categorias são mantidas na carga. Como no SQL
+    (ORDER BY coluna [DESC], rowid), empates ficam em ordem crescente de
+    linha também na ordem decrescente, e nulos ficam no início da ordem
+    crescente e no fim da decrescente.
+
+    Args:
+        df (pd.DataFrame): Tabela completa
+        coluna (str): Coluna de ordenação
+        crescente (bool): Ordem crescente ou decrescente
+
+    Returns:
+        np.ndarray: Posições de df (ordenação estável)
+    """
+    serie = df[coluna]
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        chaves = serie.cat.codes.to_numpy().astype(np.int64)
+    elif pd.api.types.is_numeric_dtype(serie.dtype):
+        tipo = np.float64 if pd.api.types.is_float_dtype(serie.dtype) else np.int64
+        chaves = serie.to_numpy(dtype=tipo, na_value=0)
+    else:
+        chaves = pd.factorize(serie, sort=True)[0].astype(np.int64)
+    # Os nulos são a chave principal (NaN e pd.NA não se ordenam como no SQL),
+    # e inverter a ordem crescente poria os empates em ordem decrescente de linha
+    nulos = serie.isna().to_numpy()
+    if crescente:
+        return np.lexsort((chaves, ~nulos))
+    return np.lexsort((-chaves, nulos))
+
+
+def mascara_busca(df, termo, colunas=COLUNAS_BUSCA):
+    """
+    Marca as linhas em que alguma das colunas contém o termo.
+
+    Como o LIKE do modo SQL, só as letras ASCII são comparadas sem diferenciar
+    maiúsculas (ver consultas.montar_busca).
+
+    Args:
+        df (pd.DataFrame): Tabela completa
+        termo (str): Texto procurado
+        colunas (list): Colunas pesquisadas
+
+    Returns:
+        np.ndarray: Máscara booleana do tamanho de df
+    """
+    termo = termo.translate(MINUSCULAS_ASCII)
+    mascara = np.zeros(len(df), dtype=bool)
+    for coluna in colunas:
+        serie = df[coluna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            categorias = serie.cat.categories.astype(str).str.translate(MINUSCULAS_ASCII)
+            encontradas = np.flatnonzero(categorias.str.contains(termo, regex=False))
+            mascara |= np.isin(serie.cat.codes.to_numpy(), encontradas)
+        else:
+            distintos = pd.Index(serie.dropna().unique())
+            textos = distintos.astype(str).str.translate(MINUSCULAS_ASCII)
+            encontrados = distintos[textos.str.contains(termo, regex=False)]
+            mascara |= serie.isin(encontrados).to_numpy()
+    return mascara
+
+
+def ordenar_selecao(df, selecao, ordem, busca=""):
+    """
+    Restringe a ordem da tabela completa às linhas selecionadas.
+
+    Args:
+        df (pd.DataFrame): Tabela completa
+        selecao (pd.DataFrame): Linhas de df que atendem aos filtros
+        ordem (np.ndarray): Resultado de ordem_coluna para a coluna e o sentido escolhidos
+        busca (str): Termo procurado em COLUNAS_BUSCA; vazio não restringe
+
+    Returns:
+        np.ndarray: Posições de df das linhas selecionadas, na ordem pedida
+    """
+    incluidas = None
+    if selecao is not df:
+        incluidas = np.zeros(len(df), dtype=bool)
+        incluidas[df.index.get_indexer(selecao.index)] = True
+    if busca:
+        encontradas = mascara_busca(df, busca)
+        incluidas = encontradas if incluidas is None else incluidas & encontradas
+    return ordem if incluidas is None else ordem[incluidas[ordem]]
+
+
+def fatiar_pagina(df, posicoes, inicio, tamanho):
+    """
+    Extrai uma página de linhas, com as categóricas convertidas em valores comuns.
+
+    Assim o navegador recebe apenas os valores da página, e não o dicionário
+    completo de cada coluna categórica.
+
+    Args:
+        df (pd.DataFrame): Tabela completa
+        posicoes (np.ndarray): Resultado de ordenar_selecao
+        inicio (int): Posição da primeira linha da página
+        tamanho (int): Linhas por página
+
+    Returns:
+        pd.DataFrame: Linhas da página
+    """
+    pagina = df.iloc[posicoes[inicio:inicio + tamanho]]
+    return pagina.astype({
+        coluna: tipo.categories.dtype for coluna, tipo in pagina.dtypes.items()
+        if isinstance(tipo, pd.CategoricalDtype)
+    })
@@ -0,0 +1,145 @@
+"""
+Tabela de países: nome em português (como vem da COMEX STAT) -> código ISO-3.
+
+A correspondência de cada nome é feita uma única vez, a partir dos
+nomes em português e em inglês do pycountry, e gravada em disco ao lado do
+banco junto com a lista dos nomes sem correspondência. O mapa recebe os
+códigos já resolvidos (locationmode='ISO-3'), sem comparação de nomes no
+navegador.
+"""
+import gettext
+import json
+import logging
+import re
+from functools import cache
+
+import pycountry
+from unidecode import unidecode
+
+logger = logging.getLogger(__name__)
+
+# Nomes usados pela COMEX STAT que não coincidem com nenhum nome do pycountry
+CODIGOS_MANUAIS = {
+    'Azerbaijão': 'AZE',
+    'Bielorrússia': 'BLR',
+    'Bonaire': 'BES',
+    'Bósnia e Herzegovina': 'BIH',
+    'Congo, República Democrática': 'COD',
+    'Coreia do Norte': 'PRK',
+    'Coreia do Sul': 'KOR',
+    'Costa do Marfim': 'CIV',
+    'Estado da Palestina': 'PSE',
+    'Holanda': 'NLD',
+    'Ilhas Malvinas': 'FLK',
+    'Irã': 'IRN',
+    'Kosovo': 'XKX',  # Código de uso livre (faixa X da ISO 3166-1), adotado também pelo Plotly
+    'Laos': 'LAO',
+    'Mianmar': 'MMR',
+    'Micronésia': 'FSM',
+    'Moldávia': 'MDA',
+    'República Democrática do Congo': 'COD',
+    'República Democrática Popular do Laos': 'LAO',
+    'República Tcheca': 'CZE',
+    'Rússia': 'RUS',
+    'Salomão': 'SLB',
+    'Santa Helena': 'SHN',
+    'São Martinho (Países Baixos)': 'SXM',
+    'Seicheles': 'SYC',
+    'Síria': 'SYR',
+    'Síria, República Árabe da': 'SYR',
+    'Svalbard e Jan Mayen': 'SJM',
+    'Taiwan': 'TWN',
+    'Tanzânia': 'TZA',
+    'Trinidad e Tobago': 'TTO',
+    'Turquia': 'TUR',
+    'Vaticano': 'VAT',
+    'Vietnã': 'VNM',
+}
+
+
+def normalizar_nome(nome):
+    """Nome sem acentos, maiúsculas, pontuação nem espaços repetidos, para comparação"""
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", unidecode(str(nome)).lower()).split())
+
+
+@cache
+def indice_nomes():
+    """
+    Índice de nomes normalizados -> código ISO-3, montado uma vez por processo.
+
+    Inclui os nomes comum, oficial e usual de cada país em inglês e em
+    português (traduções do pycountry), além de CODIGOS_MANUAIS.
+
+    Returns:
+        dict: Nome normalizado -> código ISO-3
+    """
+    traducao = gettext.translation('iso3166-1', pycountry.LOCALES_DIR, languages=['pt_BR'], fallback=True)
+    indice = {}
+    for pais in pycountry.countries:
+        for atributo in ('name', 'official_name', 'common_name'):
+            nome = getattr(pais, atributo, None)
+            if nome:
+                indice.setdefault(normalizar_nome(nome), pais.alpha_3)
+                indice.setdefault(normalizar_nome(traducao.gettext(nome)), pais.alpha_3)
+    indice.update({normalizar_nome(nome): codigo for nome, codigo in CODIGOS_MANUAIS.items()})
+    return indice
+
+
+def codigo_iso3(nome):
+    """
+    Código ISO-3 de um nome de país, ou None se não houver correspondência.
+
+    Além do nome completo, tenta o nome sem o trecho entre parênteses e o
+    próprio trecho (ex.: 'Países Baixos (Holanda)', 'Taiwan (Formosa)').
+    """
+    indice = indice_nomes()
+    variantes = [nome, re.sub(r"\(.*?\)", "", nome), *re.findall(r"\((.*?)\)", nome)]
+    for variante in variantes:
+        codigo = indice.get(normalizar_nome(variante))
+        if codigo is not None:
+            return codigo
+    return None
+
+
+def _ler_tabela(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'codigos': {}, 'sem_correspondencia': []}
+
+
+def tabela_paises(nomes, caminho=None):
+    """
+    Resolve os códigos ISO-3 dos nomes de países, reaproveitando a tabela em disco.
+
+    Só os nomes que ainda não têm código na tabela gravada são resolvidos (os
+    sem correspondência são tentados de novo, pois CODIGOS_MANUAIS pode ter
+    ganho o nome). Se a tabela mudar, ela é regravada; os nomes sem
+    correspondência ficam registrados nela e são informados no log.
+
+    Args:
+        nomes (iterable): Nomes de países presentes nos dados
+        caminho (Path, optional): Arquivo JSON da tabela; sem ele nada é gravado
+
+    Returns:
+        tuple: (dict nome -> código ISO-3, list de nomes sem correspondência)
+    """
+    nomes = {str(nome) for nome in nomes}
+    tabela = _ler_tabela(caminho) if caminho is not None else {'codigos': {}, 'sem_correspondencia': []}
+    pendentes = sorted(nomes - set(tabela['codigos']))
+    novos_codigos = {nome: codigo for nome in pendentes if (codigo := codigo_iso3(nome)) is not None}
+    sem_correspondencia = [nome for nome in pendentes if nome not in novos_codigos]
+    if sem_correspondencia:
+        logger.warning("Países sem código ISO-3 (fora do mapa): %s", ", ".join(sem_correspondencia))
+    if caminho is not None and (novos_codigos or sem_correspondencia != tabela['sem_correspondencia']):
+        tabela = {'codigos': {**tabela['codigos'], **novos_codigos}, 'sem_correspondencia': sem_correspondencia}
+        try:
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                json.dump(tabela, arquivo, ensure_ascii=False, indent=2, sort_keys=True)
+        except OSError as e:
+            # Os códigos resolvidos valem para este processo e serão resolvidos de novo no próximo
+            logger.warning("Não foi possível gravar a tabela de países: %s", e)
+    codigos = {nome: codigo for nome, codigo in tabela['codigos'].items() if nome in nomes}
+    codigos.update(novos_codigos)
+    return codigos, sem_correspondencia
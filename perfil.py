@@ -0,0 +1,173 @@
+"""
+Medição opcional das etapas de cada execução do dashboard.
+
+Cada etapa nomeada (carga, filtragem, agregações, montagem e exibição de cada
+gráfico, tabela detalhada) é medida em tempo de parede, tempo de CPU, memória
+e linhas de entrada e saída. As medidas ficam disponíveis para
+o painel de diagnóstico da página e são acrescentadas a um arquivo JSON Lines,
+que pode ser agregado entre sessões. Desativado, o perfil não mede nada.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from uuid import uuid4
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows: sem getrusage, a memória das sessões não é medida
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Uma única trava por processo: sessões diferentes gravam no mesmo arquivo
+_trava_log = threading.Lock()
+
+# Etapas medidas com o tracemalloc em andamento no processo; o rastreamento só
+# fica ligado enquanto houver alguma
+_trava_rastreamento = threading.Lock()
+_etapas_rastreadas = 0
+_rastreamento_proprio = False
+
+COLUNAS_PAINEL = {
+    'etapa': 'Etapa',
+    'parede_ms': 'Tempo (ms)',
+    'cpu_ms': 'CPU (ms)',
+    'pico_memoria_mb': 'Memória (MB)',
+    'linhas_entrada': 'Linhas de entrada',
+    'linhas_saida': 'Linhas de saída',
+}
+
+
+@contextmanager
+def _rastreando_alocacoes():
+    """Mantém o tracemalloc ligado durante o bloco, desligando-o ao fim da última etapa"""
+    global _etapas_rastreadas, _rastreamento_proprio
+    with _trava_rastreamento:
+        if _etapas_rastreadas == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _rastreamento_proprio = True
+        _etapas_rastreadas += 1
+    try:
+        yield
+    finally:
+        with _trava_rastreamento:
+            _etapas_rastreadas -= 1
+            # Um rastreamento iniciado fora daqui (ex.: python -X tracemalloc) é mantido
+            if _etapas_rastreadas == 0 and _rastreamento_proprio:
+                tracemalloc.stop()
+                _rastreamento_proprio = False
+
+
+def pico_rss_mb():
+    """Maior memória residente (RSS) do processo até agora, em MB, ou None sem getrusage"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KiB no Linux e em bytes no macOS
+    return pico / 1024 / 1024 if sys.platform == 'darwin' else pico / 1024
+
+
+class Perfil:
+    """
+    Medidas das etapas de uma execução do script.
+
+    O tempo de CPU é o do processo inteiro (time.process_time), e inclui o das
+    threads do plano de agregações e de outras sessões simultâneas.
+
+    A memória é medida de duas formas. Com rastrear_alocacoes, é o pico de
+    memória alocada pelo Python durante a etapa, obtido com o tracemalloc,
+    ligado apenas enquanto alguma etapa é medida. O tracemalloc deixa todo o
+    processo bem mais lento e tem um único pico por processo: etapas
+    simultâneas de outras sessões se misturam, e etapas não devem ser
+    aninhadas. Sem ele, é quanto a etapa aumentou o pico de memória residente
+    (RSS) do processo, que não custa nada mas só cresce quando a etapa supera
+    o maior uso de memória anterior.
+
+    Args:
+        ativo (bool): Se False, etapa() não mede nem grava nada
+        caminho_log (Path, optional): Arquivo JSON Lines onde as medidas são acrescentadas
+        sessao (str, optional): Identificação da sessão gravada em cada medida
+        rastrear_alocacoes (bool): Medir a memória com o tracemalloc em vez do RSS
+    """
+
+    def __init__(self, ativo, caminho_log=None, sessao=None, rastrear_alocacoes=False):
+        self.ativo = ativo
+        self.caminho_log = caminho_log
+        self.sessao = sessao
+        self.medida_memoria = 'tracemalloc' if rastrear_alocacoes else 'rss'
+        self.execucao = uuid4().hex[:12]
+        self.medidas = []
+
+    @contextmanager
+    def etapa(self, nome, linhas_entrada=None):
+        """
+        Mede o bloco de código de uma etapa.
+
+        Args:
+            nome (str): Nome da etapa (ex.: 'filtragem', 'figura:temporal')
+            linhas_entrada (int, optional): Linhas recebidas pela etapa
+
+        Yields:
+            dict: Medida da etapa; o bloco pode preencher 'linhas_saida'
+        """
+        medida = {'etapa': nome, 'linhas_entrada': linhas_entrada, 'linhas_saida': None}
+        if not self.ativo:
+            yield medida
+            return
+        with ExitStack() as pilha:
+            if self.medida_memoria == 'tracemalloc':
+                pilha.enter_context(_rastreando_alocacoes())
+                memoria_inicial = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            else:
+                memoria_inicial = pico_rss_mb()
+            inicio_parede, inicio_cpu = time.perf_counter(), time.process_time()
+            try:
+                yield medida
+            finally:
+                medida['parede_ms'] = (time.perf_counter() - inicio_parede) * 1000
+                medida['cpu_ms'] = (time.process_time() - inicio_cpu) * 1000
+                if self.medida_memoria == 'tracemalloc':
+                    medida['pico_memoria_mb'] = (tracemalloc.get_traced_memory()[1] - memoria_inicial) / 1024 / 1024
+                elif memoria_inicial is not None:
+                    medida['pico_memoria_mb'] = pico_rss_mb() - memoria_inicial
+                medida['medida_memoria'] = self.medida_memoria
+                self.medidas.append(medida)
+                self._gravar(medida)
+
+    def _gravar(self, medida):
+        if self.caminho_log is None:
+            return
+        registro = {
+            'momento': datetime.now().isoformat(timespec='milliseconds'),
+            'sessao': self.sessao,
+            'execucao': self.execucao,
+            **medida,
+        }
+        linha = json.dumps(registro, ensure_ascii=False, default=str)
+        with _trava_log:
+            try:
+                with open(self.caminho_log, 'a', encoding='utf-8') as arquivo:
+                    arquivo.write(linha + '\n')
+            except OSError as e:
+                # A medida continua no painel desta execução, mas fica fora do log agregado
+                logger.warning("Não foi possível gravar o perfil de desempenho: %s", e)
+
+    def tabela(self):
+        """
+        Medidas desta execução no formato exibido pelo painel de diagnóstico.
+
+        Returns:
+            pd.DataFrame: Uma linha por etapa, na ordem de execução
+        """
+        tabela = pd.DataFrame(self.medidas, columns=list(COLUNAS_PAINEL))
+        # Contagens ausentes (etapas sem linhas) não convertem as demais em float
+        tabela = tabela.astype({'linhas_entrada': 'Int64', 'linhas_saida': 'Int64'})
+        return tabela.rename(columns=COLUNAS_PAINEL)
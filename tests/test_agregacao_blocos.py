@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import agregacao_blocos
+from agregacao_blocos import construir_cubos_em_blocos
+from agregacoes import construir_cubos
+from consultas import conectar
+from dados import carregar_tabela
+from gerar_dados import gerar_banco
+
+
+@pytest.fixture(scope='module')
+def caminho_db(tmp_path_factory):
+    caminho = tmp_path_factory.mktemp('blocos') / 'comex.sqlite'
+    gerar_banco(caminho, 3_000, semente=11, n_sh6=40, n_urf=12)
+    return caminho
+
+
+def test_mesmos_cubos_da_tabela_completa(caminho_db):
+    with conectar(caminho_db) as conn:
+        esperados = construir_cubos(carregar_tabela(conn))
+    cubos = construir_cubos_em_blocos(caminho_db, leitores=3, tamanho_bloco=250)
+    assert cubos.keys() == esperados.keys()
+    for dimensoes, cubo in cubos.items():
+        colunas = list(dimensoes)
+        obtido = cubo.astype({coluna: str for coluna in colunas}).sort_values(colunas, ignore_index=True)
+        esperado = esperados[dimensoes].astype({coluna: str for coluna in colunas}).sort_values(colunas, ignore_index=True)
+        pd.testing.assert_series_equal(obtido['Valor_FOB'], esperado['Valor_FOB'], check_dtype=False)
+
+
+def test_blocos_em_andamento_limitados(caminho_db, monkeypatch):
+    leitores = 2
+    trava = threading.Lock()
+    em_andamento = 0
+    maximo = 0
+    somar_bloco = agregacao_blocos.somar_bloco
+    acumular = agregacao_blocos.acumular
+
+    def somar_bloco_contando(abrir_conexao, intervalo):
+        nonlocal em_andamento, maximo
+        with trava:
+            em_andamento += 1
+            maximo = max(maximo, em_andamento)
+        # O primeiro bloco é lento: os seguintes terminam antes e esperam para ser somados
+        if intervalo[0] < 250:
+            time.sleep(0.3)
+        return somar_bloco(abrir_conexao, intervalo)
+
+    def acumular_contando(acumulados, parciais):
+        nonlocal em_andamento
+        with trava:
+            em_andamento -= 1
+        acumular(acumulados, parciais)
+
+    monkeypatch.setattr(agregacao_blocos, 'somar_bloco', somar_bloco_contando)
+    monkeypatch.setattr(agregacao_blocos, 'acumular', acumular_contando)
+    construir_cubos_em_blocos(caminho_db, leitores=leitores, tamanho_bloco=250)
+    assert em_andamento == 0
+    assert maximo <= 2 * leitores
+
+
+def test_anos_nulos_carregados(tmp_path):
+    caminho = tmp_path / 'comex.sqlite'
+    gerar_banco(caminho, 500, semente=5, n_sh6=10, n_urf=4)
+    with conectar(caminho) as conn:
+        conn.execute("UPDATE comercio_exterior SET Ano = NULL WHERE rowid % 9 = 0")
+        conn.commit()
+        df = carregar_tabela(conn, tamanho_bloco=100)
+        total = conn.execute('SELECT TOTAL("Valor US$ FOB") FROM comercio_exterior').fetchone()[0]
+    assert df['Ano'].dtype == 'Int16'
+    assert df['Ano'].isna().sum() == len(df) // 9
+    cubos = construir_cubos_em_blocos(caminho, leitores=2, tamanho_bloco=100)
+    assert cubos[('Ano', 'Fluxo')]['Valor_FOB'].sum() == pytest.approx(total)
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from agregacoes import DIMENSOES_FILTRO, calcular_agregados, construir_cubos, executar_plano, somar_por
+from indices import construir_indice
+
+PEDIDOS = [(), ('Ano', 'Fluxo'), ('Países',), ('UF',), ('Cod_SH6',), ('Países', 'Desc_SH6')]
+
+
+@pytest.fixture(scope='module')
+def df():
+    gerador = np.random.default_rng(3)
+    n = 2_000
+    colunas = {
+        'Ano': gerador.choice([2020, 2021, 2022], n).astype(float),
+        'Fluxo': gerador.choice(['Exportação', 'Importação'], n),
+        'Países': gerador.choice(['Argentina', 'China', 'Chile'], n),
+        'UF': gerador.choice(['SP', 'RJ'], n),
+        'URF': gerador.choice(['Santos', 'Rio'], n),
+        'Desc_Secao': gerador.choice(['I', 'II'], n),
+        'Desc_SH6': gerador.choice(['Soja', 'Café', 'Milho'], n),
+        'Cod_SH6': gerador.choice([120190, 90111, 100590], n),
+    }
+    tabela = pd.DataFrame(colunas).astype({
+        coluna: 'category' for coluna in ['Fluxo', 'Países', 'UF', 'URF', 'Desc_Secao', 'Desc_SH6']
+    })
+    tabela['Valor_FOB'] = gerador.uniform(0, 1_000, n)
+    # Chaves nulas espalhadas pelas dimensões comuns e pelas demais
+    tabela.loc[::7, 'Ano'] = np.nan
+    tabela.loc[::11, 'Fluxo'] = np.nan
+    tabela.loc[::13, 'Países'] = np.nan
+    return tabela
+
+
+@pytest.mark.parametrize('filtros', [{}, {'UF': ['SP']}, {'Países': ['China', 'Chile'], 'Ano': [2021.0]}])
+def test_total_geral_inclui_chaves_nulas(df, filtros):
+    selecionadas = df
+    for coluna, valores in filtros.items():
+        selecionadas = selecionadas[selecionadas[coluna].isin(valores)]
+    agregados = calcular_agregados(df, construir_cubos(df), construir_indice(df, DIMENSOES_FILTRO), PEDIDOS, filtros)
+    assert agregados[()]['Valor_FOB'].sum() == pytest.approx(selecionadas['Valor_FOB'].sum())
+    for chaves in PEDIDOS[1:]:
+        esperado = somar_por(selecionadas, chaves)
+        assert not agregados[chaves][list(chaves)].isna().any(axis=None)
+        assert len(agregados[chaves]) == len(esperado)
+        assert agregados[chaves]['Valor_FOB'].sum() == pytest.approx(esperado['Valor_FOB'].sum())
+
+
+def test_plano_deriva_total_sem_perder_chaves_nulas(df):
+    # A fonte só é consultada pelo pedido com mais chaves; os demais são derivados dele
+    fonte = somar_por(df, ['Ano', 'Fluxo', 'Países'], dropna=False)
+    consultados = []
+
+    def calcular(chaves):
+        consultados.append(tuple(chaves))
+        return somar_por(df, chaves, dropna=False)
+
+    agregados = executar_plano([(), ('Ano',), ('Ano', 'Fluxo', 'Países')], calcular, lambda chaves: len(df))
+    assert consultados == [('Ano', 'Fluxo', 'Países')]
+    assert agregados[()]['Valor_FOB'].iloc[0] == pytest.approx(fonte['Valor_FOB'].sum())
+    assert not agregados[('Ano',)]['Ano'].isna().any()
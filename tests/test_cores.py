@@ -0,0 +1,38 @@
+from cores import cor_produto, cores_distintas, paleta
+
+
+def codigos_sh6(n, inicio=10_000):
+    return [f"{codigo:06d}" for codigo in range(inicio, inicio + 7 * n, 7)]
+
+
+def test_paleta_sem_cores_repetidas():
+    assert len(set(paleta())) == len(paleta())
+
+
+def test_cores_distintas_sem_repeticao_no_grafico():
+    # 10 grupos x 5 produtos e 20 grupos x 15 produtos, os tamanhos dos gráficos empilhados
+    for n in (24, 50, 138, 200):
+        cores = cores_distintas(codigos_sh6(n))
+        assert len(cores) == n
+        assert len(set(cores.values())) == n
+
+
+def test_cores_distintas_deterministicas():
+    codigos = codigos_sh6(60)
+    assert cores_distintas(codigos) == cores_distintas(reversed(codigos))
+
+
+def test_cor_preferida_sem_colisao():
+    # Produtos com cores preferidas distintas (e não vizinhas) ficam com elas
+    codigos, posicoes = [], set()
+    for codigo in codigos_sh6(100):
+        posicao = paleta().index(cor_produto(codigo))
+        if not posicoes & {posicao - 1, posicao, posicao + 1}:
+            codigos.append(codigo)
+            posicoes.add(posicao)
+    assert cores_distintas(codigos) == {codigo: cor_produto(codigo) for codigo in codigos}
+
+
+def test_mais_produtos_que_cores():
+    cores = cores_distintas(codigos_sh6(len(paleta()) + 10))
+    assert set(cores.values()) == set(paleta())
@@ -0,0 +1,55 @@
+import sqlite3
+from contextlib import closing
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from agregacoes import DIMENSOES_FILTRO, atualizar_cubos, construir_cubos
+from dados import DadosEmMemoria
+from gerar_dados import gerar_banco
+from indices import atualizar_indice, construir_indice
+
+
+def derivados():
+    return {
+        'cubos': (construir_cubos, atualizar_cubos),
+        'indice': (partial(construir_indice, colunas=DIMENSOES_FILTRO), atualizar_indice),
+    }
+
+
+def test_atualizacao_incremental_igual_a_reconstrucao(tmp_path):
+    caminho = tmp_path / 'comex.sqlite'
+    gerar_banco(caminho, 2_000, semente=13, n_sh6=30, n_urf=8)
+    dados = DadosEmMemoria(caminho, derivados=derivados())
+    inicial = dados.sincronizar()
+
+    # Linhas acrescentadas com um país novo (no meio da ordem alfabética) e anos nulos
+    with closing(sqlite3.connect(caminho)) as conn:
+        conn.execute("INSERT INTO comercio_exterior SELECT * FROM comercio_exterior WHERE rowid <= 600")
+        conn.execute('UPDATE comercio_exterior SET "Países" = \'Marte\' WHERE rowid > 2000 AND rowid % 3 = 0')
+        conn.execute("UPDATE comercio_exterior SET Ano = NULL WHERE rowid > 2000 AND rowid % 5 = 0")
+        conn.commit()
+    atualizada = dados.sincronizar()
+    assert atualizada.max_rowid == inicial.max_rowid + 600
+
+    # Sem o snapshot, a tabela e os derivados são montados do zero a partir do SQLite
+    caminho.with_suffix('.arrow').unlink()
+    completa = DadosEmMemoria(caminho, derivados=derivados()).sincronizar()
+    pd.testing.assert_frame_equal(atualizada.df, completa.df)
+
+    for coluna, esperado in completa.derivados['indice'].items():
+        obtido = atualizada.derivados['indice'][coluna]
+        assert obtido.posicoes == esperado.posicoes
+        np.testing.assert_array_equal(obtido.linhas, esperado.linhas)
+        np.testing.assert_array_equal(obtido.limites, esperado.limites)
+
+    for dimensoes, esperado in completa.derivados['cubos'].items():
+        colunas = list(dimensoes)
+        obtido = atualizada.derivados['cubos'][dimensoes]
+        if colunas:
+            obtido = obtido.astype({coluna: str for coluna in colunas}).sort_values(colunas, ignore_index=True)
+            esperado = esperado.astype({coluna: str for coluna in colunas}).sort_values(colunas, ignore_index=True)
+            pd.testing.assert_frame_equal(obtido[colunas], esperado[colunas])
+        assert obtido['Valor_FOB'].to_numpy() == pytest.approx(esperado['Valor_FOB'].to_numpy())
@@ -0,0 +1,55 @@
+import gzip
+import io
+
+import pandas as pd
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+from agregacoes import aplicar_filtros
+from consultas import COLUNAS_DETALHE, conectar, iterar_linhas
+from dados import carregar_tabela
+from exportacao import FORMATOS, blocos_dataframe, exportar
+from gerar_dados import gerar_banco
+
+
+@pytest.fixture(scope='module')
+def df():
+    tabela = pd.DataFrame({
+        'Fluxo': ['Exportação', 'Importação', 'Exportação', 'Importação', 'Exportação'],
+        'Ano': pd.array([2020, 2021, None, 2022, 2023], dtype='Int16'),
+        'Países': ['China', 'Chile', 'China', 'Argentina', 'Chile'],
+        'Valor_FOB': [10.5, 20.0, 30.25, 40.0, 50.75],
+    })
+    return tabela.astype({'Fluxo': 'category', 'Países': 'category'})
+
+
+def ler(conteudo, extensao):
+    if extensao == 'xlsx':
+        return pd.read_excel(io.BytesIO(conteudo), sheet_name='Dados')
+    if extensao == 'csv.gz':
+        return pd.read_csv(io.BytesIO(gzip.decompress(conteudo)))
+    return pd.read_parquet(io.BytesIO(conteudo))
+
+
+@pytest.mark.parametrize('extensao', [extensao for extensao, _ in FORMATOS.values()])
+def test_download_aceita_arquivo_exportado(df, extensao):
+    conteudo, _ = convert_data_to_bytes_and_infer_mime(
+        exportar(lambda: blocos_dataframe(df, tamanho_bloco=2), extensao),
+        TypeError('tipo não suportado')
+    )
+    exportado = ler(conteudo, extensao)
+    assert exportado.columns.tolist() == df.columns.tolist()
+    assert exportado['Países'].astype(str).tolist() == df['Países'].astype(str).tolist()
+    assert exportado['Valor_FOB'].tolist() == df['Valor_FOB'].tolist()
+
+
+def test_exportacao_sql_na_ordem_da_memoria(tmp_path):
+    caminho = tmp_path / 'comex.sqlite'
+    gerar_banco(caminho, 1_000, semente=2, n_sh6=20, n_urf=6)
+    filtros = {'UF': ['SP', 'RJ']}
+    with conectar(caminho) as conn:
+        df = carregar_tabela(conn)
+        sql = pd.concat(iterar_linhas(conn, filtros, 100), ignore_index=True)
+    memoria = aplicar_filtros(df, filtros).reset_index(drop=True)
+    assert len(sql) == len(memoria) > 0
+    assert sql[COLUNAS_DETALHE].astype(str).values.tolist() == memoria[COLUNAS_DETALHE].astype(str).values.tolist()
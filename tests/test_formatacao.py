@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from formatacao import format_currency, formatar_moedas, formatar_numeros_grandes, formatar_ticks_regua
+
+# Valor -> (número grande, tick da régua), como formatados antes da vetorização
+ESPERADOS = {
+    0: ('0.0', '$0.00'),
+    12.345: ('12.3', '$12.35'),
+    999.94: ('999.9', '$999.94'),
+    999.95: ('1000.0', '$999.95'),
+    1_000: ('1.0K', '$1.00K'),
+    -999: ('-999.0', '$-999.00'),
+    -1_500: ('-1.5K', '$-1500.00'),
+    999_949: ('999.9K', '$999.95K'),
+    999_950: ('1000.0K', '$999.95K'),
+    1_234_567: ('1.2M', '$1.23M'),
+    -3.2e6: ('-3.2M', '$-3200000.00'),
+    2.5e9: ('2.5B', '$2.50B'),
+    np.nan: ('nan', '$nan'),
+}
+
+
+@pytest.mark.parametrize('valor, esperados', ESPERADOS.items())
+def test_formatos_fixos(valor, esperados):
+    assert formatar_numeros_grandes([valor])[0] == esperados[0]
+    assert formatar_ticks_regua([valor])[0] == esperados[1]
+
+
+def test_moedas_iguais_a_format_currency():
+    gerador = np.random.default_rng(1)
+    valores = np.concatenate([
+        gerador.uniform(-1e4, 1e4, 500),
+        10.0 ** gerador.uniform(0, 12, 1_500),
+        [999.5, 999_995, 999_999_999, 1e9, -1e9, np.nan],
+    ])
+    assert formatar_moedas(valores).tolist() == [format_currency(valor) for valor in valores]
@@ -0,0 +1,35 @@
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from consultas import COLUNAS_DETALHE, consultar_pagina, contar_selecao
+from dados import carregar_tabela
+from gerar_dados import gerar_banco
+from paginacao import fatiar_pagina, ordem_coluna, ordenar_selecao
+
+
+@pytest.fixture(scope='module')
+def banco(tmp_path_factory):
+    caminho = tmp_path_factory.mktemp('paginacao') / 'comex.sqlite'
+    gerar_banco(caminho, 3_000, semente=7, n_sh6=40, n_urf=12)
+    with closing(sqlite3.connect(caminho)) as conn:
+        # Textos que diferem só em maiúsculas acentuadas, para a busca
+        conn.execute("UPDATE comercio_exterior SET Fluxo = 'EXPORTAÇÃO' WHERE rowid % 7 = 0")
+        # Anos nulos, que a ordem crescente põe no início e a decrescente no fim
+        conn.execute("UPDATE comercio_exterior SET Ano = NULL WHERE rowid % 500 = 3")
+        conn.commit()
+        yield conn, carregar_tabela(conn)
+
+
+@pytest.mark.parametrize('coluna', ['Países', 'Ano', 'Fluxo', 'Valor_FOB'])
+@pytest.mark.parametrize('crescente', [True, False])
+@pytest.mark.parametrize('busca', ['', 'exportação', 'EXPORTAÇÃO', 'china'])
+def test_mesmas_paginas_nos_dois_modos(banco, coluna, crescente, busca):
+    conn, df = banco
+    posicoes = ordenar_selecao(df, df, ordem_coluna(df, coluna, crescente), busca)
+    assert len(posicoes) == contar_selecao(conn, {}, busca)
+    for inicio in (0, 500, len(posicoes) - 100):
+        memoria = fatiar_pagina(df, posicoes, inicio, 100)
+        sql = consultar_pagina(conn, {}, coluna, crescente, 100, inicio, busca)
+        assert memoria[COLUNAS_DETALHE].astype(str).values.tolist() == sql[COLUNAS_DETALHE].astype(str).values.tolist()